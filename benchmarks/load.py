@@ -0,0 +1,348 @@
+"""
+End-to-end load benchmark for the composite service.
+
+Starts the fake upstreams (services/fake) in-process, runs the composite
+app with uvicorn in a subprocess pointed at them, and drives each scenario
+at a set of concurrency levels:
+
+    python -m benchmarks.load --concurrency 1,8,32 --duration 10 \
+        --output bench.json --baseline previous.json --threshold 0.15
+
+Exits non-zero when p95 latency or throughput regresses past the
+threshold relative to the baseline, or when the error rate (any non-2xx)
+rises by more than --error-tolerance.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from services.fake import FakeData, FakeServers
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# -------------------------------------------------------------------
+# Helpers
+# -------------------------------------------------------------------
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def read_rss_kb(pid: int, field: str = "VmRSS") -> Optional[int]:
+    """Read a memory field (VmRSS / VmHWM) for ``pid`` from /proc, in kB."""
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class RssSampler:
+    """Samples a process's RSS in the background and keeps the peak."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = read_rss_kb(self.pid)
+            if rss is not None and (self.peak_kb is None or rss > self.peak_kb):
+                self.peak_kb = rss
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+# -------------------------------------------------------------------
+# Scenarios
+# -------------------------------------------------------------------
+class Scenarios:
+    """Each scenario issues one logical operation and returns its status."""
+
+    def __init__(self, base_url: str, data: FakeData, seed: int = 7):
+        self.base = base_url
+        self.data = data
+        self.rng = random.Random(seed)
+        self.user_ids = list(data.users)
+        self.product_ids = list(data.products)
+        self.order_ids = list(data.orders)
+        self.category_ids = list(data.categories)
+
+    def checkout(self, s: requests.Session) -> int:
+        items = [{"product_id": pid, "quantity": 1}
+                 for pid in self.rng.sample(self.product_ids, k=min(3, len(self.product_ids)))]
+        r = s.post(f"{self.base}/composite/users/{self.rng.choice(self.user_ids)}/checkout",
+                   json={"items": items})
+        return r.status_code
+
+    def order_summary(self, s: requests.Session) -> int:
+        r = s.get(f"{self.base}/composite/users/{self.rng.choice(self.user_ids)}/order-summary")
+        return r.status_code
+
+    def report(self, s: requests.Session, poll_interval: float = 0.05, timeout: float = 60.0) -> int:
+        r = s.post(f"{self.base}/composite/reports/user-orders",
+                   params={"user_id": self.rng.choice(self.user_ids)})
+        if r.status_code != 202:
+            return r.status_code
+        op_id = r.json()["operation_id"]
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            g = s.get(f"{self.base}/composite/reports/user-orders/{op_id}")
+            if g.status_code != 200:
+                return g.status_code
+            state = g.json().get("status")
+            if state == "COMPLETED":
+                return 200
+            if state == "FAILED":
+                return 500
+            time.sleep(poll_interval)
+        return 504
+
+    def proxy_mix(self, s: requests.Session) -> int:
+        choice = self.rng.random()
+        if choice < 0.4:
+            url = f"{self.base}/composite/products/{self.rng.choice(self.product_ids)}"
+            return s.get(url).status_code
+        if choice < 0.6:
+            return s.get(f"{self.base}/composite/products",
+                         params={"category_id": self.rng.choice(self.category_ids)}).status_code
+        if choice < 0.8:
+            return s.get(f"{self.base}/composite/orders/{self.rng.choice(self.order_ids)}").status_code
+        return s.get(f"{self.base}/composite/users/{self.rng.choice(self.user_ids)}").status_code
+
+    def all(self) -> Dict[str, Callable[[requests.Session], int]]:
+        return {
+            "checkout": self.checkout,
+            "order_summary": self.order_summary,
+            "report": self.report,
+            "proxy_mix": self.proxy_mix,
+        }
+
+
+def warm_up(op: Callable[[requests.Session], int], n: int = 5) -> None:
+    s = requests.Session()
+    for _ in range(n):
+        op(s)
+
+
+def run_level(op: Callable[[requests.Session], int], concurrency: int,
+              duration: float) -> Dict[str, Any]:
+    """Closed-loop run: ``concurrency`` workers issue ``op`` back to back."""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker():
+        s = requests.Session()
+        local_lat: List[float] = []
+        local_status: Dict[str, int] = {}
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                code = str(op(s))
+            except requests.RequestException:
+                code = "error"
+            local_lat.append(time.perf_counter() - start)
+            local_status[code] = local_status.get(code, 0) + 1
+        with lock:
+            latencies.extend(local_lat)
+            for k, v in local_status.items():
+                statuses[k] = statuses.get(k, 0) + v
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    n = len(latencies)
+    # anything but a 2xx is an error: a 429 or a shed 503 is not a served request
+    errors = sum(v for k, v in statuses.items() if not k.startswith("2"))
+    return {
+        "concurrency": concurrency,
+        "requests": n,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(n / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if n else 0.0,
+        },
+        "statuses": statuses,
+        "error_rate": round(errors / n, 4) if n else 0.0,
+    }
+
+
+# -------------------------------------------------------------------
+# Composite server
+# -------------------------------------------------------------------
+# Protection layers off or out of reach, so runs measure the request path
+# rather than how much load the limits turn away.
+NEUTRAL_ENV = {
+    "RATE_LIMIT": "0",
+    "ADMISSION_CONTROL": "0",
+    "UPSTREAM_ADAPTIVE_LIMIT": "0",
+    "BULKHEAD_PROXY": "256",
+    "BULKHEAD_CHECKOUT": "256",
+    "BULKHEAD_SUMMARY": "256",
+    "BULKHEAD_REPORT": "256",
+    "BULKHEAD_PROXY_QUEUE": "1024",
+    "BULKHEAD_CHECKOUT_QUEUE": "1024",
+    "BULKHEAD_SUMMARY_QUEUE": "1024",
+    "BULKHEAD_REPORT_QUEUE": "1024",
+    "REPORT_QUEUE": "1024",
+}
+
+
+def start_composite(env: Dict[str, str], port: int, timeout: float = 30.0) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env={**os.environ, **NEUTRAL_ENV, **env},
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("Composite server exited during startup")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("Composite server did not become ready")
+
+
+# -------------------------------------------------------------------
+# Regression check
+# -------------------------------------------------------------------
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+            error_tolerance: float = 0.01) -> List[str]:
+    """Return human-readable regressions of ``current`` versus ``baseline``."""
+    problems = []
+    base_index = {
+        (r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])
+    }
+    for r in current.get("results", []):
+        b = base_index.get((r["scenario"], r["concurrency"]))
+        if b is None:
+            continue
+        label = f"{r['scenario']}@c{r['concurrency']}"
+        if b["latency_ms"]["p95"] and r["latency_ms"]["p95"] > b["latency_ms"]["p95"] * (1 + threshold):
+            problems.append(
+                f"{label}: p95 {b['latency_ms']['p95']}ms -> {r['latency_ms']['p95']}ms"
+            )
+        if b["throughput_rps"] and r["throughput_rps"] < b["throughput_rps"] * (1 - threshold):
+            problems.append(
+                f"{label}: throughput {b['throughput_rps']} -> {r['throughput_rps']} rps"
+            )
+        # absolute: a stray error in a short run should not fail CI
+        if r.get("error_rate", 0.0) > b.get("error_rate", 0.0) + error_tolerance:
+            problems.append(
+                f"{label}: error rate {b.get('error_rate', 0.0)} -> {r['error_rate']}"
+            )
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="checkout,order_summary,report,proxy_mix")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario and level")
+    parser.add_argument("--port", type=int, default=int(os.getenv("BENCH_PORT", 8899)))
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="allowed relative regression (0.15 = 15%%)")
+    parser.add_argument("--error-tolerance", type=float, default=0.01,
+                        help="allowed absolute rise in error rate (0.01 = 1 point)")
+    args = parser.parse_args(argv)
+
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    fakes = FakeServers().start()
+    server = start_composite(fakes.env(), args.port)
+    results = []
+    try:
+        scenarios = Scenarios(f"http://127.0.0.1:{args.port}", fakes.data).all()
+        for name in args.scenarios.split(","):
+            op = scenarios[name]
+            for c in levels:
+                warm_up(op)
+                fakes.reset_stats()
+                with RssSampler(server.pid) as rss:
+                    row = run_level(op, c, args.duration)
+                upstream_calls = sum(s["requests"] for s in fakes.stats().values())
+                row["scenario"] = name
+                row["upstream_calls_per_request"] = (
+                    round(upstream_calls / row["requests"], 2) if row["requests"] else 0.0
+                )
+                row["peak_rss_mb"] = round(rss.peak_kb / 1024, 1) if rss.peak_kb else None
+                results.append(row)
+                print(
+                    f"{name:>14} c={c:<3} {row['throughput_rps']:>8} rps  "
+                    f"p50={row['latency_ms']['p50']}ms p95={row['latency_ms']['p95']}ms "
+                    f"p99={row['latency_ms']['p99']}ms  upstream/req={row['upstream_calls_per_request']}  "
+                    f"rss={row['peak_rss_mb']}MB  errors={row['error_rate']}"
+                )
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        fakes.stop()
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "duration_s": args.duration,
+        "results": results,
+    }
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        problems = compare(report, baseline, args.threshold, args.error_tolerance)
+        if problems:
+            print("Regressions beyond threshold:")
+            for p in problems:
+                print(f"  {p}")
+            return 1
+        print("No regressions beyond threshold.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Microbenchmarks for the serialization / validation hot paths.
+
+For each read model in models/ and each list size, measures:
+
+  decode        json.loads of the upstream body
+  fast_decode   fastjson.loads of the same body (what _check does)
+  validate      response_model validation of the decoded list
+  validate_json validation straight from bytes (pydantic-core parser)
+  dump          model_dump(mode="json") per item (request bodies, responses)
+  encode        json.dumps of the dumped list
+  fast_encode   fastjson.dumps of the dumped list (FastJSONResponse)
+
+The fast_* ops use whichever backend utils.fastjson selected (orjson >
+msgspec > stdlib, or JSON_BACKEND); it is recorded in the output.
+
+plus peak allocations per operation via tracemalloc:
+
+    python -m benchmarks.models --sizes 1,100,1000 --output models.json \
+        --baseline previous.json --threshold 0.2
+"""
+from __future__ import annotations
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter
+
+from models.address import AddressRead
+from models.category import CategoryRead
+from models.inventory import InventoryRead
+from models.order import OrderRead
+from models.order_detail import OrderDetailRead
+from models.payment import PaymentRead
+from models.preference import PreferenceRead
+from models.product import ProductRead
+from models.user import UserRead
+from models.user_address import UserAddressRead
+from services.fake import FakeData
+from utils import fastjson
+
+# model -> FakeData table providing realistic rows for it
+MODELS: Dict[str, Tuple[Type[BaseModel], str]] = {
+    "OrderRead": (OrderRead, "orders"),
+    "OrderDetailRead": (OrderDetailRead, "order_details"),
+    "PaymentRead": (PaymentRead, "payments"),
+    "ProductRead": (ProductRead, "products"),
+    "CategoryRead": (CategoryRead, "categories"),
+    "InventoryRead": (InventoryRead, "inventories"),
+    "UserRead": (UserRead, "users"),
+    "AddressRead": (AddressRead, "addresses"),
+    "PreferenceRead": (PreferenceRead, "preferences"),
+    "UserAddressRead": (UserAddressRead, "user_addresses"),
+}
+
+
+def rows_for(data: FakeData, table: str, size: int) -> List[Dict[str, Any]]:
+    source = list(getattr(data, table).values())
+    if not source:
+        return []
+    return [dict(source[i % len(source)]) for i in range(size)]
+
+
+def time_op(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    fn()  # warm caches (schema builds, interned strings)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "min_us": round(min(samples) * 1e6, 2),
+        "median_us": round(statistics.median(samples) * 1e6, 2),
+    }
+
+
+def alloc_op(fn: Callable[[], Any]) -> int:
+    """Peak bytes allocated while running ``fn`` once."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def bench_model(model: Type[BaseModel], rows: List[Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    adapter = TypeAdapter(List[model])
+    body = json.dumps(rows).encode()
+    decoded = json.loads(body)
+    instances = adapter.validate_python(decoded)
+    dumped = [m.model_dump(mode="json") for m in instances]
+
+    ops: Dict[str, Callable[[], Any]] = {
+        "decode": lambda: json.loads(body),
+        "fast_decode": lambda: fastjson.loads(body),
+        "validate": lambda: adapter.validate_python(decoded),
+        "validate_json": lambda: adapter.validate_json(body),
+        "dump": lambda: [m.model_dump(mode="json") for m in instances],
+        "encode": lambda: json.dumps(dumped).encode(),
+        "fast_encode": lambda: fastjson.dumps(dumped),
+    }
+    out: Dict[str, Any] = {"payload_bytes": len(body), "ops": {}}
+    for name, fn in ops.items():
+        stats = time_op(fn, repeat)
+        stats["per_item_us"] = round(stats["median_us"] / max(len(rows), 1), 3)
+        stats["peak_alloc_bytes"] = alloc_op(fn)
+        out["ops"][name] = stats
+    return out
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    problems = []
+    base_index = {(r["model"], r["size"]): r for r in baseline.get("results", [])}
+    for r in current.get("results", []):
+        b = base_index.get((r["model"], r["size"]))
+        if b is None:
+            continue
+        for op, stats in r["ops"].items():
+            before = b["ops"].get(op, {}).get("median_us")
+            if before and stats["median_us"] > before * (1 + threshold):
+                problems.append(
+                    f"{r['model']}[{r['size']}].{op}: {before}us -> {stats['median_us']}us"
+                )
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", default=",".join(MODELS))
+    parser.add_argument("--sizes", default="1,100,1000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default="bench_models.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    data = FakeData(users=200, products=1000, orders_per_user=5)
+    results = []
+    for name in args.models.split(","):
+        model, table = MODELS[name]
+        for size in sizes:
+            rows = rows_for(data, table, size)
+            if not rows:
+                continue
+            row = {"model": name, "size": size, **bench_model(model, rows, args.repeat)}
+            results.append(row)
+            ops = "  ".join(
+                f"{op}={s['median_us']:.0f}us" for op, s in row["ops"].items()
+            )
+            print(f"{name:>16}[{size:>5}] {row['payload_bytes']:>9}B  {ops}")
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "json_backend": fastjson.BACKEND,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            problems = compare(report, json.load(fh), args.threshold)
+        if problems:
+            print("Regressions beyond threshold:")
+            for p in problems:
+                print(f"  {p}")
+            return 1
+        print("No regressions beyond threshold.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Replay captured traffic (middleware/capture.py JSONL files) against a
+target composite service:
+
+    python -m benchmarks.replay captures/*.jsonl --target http://127.0.0.1:8000 \
+        --speed 2.0 --concurrency 64 --output replay.json
+
+--speed 1 keeps the original inter-arrival times, 2 plays twice as fast,
+0 sends as fast as --concurrency allows. With --speed > 0, latency is
+measured from each request's scheduled time, so time spent waiting for a
+free worker while the target is slow counts against it.
+"""
+from __future__ import annotations
+import argparse
+import glob
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+
+from benchmarks.load import percentile
+
+
+def load_records(paths: Iterable[str], methods: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    records = []
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    if rec.get("body_truncated"):
+                        continue
+                    if methods and rec["method"] not in methods:
+                        continue
+                    records.append(rec)
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def replay(records: List[Dict[str, Any]], target: str, speed: float = 1.0,
+           concurrency: int = 32, timeout: float = 30.0) -> Dict[str, Any]:
+    local = threading.local()
+    results: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    late = 0
+
+    def session() -> requests.Session:
+        s = getattr(local, "session", None)
+        if s is None:
+            s = local.session = requests.Session()
+        return s
+
+    def send(rec: Dict[str, Any], due: Optional[float]) -> None:
+        nonlocal late
+        start = time.monotonic()
+        if due is not None and start - due > 0.1:
+            with lock:
+                late += 1
+        try:
+            resp = session().request(
+                rec["method"], target.rstrip("/") + rec["path"],
+                params=rec.get("query") or None,
+                json=rec.get("body"),
+                timeout=timeout,
+            )
+            status = str(resp.status_code)
+        except requests.RequestException:
+            status = "error"
+        elapsed = time.monotonic() - (start if due is None else due)
+        with lock:
+            results.append({
+                "route": rec.get("route") or rec["path"],
+                "status": status,
+                "latency": elapsed,
+                "original_ms": rec.get("duration_ms"),
+            })
+
+    t0 = records[0]["ts"] if records else 0.0
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for rec in records:
+            due = None
+            if speed > 0:
+                due = started + (rec["ts"] - t0) / speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(send, rec, due)
+    elapsed = time.monotonic() - started
+
+    by_route: Dict[str, List[float]] = {}
+    statuses: Dict[str, int] = {}
+    for r in results:
+        by_route.setdefault(r["route"], []).append(r["latency"])
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+
+    def summary(values: List[float]) -> Dict[str, float]:
+        values = sorted(values)
+        return {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+
+    return {
+        "requests": len(results),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "late_sends": late,
+        "statuses": statuses,
+        "overall": summary([r["latency"] for r in results]),
+        "routes": {route: summary(v) for route, v in sorted(by_route.items())},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="capture JSONL files or glob patterns")
+    parser.add_argument("--target", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--methods", help="comma-separated methods to replay, e.g. GET")
+    parser.add_argument("--limit", type=int, help="replay at most this many records")
+    parser.add_argument("--output", default="replay_results.json")
+    args = parser.parse_args(argv)
+
+    records = load_records(args.files, args.methods.split(",") if args.methods else None)
+    if args.limit:
+        records = records[: args.limit]
+    if not records:
+        print("No records to replay.")
+        return 1
+    print(f"Replaying {len(records)} requests against {args.target} at speed {args.speed}")
+    report = replay(records, args.target, args.speed, args.concurrency)
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    o = report["overall"]
+    print(
+        f"{report['throughput_rps']} rps  p50={o['p50_ms']}ms p95={o['p95_ms']}ms "
+        f"p99={o['p99_ms']}ms  statuses={report['statuses']}  late={report['late_sends']}"
+    )
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
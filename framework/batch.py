@@ -0,0 +1,288 @@
+from __future__ import annotations
+import asyncio
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from fastapi import HTTPException
+from starlette.middleware.exceptions import ExceptionMiddleware
+
+from framework import bulkhead
+from middleware import metrics
+from utils import fastjson
+from utils.cache import TTLCache
+
+# -------------------------------------------------------------------
+# In-process execution of batched composite sub-requests
+# -------------------------------------------------------------------
+# Sub-requests are dispatched straight to the router (no HTTP, no
+# middleware). They still take their workload bulkhead and rate-limit
+# tokens. Identical GETs share one execution (single-flight) and a short
+# response cache, both keyed per caller so different credentials never
+# share a response.
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 50))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 10))
+BATCH_CACHE_TTL = float(os.getenv("BATCH_CACHE_TTL", 1.0))
+
+# headers a sub-request inherits from the batch request
+INHERITED_HEADERS = frozenset({b"authorization", b"x-api-key", b"x-priority", b"user-agent",
+                               b"traceparent", b"x-forwarded-for"})
+# response headers worth returning per item
+RETURNED_HEADERS = ("content-type", "location", "x-total-count", "retry-after")
+
+_REF = re.compile(r"\{\{\s*([\w-]+)((?:\.[\w-]+)*)\s*\}\}")
+
+BATCH_ITEMS = metrics.counter(
+    "composite_batch_items_total",
+    "Batched sub-requests by how they were served.",
+    ["source"],
+)
+
+Response = Tuple[int, Dict[str, str], Any]
+Charge = Callable[[Any, str, str], Awaitable[Optional[int]]]
+
+
+def _error(status: int, detail: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    return status, headers or {"content-type": "application/json"}, {"detail": detail}
+
+
+def references(value: Any) -> List[str]:
+    """Item ids referenced by ``{{id.field}}`` placeholders anywhere in value."""
+    if isinstance(value, str):
+        return [m.group(1) for m in _REF.finditer(value)]
+    if isinstance(value, dict):
+        return [r for v in value.values() for r in references(v)]
+    if isinstance(value, list):
+        return [r for v in value for r in references(v)]
+    return []
+
+
+def _lookup(results: Dict[str, Response], ref: str, fields: str) -> Any:
+    value = results[ref][2]
+    for field in filter(None, fields.split(".")):
+        if isinstance(value, list) and field.isdigit() and int(field) < len(value):
+            value = value[int(field)]
+        elif isinstance(value, dict) and field in value:
+            value = value[field]
+        else:
+            raise KeyError(f"{{{{{ref}{fields}}}}} does not resolve")
+    return value
+
+
+def substitute(value: Any, results: Dict[str, Response], url: bool = False) -> Any:
+    """Replace placeholders with values from earlier results.
+
+    A string that is exactly one placeholder takes the referenced value
+    as-is (numbers and objects keep their type); placeholders inside
+    longer strings are formatted in, URL-quoted when ``url`` is set.
+    """
+    if isinstance(value, str):
+        whole = _REF.fullmatch(value.strip())
+        if whole and not url:
+            return _lookup(results, whole.group(1), whole.group(2))
+
+        def fmt(m):
+            v = _lookup(results, m.group(1), m.group(2))
+            return quote(str(v), safe="") if url else str(v)
+        return _REF.sub(fmt, value)
+    if isinstance(value, dict):
+        return {k: substitute(v, results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [substitute(v, results) for v in value]
+    return value
+
+
+class BatchExecutor:
+    """Runs a list of sub-requests against the app's own routes."""
+
+    def __init__(self, app, bulkheads: Optional[Dict[str, bulkhead.Bulkhead]] = None,
+                 charge: Optional[Charge] = None):
+        self.app = app
+        self.bulkheads = bulkheads or {}
+        self.charge = charge
+        self.cache: TTLCache[Response] = TTLCache(BATCH_CACHE_TTL, 2000)
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self._handler = None
+
+    def _asgi(self):
+        # built on first use so it sees every exception handler registered
+        if self._handler is None:
+            self._handler = ExceptionMiddleware(self.app.router, handlers=self.app.exception_handlers)
+        return self._handler
+
+    async def _dispatch(self, parent, method: str, path: str, body: Any,
+                        headers: Dict[str, str]) -> Response:
+        parts = urlsplit(path)
+        raw = [(k, v) for k, v in parent.get("headers", ()) if k in INHERITED_HEADERS]
+        raw += [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+        payload = b""
+        if body is not None:
+            payload = fastjson.dumps(body)
+            raw += [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode())]
+        scope = {
+            "type": "http",
+            "asgi": parent.get("asgi", {"version": "3.0"}),
+            "http_version": "1.1",
+            "method": method,
+            "scheme": parent.get("scheme", "http"),
+            "path": parts.path,
+            "raw_path": parts.path.encode(),
+            "query_string": parts.query.encode(),
+            "root_path": "",
+            "headers": raw,
+            "client": parent.get("client"),
+            "server": parent.get("server"),
+            "app": parent.get("app"),
+        }
+        if "state" in parent:
+            scope["state"] = dict(parent["state"])
+
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                return {"type": "http.disconnect"}
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+
+        status = 500
+        resp_headers: Dict[str, str] = {}
+        chunks: List[bytes] = []
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for k, v in message.get("headers", ()):
+                    name = k.decode("latin-1").lower()
+                    if name in RETURNED_HEADERS:
+                        resp_headers[name] = v.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self._asgi()(scope, receive, send)
+        content = b"".join(chunks)
+        if not content:
+            parsed = None
+        elif resp_headers.get("content-type", "").startswith("application/json"):
+            parsed = fastjson.loads(content)
+        else:
+            parsed = content.decode("utf-8", "replace")
+        return status, resp_headers, parsed
+
+    async def _guarded(self, parent, method: str, path: str, body: Any,
+                       headers: Dict[str, str]) -> Response:
+        route_path = urlsplit(path).path
+        if self.charge is not None:
+            retry_after = await self.charge(parent, method, route_path)
+            if retry_after is not None:
+                return _error(429, "Rate limit exceeded, retry later",
+                              {"content-type": "application/json", "retry-after": str(retry_after)})
+        workload = bulkhead.classify(method, route_path)
+        gate = self.bulkheads.get(workload) if workload else None
+        if gate is None:
+            return await self._dispatch(parent, method, path, body, headers)
+        try:
+            await gate.acquire()
+        except bulkhead.BulkheadFull as e:
+            return _error(503, f"Too many concurrent {e.name} requests, retry shortly",
+                          {"content-type": "application/json", "retry-after": "1"})
+        try:
+            return await self._dispatch(parent, method, path, body, headers)
+        finally:
+            await gate.release()
+
+    async def _get(self, parent, path: str, headers: Dict[str, str]) -> Response:
+        inherited = tuple(sorted((k, v) for k, v in parent.get("headers", ()) if k in INHERITED_HEADERS))
+        key = (path, inherited, tuple(sorted(headers.items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            BATCH_ITEMS.inc("cache")
+            return cached
+        pending = self._inflight.get(key)
+        if pending is not None:
+            BATCH_ITEMS.inc("shared")
+            return await asyncio.shield(pending)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await self._guarded(parent, "GET", path, None, headers)
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        fut.set_result(result)
+        BATCH_ITEMS.inc("executed")
+        if result[0] == 200 and BATCH_CACHE_TTL > 0:
+            self.cache.set(key, result)
+        return result
+
+    async def _run_item(self, parent, item, results: Dict[str, Response]) -> Response:
+        try:
+            path = substitute(item.path, results, url=True)
+            body = substitute(item.body, results)
+        except KeyError as e:
+            return _error(424, str(e.args[0]))
+        method = item.method.upper()
+        if method == "GET" and body is None:
+            return await self._get(parent, path, item.headers)
+        BATCH_ITEMS.inc("executed")
+        return await self._guarded(parent, method, path, body, item.headers)
+
+    async def run(self, parent, items: List[Any]) -> List[Dict[str, Any]]:
+        """Execute ``items`` concurrently, honouring dependencies between them.
+
+        Raises HTTPException(422) for malformed batches; failures of
+        individual items are reported in their own result.
+        """
+        if len(items) > BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=422, detail=f"At most {BATCH_MAX_ITEMS} requests per batch")
+        index: Dict[str, int] = {}
+        deps: List[List[str]] = []
+        for i, item in enumerate(items):
+            path = urlsplit(item.path).path
+            if not path.startswith("/composite/") or path.rstrip("/") == "/composite/batch":
+                raise HTTPException(status_code=422, detail=f"requests[{i}]: path must be a composite route")
+            wanted = list(dict.fromkeys([*item.depends_on, *references(item.path), *references(item.body)]))
+            for ref in wanted:
+                if ref not in index:
+                    raise HTTPException(status_code=422,
+                                        detail=f"requests[{i}]: '{ref}' must be the id of an earlier request")
+            deps.append(wanted)
+            if item.id is not None:
+                if item.id in index:
+                    raise HTTPException(status_code=422, detail=f"requests[{i}]: duplicate id '{item.id}'")
+                index[item.id] = i
+
+        results: Dict[str, Response] = {}
+        done: List[asyncio.Event] = [asyncio.Event() for _ in items]
+        out: List[Optional[Response]] = [None] * len(items)
+        limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def run_one(i: int, item) -> None:
+            try:
+                for ref in deps[i]:
+                    await done[index[ref]].wait()
+                failed = [ref for ref in deps[i] if not 200 <= results[ref][0] < 300]
+                if failed:
+                    out[i] = _error(424, f"Depends on failed request '{failed[0]}'")
+                else:
+                    async with limit:
+                        out[i] = await self._run_item(parent, item, results)
+            except Exception as e:
+                out[i] = _error(500, f"Sub-request failed: {e.__class__.__name__}")
+            finally:
+                if item.id is not None:
+                    results[item.id] = out[i]  # type: ignore[assignment]
+                done[i].set()
+
+        await asyncio.gather(*(run_one(i, item) for i, item in enumerate(items)))
+        return [
+            {"id": item.id, "status": status, "headers": headers, "body": body}
+            for item, (status, headers, body) in zip(items, out)  # type: ignore[misc]
+        ]
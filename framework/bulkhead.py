@@ -0,0 +1,272 @@
+from __future__ import annotations
+import asyncio
+import os
+import re
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Pattern, Sequence, Tuple
+
+from framework.executor import ContextThreadPoolExecutor
+from middleware import admission, metrics
+from utils import fastjson
+
+# -------------------------------------------------------------------
+# Bulkheads: bounded capacity per workload class
+# -------------------------------------------------------------------
+# Each workload class (interactive proxy calls, checkout, order summaries,
+# background reports) gets its own concurrency budget, so a burst in one
+# cannot take the threads another needs. Per-upstream isolation is the
+# adaptive limiter in services/limiter.
+BULKHEAD_QUEUE_TIMEOUT = float(os.getenv("BULKHEAD_QUEUE_TIMEOUT", 1.0))
+
+BULKHEAD_REJECTED = metrics.counter(
+    "composite_bulkhead_rejected_total",
+    "Work rejected by a bulkhead, by reason.",
+    ["bulkhead", "reason"],
+)
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+class BulkheadFull(Exception):
+    def __init__(self, name: str, reason: str):
+        super().__init__(f"Bulkhead {name} is full ({reason})")
+        self.name = name
+        self.reason = reason
+
+
+_registry: Dict[str, Any] = {}
+
+
+class Bulkhead:
+    """Concurrency budget for requests, enforced on the event loop.
+
+    Waiting happens before the request takes a threadpool thread, so a
+    queued request holds no thread. ``max_queue=0`` rejects as soon as
+    the bulkhead is full.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float = BULKHEAD_QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self._cond: Optional[asyncio.Condition] = None
+        _registry[name] = self
+
+    def _reject(self, reason: str) -> BulkheadFull:
+        self.rejected += 1
+        BULKHEAD_REJECTED.inc(self.name, reason)
+        return BulkheadFull(self.name, reason)
+
+    async def acquire(self) -> None:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        if self.active < self.limit:
+            self.active += 1
+            return
+        if self.waiting >= self.max_queue:
+            raise self._reject("queue_full")
+        self.waiting += 1
+        try:
+            async with self._cond:
+                await asyncio.wait_for(
+                    self._cond.wait_for(lambda: self.active < self.limit), self.queue_timeout
+                )
+                self.active += 1
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout") from None
+        finally:
+            self.waiting -= 1
+
+    async def release(self) -> None:
+        self.active -= 1
+        self.completed += 1
+        if self._cond is not None and self.waiting:
+            async with self._cond:
+                self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": "requests",
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+class BulkheadExecutor(ContextThreadPoolExecutor):
+    """Thread pool with a bounded backlog and a rejection policy.
+
+    ``policy="reject"`` raises BulkheadFull once ``max_queue`` tasks are
+    waiting; ``policy="caller_runs"`` runs the task in the submitting
+    thread instead, so fan-out degrades to serial work rather than
+    failing.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, policy: str = "reject"):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f"bulkhead-{name}")
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.policy = policy
+        self.pending = 0
+        self.caller_runs = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def _done(self, _fut: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        with self._lock:
+            backlog = self.pending - self.max_workers
+            full = backlog >= self.max_queue
+            if not full:
+                self.pending += 1
+        if full:
+            if self.policy == "caller_runs":
+                self.caller_runs += 1
+                BULKHEAD_REJECTED.inc(self.name, "caller_runs")
+                fut: Future = Future()
+                try:
+                    fut.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    fut.set_exception(e)
+                return fut
+            self.rejected += 1
+            BULKHEAD_REJECTED.inc(self.name, "queue_full")
+            raise BulkheadFull(self.name, "queue_full")
+        fut = super().submit(fn, *args, **kwargs)
+        fut.add_done_callback(self._done)
+        return fut
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": "executor",
+            "limit": self.max_workers,
+            "active": min(self.pending, self.max_workers),
+            "waiting": max(self.pending - self.max_workers, 0),
+            "max_queue": self.max_queue,
+            "policy": self.policy,
+            "caller_runs": self.caller_runs,
+            "rejected": self.rejected,
+        }
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: b.stats() for name, b in _registry.items()}
+
+
+def _saturation() -> List[Tuple[Tuple[str, ...], float]]:
+    out = []
+    for name, b in list(_registry.items()):
+        s = b.stats()
+        out.append(((name,), s["active"] / s["limit"] if s["limit"] else 0.0))
+    return out
+
+
+metrics.gauge_callback(
+    "composite_bulkhead_saturation",
+    "Share of each bulkhead's capacity in use (1.0 = full).",
+    ["bulkhead"],
+    _saturation,
+)
+metrics.gauge_callback(
+    "composite_bulkhead_queue",
+    "Work waiting to enter each bulkhead.",
+    ["bulkhead"],
+    lambda: [((name,), b.stats()["waiting"]) for name, b in list(_registry.items())],
+)
+
+
+# ---- request workload classes ----
+def request_bulkheads() -> Dict[str, Bulkhead]:
+    """Request bulkheads sized from BULKHEAD_<CLASS> / BULKHEAD_<CLASS>_QUEUE."""
+    defaults = {"proxy": (24, 100), "checkout": (8, 16), "summary": (6, 12), "report": (4, 16)}
+    return {
+        name: Bulkhead(
+            name,
+            _env_int(f"BULKHEAD_{name.upper()}", limit),
+            _env_int(f"BULKHEAD_{name.upper()}_QUEUE", queue),
+        )
+        for name, (limit, queue) in defaults.items()
+    }
+
+
+# (workload, method or None for any, path pattern); first match wins.
+# Batches have no bulkhead of their own: each sub-request takes its own.
+WORKLOAD_RULES: Sequence[Tuple[str, Optional[str], Pattern[str]]] = (
+    ("batch", "POST", re.compile(r"^/composite/batch$")),
+    ("checkout", "POST", re.compile(r"^/composite/users/[^/]+/checkout$")),
+    ("summary", "GET", re.compile(r"^/composite/users/[^/]+/order-summary$")),
+    ("report", None, re.compile(r"^/composite/reports/")),
+    ("proxy", None, re.compile(r"^/composite/")),
+)
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    for workload, rule_method, pattern in WORKLOAD_RULES:
+        if (rule_method is None or rule_method == method) and pattern.match(path):
+            return workload
+    return None
+
+
+class BulkheadMiddleware:
+    """Pure ASGI middleware admitting each request into its workload's bulkhead.
+
+    Rejections are answered with 503 and Retry-After; unclassified paths
+    (health, metrics, debug) and event streams / long polls, which wait
+    on the event loop without a thread, pass straight through.
+    """
+
+    def __init__(self, app, bulkheads: Optional[Dict[str, Bulkhead]] = None):
+        self.app = app
+        self.bulkheads = bulkheads if bulkheads is not None else request_bulkheads()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        workload = classify(scope["method"], scope["path"])
+        if workload and admission.is_long_lived(scope["method"], scope["path"], scope.get("query_string", b"")):
+            workload = None
+        bulkhead = self.bulkheads.get(workload) if workload else None
+        if bulkhead is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await bulkhead.acquire()
+        except BulkheadFull as e:
+            body = fastjson.dumps({"detail": f"Too many concurrent {e.name} requests, retry shortly"})
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", b"1"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await bulkhead.release()
+
+
+def threadpool_size(bulkheads: Dict[str, Bulkhead], spare: int = 8) -> int:
+    """Threadpool tokens needed so every request bulkhead can run at its limit."""
+    return sum(b.limit for b in bulkheads.values()) + spare
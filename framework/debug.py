@@ -0,0 +1,23 @@
+from __future__ import annotations
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+# Debug endpoints are disabled unless DEBUG_TOKEN is set.
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+
+
+def is_debug_token(value: Optional[str]) -> bool:
+    return bool(DEBUG_TOKEN) and hmac.compare_digest(value or "", DEBUG_TOKEN)
+
+
+def require_debug_token(
+    x_debug_token: Optional[str] = Header(None, alias="X-Debug-Token"),
+):
+    """FastAPI dependency guarding /debug/* endpoints."""
+    if not DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_debug_token(x_debug_token):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
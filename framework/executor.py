@@ -0,0 +1,17 @@
+from __future__ import annotations
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from middleware import profiling
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that runs each task in a copy of the caller's context.
+
+    Plain ThreadPoolExecutor workers start with an empty context, which would
+    drop per-request state such as the active trace span or profile session.
+    """
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        ctx = contextvars.copy_context()
+        return super().submit(ctx.run, profiling.call, fn, *args, **kwargs)
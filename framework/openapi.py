@@ -0,0 +1,140 @@
+"""
+Precomputed OpenAPI document.
+
+Build it once (the Dockerfile does this at image build time):
+
+    python -m framework.openapi --output openapi.json
+
+At runtime ``install(app)`` serves that file instead of generating the
+schema on the first /docs or /openapi.json hit. The file carries a
+fingerprint of the app's routes and of the source of every module that
+defines their endpoints and models; a stale file is ignored and the
+schema is generated as usual.
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import importlib
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, List, Optional, Set, get_args
+
+import fastapi
+import pydantic
+from fastapi import FastAPI
+from fastapi.dependencies.utils import get_flat_dependant
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+from utils import fastjson
+
+OPENAPI_PATH = os.getenv("OPENAPI_PATH", "openapi.json")
+OPENAPI_PRECOMPUTED = os.getenv("OPENAPI_PRECOMPUTED", "1") == "1"
+FINGERPRINT_KEY = "x-route-fingerprint"
+
+logger = logging.getLogger("composite.openapi")
+
+
+def _collect_models(tp: Any, seen: Set[type]) -> None:
+    if isinstance(tp, type) and issubclass(tp, BaseModel):
+        if tp in seen:
+            return
+        seen.add(tp)
+        for field in tp.model_fields.values():
+            _collect_models(field.annotation, seen)
+    for arg in get_args(tp):
+        _collect_models(arg, seen)
+
+
+def _source_files(app: FastAPI) -> List[str]:
+    """Files of the modules defining the schema routes' endpoints and models."""
+    models: Set[type] = set()
+    modules = set()
+    for route in app.routes:
+        if not (isinstance(route, APIRoute) and route.include_in_schema):
+            continue
+        modules.add(route.endpoint.__module__)
+        _collect_models(route.response_model, models)
+        flat = get_flat_dependant(route.dependant)
+        for param in (*flat.path_params, *flat.query_params, *flat.header_params, *flat.body_params):
+            _collect_models(param.field_info.annotation, models)
+    modules.update(m.__module__ for m in models)
+    files = (getattr(sys.modules.get(name), "__file__", None) for name in modules)
+    return sorted(f for f in files if f)
+
+
+def fingerprint(app: FastAPI) -> str:
+    """Hash of the app's routes and the source behind them (no schema work).
+
+    Any edit to a model or endpoint module changes it, as does a FastAPI
+    or pydantic upgrade.
+    """
+    digest = hashlib.sha256()
+    items = [app.title, app.version, fastapi.__version__, pydantic.VERSION]
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.include_in_schema:
+            items.append(f"{','.join(sorted(route.methods))} {route.path} {route.name}")
+    digest.update("\n".join(items).encode())
+    for path in _source_files(app):
+        digest.update(os.path.basename(path).encode())
+        try:
+            with open(path, "rb") as fh:
+                digest.update(fh.read())
+        except OSError:
+            digest.update(b"?")
+    return digest.hexdigest()[:16]
+
+
+def build(app: FastAPI) -> Dict[str, Any]:
+    generate = getattr(app.openapi, "original", app.openapi)
+    app.openapi_schema = None
+    schema = dict(generate())
+    schema[FINGERPRINT_KEY] = fingerprint(app)
+    return schema
+
+
+def load(app: FastAPI, path: str = OPENAPI_PATH) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "rb") as fh:
+            schema = fastjson.loads(fh.read())
+    except (OSError, ValueError):
+        return None
+    if schema.get(FINGERPRINT_KEY) != fingerprint(app):
+        logger.warning("Ignoring stale precomputed OpenAPI document at %s", path)
+        return None
+    return schema
+
+
+def install(app: FastAPI, path: str = OPENAPI_PATH) -> None:
+    """Serve the precomputed document from ``path`` when it matches the app."""
+    original = app.openapi
+
+    def openapi() -> Dict[str, Any]:
+        if app.openapi_schema is None:
+            schema = load(app, path) if OPENAPI_PRECOMPUTED else None
+            app.openapi_schema = schema if schema is not None else original()
+        return app.openapi_schema
+
+    openapi.original = original  # type: ignore[attr-defined]
+    app.openapi = openapi  # type: ignore[method-assign]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="main:app", help="module:attribute of the FastAPI app")
+    parser.add_argument("--output", default=OPENAPI_PATH)
+    args = parser.parse_args(argv)
+
+    module, _, attr = args.app.partition(":")
+    app = getattr(importlib.import_module(module), attr or "app")
+    schema = build(app)
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(schema, fh, ensure_ascii=False, separators=(",", ":"))
+    print(f"Wrote {args.output} ({len(schema.get('paths', {}))} paths, fingerprint {schema[FINGERPRINT_KEY]})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+from __future__ import annotations
+import os
+import time
+from typing import Any, Dict, Optional
+
+# -------------------------------------------------------------------
+# Cold-start timings: process start -> imports -> app ready -> first request
+# -------------------------------------------------------------------
+_marks: Dict[str, float] = {}
+_first_request: Dict[str, Any] = {}
+
+
+def _process_start() -> Optional[float]:
+    """Wall-clock start of this process (Linux only, None elsewhere)."""
+    try:
+        with open("/proc/self/stat") as fh:
+            fields = fh.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        with open("/proc/stat") as fh:
+            btime = next(int(line.split()[1]) for line in fh if line.startswith("btime"))
+        return btime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+
+PROCESS_START = _process_start()
+
+
+def mark(name: str) -> None:
+    """Record the first time a startup phase is reached."""
+    _marks.setdefault(name, time.time())
+
+
+def phases() -> Dict[str, float]:
+    """Seconds from process start (or the earliest mark) to each phase."""
+    origin = PROCESS_START or min(_marks.values(), default=time.time())
+    return {name: round(ts - origin, 4) for name, ts in sorted(_marks.items(), key=lambda kv: kv[1])}
+
+
+def report() -> Dict[str, Any]:
+    out: Dict[str, Any] = {
+        "process_start": PROCESS_START,
+        "phases": phases(),
+    }
+    if "import_start" in _marks and "app_ready" in _marks:
+        out["import_seconds"] = round(_marks["app_ready"] - _marks["import_start"], 4)
+    if _first_request:
+        out["first_request"] = dict(_first_request)
+    return out
+
+
+class FirstRequestMiddleware:
+    """Pure ASGI middleware timing the first request served by this process."""
+
+    def __init__(self, app):
+        self.app = app
+        self.seen = False
+
+    async def __call__(self, scope, receive, send):
+        if self.seen or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.seen = True
+        mark("first_request")
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            mark("first_response")
+            _first_request.update({
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            })
@@ -0,0 +1,83 @@
+from __future__ import annotations
+import logging
+import os
+import random
+from functools import lru_cache
+from typing import Any, get_args
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from middleware import metrics
+from utils import fastjson
+
+# -------------------------------------------------------------------
+# Trusted-upstream mode
+# -------------------------------------------------------------------
+# When enabled, proxy routes relay upstream JSON bytes as-is instead of
+# re-validating them against response_model. This also skips
+# response_model's field filtering, so it is opt-in; a sampled validator
+# still checks payloads for schema drift and unexpected extra fields.
+TRUSTED_UPSTREAM = os.getenv("TRUSTED_UPSTREAM", "0") == "1"
+VALIDATION_SAMPLE_RATE = float(os.getenv("VALIDATION_SAMPLE_RATE", "0.01"))
+
+logger = logging.getLogger("composite.trusted")
+
+SAMPLED_VALIDATIONS = metrics.counter(
+    "composite_trusted_sampled_validations_total",
+    "Relayed upstream payloads validated by the drift sampler.",
+    ["model"],
+)
+SCHEMA_DRIFT = metrics.counter(
+    "composite_schema_drift_total",
+    "Relayed upstream payloads that failed validation or carried unknown fields.",
+    ["model", "kind"],
+)
+
+
+def is_trusted(override: Any = None) -> bool:
+    return TRUSTED_UPSTREAM if override is None else bool(override)
+
+
+@lru_cache(maxsize=None)
+def _adapter(tp: Any) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+def _element_model(tp: Any):
+    args = get_args(tp)
+    candidate = args[0] if args else tp
+    return candidate if isinstance(candidate, type) and issubclass(candidate, BaseModel) else None
+
+
+def _model_name(tp: Any) -> str:
+    model = _element_model(tp)
+    name = model.__name__ if model is not None else str(tp)
+    return f"list[{name}]" if get_args(tp) else name
+
+
+def maybe_validate(tp: Any, body: bytes) -> None:
+    """Validate a sample of relayed payloads against the declared model."""
+    if VALIDATION_SAMPLE_RATE <= 0 or random.random() >= VALIDATION_SAMPLE_RATE:
+        return
+    name = _model_name(tp)
+    SAMPLED_VALIDATIONS.inc(name)
+    try:
+        _adapter(tp).validate_json(body)
+    except ValidationError as e:
+        SCHEMA_DRIFT.inc(name, "invalid")
+        logger.warning("Schema drift for %s: %s", name, e.errors()[:3])
+        return
+
+    model = _element_model(tp)
+    if model is None:
+        return
+    data = fastjson.loads(body)
+    items = data if isinstance(data, list) else [data]
+    known = set(model.model_fields)
+    for item in items:
+        if isinstance(item, dict):
+            extra = set(item) - known
+            if extra:
+                SCHEMA_DRIFT.inc(name, "extra_fields")
+                logger.warning("Upstream %s carries fields not in the model: %s", name, sorted(extra))
+                return
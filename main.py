@@ -1,13 +1,21 @@
 from __future__ import annotations
+from framework import startup
+startup.mark("import_start")
+
 import os
 from datetime import datetime
 from uuid import UUID
 from typing import Dict, Any, List, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import as_completed
+import threading
 import uuid
+from contextlib import asynccontextmanager
+from time import perf_counter
 
+import anyio
 import requests
-from fastapi import FastAPI, HTTPException, status, Response, Header, Request
+from fastapi import FastAPI, HTTPException, status, Response, Header, Request, Depends, Query
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 
 from models.order_detail import OrderDetailRead, OrderDetailCreate, OrderDetailUpdate
 from models.payment import PaymentRead, PaymentCreate, PaymentUpdate
@@ -19,7 +27,27 @@ from models.preference import PreferenceRead, PreferenceCreate, PreferenceUpdate
 from models.product import ProductRead, ProductCreate, ProductUpdate
 from models.user import UserRead, UserUpdate, UserCreate
 from models.user_address import UserAddressRead
-from models.composite import CheckoutRequest
+from models.composite import BatchRequest, BatchResponse, CheckoutRequest
+from models.composite import ProductBatchGetRequest, ProductBatchGetResponse
+from utils import fastjson
+from utils.fastjson import FastJSONResponse
+from framework import openapi as openapi_cache
+from framework.debug import require_debug_token
+from framework import trusted
+from framework import batch, bulkhead
+from framework.executor import ContextThreadPoolExecutor
+from framework.routing import TimedRoute
+from middleware import metrics, profiling, timing, tracing
+from middleware import admission, compression, ratelimit
+from middleware.admission import AdmissionMiddleware
+from middleware.capture import CaptureMiddleware, RotatingJsonlWriter
+from middleware.compression import GZipMiddleware
+from middleware.metrics import MetricsMiddleware
+from middleware.profiling import ProfilingMiddleware
+from middleware.ratelimit import RateLimitMiddleware
+from middleware.timing import ServerTimingMiddleware
+from middleware.tracing import TracingMiddleware
+from services import addresses, catalog, dns_cache, limiter, operations, products, quotes, search, upstream, warmup
 # -------------------------------------------------------------------
 # automic microservice urls
 # -------------------------------------------------------------------
@@ -28,10 +56,52 @@ ORDER_SERVICE_URL = os.getenv("ORDER_SERVICE_URL", "http://136.116.101.124:8080"
 PRODUCT_SERVICE_URL = os.getenv("PRODUCT_SERVICE_URL", "https://product-service-1056727803439.us-central1.run.app")
 port = int(os.environ.get("FASTAPIPORT", 8000))
 
+upstream.register_service("user", USER_SERVICE_URL)
+upstream.register_service("order", ORDER_SERVICE_URL)
+upstream.register_service("product", PRODUCT_SERVICE_URL)
+dns_cache.install()
+
+catalog_replica = catalog.CatalogReplica(PRODUCT_SERVICE_URL) if catalog.CATALOG_REPLICA else None
+product_search = search.ProductSearchIndex()
+if catalog_replica is not None:
+    catalog_replica.add_listener(product_search.on_catalog_change)
+_search_refresh_lock = threading.Lock()
+address_resolver = addresses.AddressResolver(USER_SERVICE_URL)
+product_resolver = products.ProductResolver(PRODUCT_SERVICE_URL, replica=catalog_replica)
+quote_service = quotes.QuoteService(PRODUCT_SERVICE_URL, USER_SERVICE_URL)
+
+
+request_bulkheads = bulkhead.request_bulkheads()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # sync handlers run on anyio's threadpool; size it so every request
+    # bulkhead can run at its limit without borrowing from the others
+    limiter_tokens = anyio.to_thread.current_default_thread_limiter()
+    limiter_tokens.total_tokens = max(limiter_tokens.total_tokens,
+                                      bulkhead.threadpool_size(request_bulkheads))
+    dns_cache.cache.start_refresher()
+    if catalog_replica is not None:
+        catalog_replica.start()
+    if warmup.WARMUP_BLOCKING:
+        await anyio.to_thread.run_sync(warmup.run)
+        startup.mark("warm")
+    else:
+        warmup.start_background(on_ready=lambda: startup.mark("warm"))
+    startup.mark("startup_complete")
+    yield
+    dns_cache.cache.stop_refresher()
+    if catalog_replica is not None:
+        catalog_replica.stop()
+
+
 app = FastAPI(
     title="Composite Microservice",
     description="Composite service that orchestrates User, Order, and Product services.",
     version="0.1.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
     servers=[
         {
             "url": "https://composite-microservice-1056727803439.us-east4.run.app",
@@ -39,6 +109,8 @@ app = FastAPI(
         }
     ],
 )
+app.router.route_class = TimedRoute
+openapi_cache.install(app)
 
 from fastapi.middleware.cors import CORSMiddleware
 app.add_middleware(
@@ -48,18 +120,131 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],        # 关键：允许 Authorization / Content-Type
 )
+app.add_middleware(GZipMiddleware)
+app.add_middleware(bulkhead.BulkheadMiddleware, bulkheads=request_bulkheads)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
+capture_writer = RotatingJsonlWriter()
+app.add_middleware(CaptureMiddleware, writer=capture_writer)
+app.add_middleware(startup.FirstRequestMiddleware)
+
+
+@app.exception_handler(limiter.UpstreamOverloaded)
+def upstream_overloaded(request: Request, exc: limiter.UpstreamOverloaded):
+    service = upstream.SERVICES.get(exc.host, exc.host)
+    return FastJSONResponse(
+        {"detail": f"{service} service is overloaded, retry shortly"},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
 
-report_executor = ThreadPoolExecutor(max_workers=1)
-summary_executor = ThreadPoolExecutor(max_workers=8)
 
+@app.exception_handler(bulkhead.BulkheadFull)
+def bulkhead_full(request: Request, exc: bulkhead.BulkheadFull):
+    return FastJSONResponse(
+        {"detail": f"Too many concurrent {exc.name} tasks, retry shortly"},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
 
-operations_store: Dict[str, Dict[str, Any]] = {}
 
+# report jobs and their fan-out get their own pools so background reports
+# never queue ahead of interactive order summaries; fan-out pools run
+# overflow tasks in the caller rather than failing the summary
+report_executor = bulkhead.BulkheadExecutor(
+    "report_jobs", 1, int(os.getenv("REPORT_QUEUE", 32)), policy="reject")
+report_fanout_executor = bulkhead.BulkheadExecutor(
+    "report_fanout", int(os.getenv("REPORT_FANOUT_WORKERS", 4)), 16, policy="caller_runs")
+summary_executor = bulkhead.BulkheadExecutor(
+    "summary_fanout", int(os.getenv("SUMMARY_WORKERS", 8)), 64, policy="caller_runs")
+
+
+# report operations; writes wake SSE subscribers
+operations_store = operations.StatusStore()
+task_poller = operations.TaskStatusPoller(ORDER_SERVICE_URL)
+
+# queue depth reads the executor's internal work queue; it is only a gauge
+metrics.gauge_callback(
+    "composite_executor_queue_depth",
+    "Tasks waiting for a worker in the composite thread pools.",
+    ["executor"],
+    lambda: [
+        (("summary",), summary_executor._work_queue.qsize()),
+        (("report",), report_executor._work_queue.qsize()),
+        (("report_fanout",), report_fanout_executor._work_queue.qsize()),
+    ],
+)
+metrics.gauge_callback(
+    "composite_operations_store_size",
+    "Report operations currently held in operations_store.",
+    [],
+    lambda: len(operations_store),
+)
+metrics.gauge_callback(
+    "composite_status_stream_pollers",
+    "Shared upstream task pollers and their SSE subscribers.",
+    ["kind"],
+    lambda: [(("pollers",), task_poller.stats()["pollers"]),
+             (("subscribers",), task_poller.stats()["subscribers"])],
+)
+metrics.gauge_callback(
+    "composite_capture_records",
+    "Traffic capture records written or dropped (queue full).",
+    ["outcome"],
+    lambda: [(("written",), capture_writer.written), (("dropped",), capture_writer.dropped)],
+)
+metrics.gauge_callback(
+    "composite_startup_seconds",
+    "Seconds from process start to each startup phase.",
+    ["phase"],
+    lambda: [((name,), value) for name, value in startup.phases().items()],
+)
+metrics.gauge_callback(
+    "composite_address_cache_size",
+    "Addresses held in the address resolver cache.",
+    [],
+    lambda: len(address_resolver.cache),
+)
+metrics.gauge_callback(
+    "composite_resolver_cache_lookups",
+    "Address and product resolver cache lookups since start, by result.",
+    ["cache", "result"],
+    lambda: [
+        ((name, result), cache.stats()[result])
+        for name, cache in (("address", address_resolver.cache), ("product", product_resolver.cache))
+        for result in ("hits", "misses")
+    ],
+)
+if catalog_replica is not None:
+    metrics.gauge_callback(
+        "composite_catalog_rows",
+        "Rows held in the catalog replica.",
+        ["table"],
+        lambda: [((name,), len(t.rows)) for name, t in catalog_replica.tables.items()],
+    )
+    metrics.gauge_callback(
+        "composite_catalog_staleness_seconds",
+        "Seconds since the catalog replica last synced successfully.",
+        [],
+        lambda: catalog_replica.staleness() or 0.0,
+    )
 
 
 # -------------------------------------------------------------------
 # Helper
 # -------------------------------------------------------------------
+def _json(resp: requests.Response):
+    start = perf_counter()
+    try:
+        return fastjson.loads(resp.content)
+    finally:
+        timing.record_json(perf_counter() - start)
+
 def _check(resp: requests.Response, name: str):
     if resp.status_code == 404:
         raise HTTPException(status_code=404, detail=f"{name} not found")
@@ -68,7 +253,52 @@ def _check(resp: requests.Response, name: str):
             status_code=502,
             detail=f"Upstream error from {name} ({resp.status_code})"
         )
-    return resp.json()
+    return _json(resp)
+
+def _relay(resp: requests.Response, name: str, model: Any, status_code: int = 200, trusted_upstream: Optional[bool] = None):
+    """Return a proxied upstream body.
+
+    In trusted-upstream mode the upstream bytes are passed through without
+    decoding or response_model validation (OpenAPI still documents the
+    model); a sample is checked for schema drift. Otherwise same as _check.
+    """
+    if not trusted.is_trusted(trusted_upstream):
+        return _check(resp, name)
+    if resp.status_code == 404 or not resp.ok:
+        return _check(resp, name)
+    trusted.maybe_validate(model, resp.content)
+    return Response(content=resp.content, status_code=status_code, media_type="application/json")
+
+def _replica_query(table: str, **filters):
+    """Rows from the catalog replica, or None to fall back to the Product Service."""
+    if catalog_replica is None:
+        return None
+    rows = catalog_replica.query(table, **filters)
+    if rows is not None:
+        timing.record_cache_hit()
+    return rows
+
+def _replica_get(table: str, pk):
+    if catalog_replica is None:
+        return None
+    row = catalog_replica.get(table, pk)
+    if row is not None:
+        timing.record_cache_hit()
+    return row
+
+def _replicate(table: str, resp: requests.Response, pk=None):
+    """Apply a successful catalog write to the replica (pk set for deletes)."""
+    if catalog_replica is None or not 200 <= resp.status_code < 300:
+        return
+    if pk is not None:
+        catalog_replica.remove(table, pk)
+        return
+    try:
+        row = _json(resp)
+    except Exception:
+        return  # no JSON row to apply; the next sync picks the write up
+    if isinstance(row, dict):
+        catalog_replica.apply(table, row)
 # -------------------------------------------------------------------
 # A) Proxy endpoints (re-expose atomic microservice APIs)
 # -------------------------------------------------------------------
@@ -78,11 +308,11 @@ Proxy for user
 @app.post("/composite/users", response_model=UserRead, tags=["User Proxy"])
 def proxy_create_user(user: UserCreate):
     """Proxy: create a user via the User Service."""
-    resp = requests.post(
+    resp = upstream.post(
         f"{USER_SERVICE_URL}/users",
         json=user.model_dump(mode="json")
     )
-    return _check(resp, "User")
+    return _relay(resp, "User", UserRead)
 
 
 @app.get("/composite/users", response_model=list[UserRead], tags=["User Proxy"])
@@ -100,34 +330,34 @@ def proxy_list_users(
         }.items() if v is not None
     }
 
-    resp = requests.get(
+    resp = upstream.get(
         f"{USER_SERVICE_URL}/users",
         params=params
     )
-    return _check(resp, "User list")
+    return _relay(resp, "User list", list[UserRead])
 
 
 @app.get("/composite/users/{user_id}", response_model=UserRead, tags=["User Proxy"])
 def proxy_get_user(user_id: UUID):
     """Proxy: get a single user via the User Service."""
-    resp = requests.get(f"{USER_SERVICE_URL}/users/{user_id}")
-    return _check(resp, "User")
+    resp = upstream.get(f"{USER_SERVICE_URL}/users/{user_id}")
+    return _relay(resp, "User", UserRead)
 
 
 @app.patch("/composite/users/{user_id}", response_model=UserRead, tags=["User Proxy"])
 def proxy_update_user(user_id: UUID, update: UserUpdate):
     """Proxy: update a user via the User Service."""
-    resp = requests.patch(
+    resp = upstream.patch(
         f"{USER_SERVICE_URL}/users/{user_id}",
         json=update.model_dump(mode="json", exclude_none=True)
     )
-    return _check(resp, "User")
+    return _relay(resp, "User", UserRead)
 
 
 @app.delete("/composite/users/{user_id}", status_code=204, tags=["User Proxy"])
 def proxy_delete_user(user_id: UUID):
     """Proxy: delete a user via the User Service."""
-    resp = requests.delete(f"{USER_SERVICE_URL}/users/{user_id}")
+    resp = upstream.delete(f"{USER_SERVICE_URL}/users/{user_id}")
 
     if resp.status_code == 204:
         return Response(status_code=204)
@@ -140,11 +370,11 @@ proxy for address
 @app.post("/composite/addresses", response_model=AddressRead, status_code=201, tags=["User Proxy"])
 def proxy_create_address(address: AddressCreate):
     """Proxy: create an address via the User Service."""
-    resp = requests.post(
+    resp = upstream.post(
         f"{USER_SERVICE_URL}/addresses",
         json=address.model_dump(mode="json")
     )
-    return _check(resp, "Address")
+    return _relay(resp, "Address", AddressRead, status_code=201)
 
 @app.get("/composite/addresses", response_model=List[AddressRead], tags=["User Proxy"])
 def proxy_list_addresses(
@@ -163,35 +393,38 @@ def proxy_list_addresses(
         }.items() if v is not None
     }
 
-    resp = requests.get(
+    resp = upstream.get(
         f"{USER_SERVICE_URL}/addresses",
         params=params
     )
-    return _check(resp, "Address list")
+    return _relay(resp, "Address list", List[AddressRead])
 
 @app.get("/composite/addresses/{address_id}", response_model=AddressRead, tags=["User Proxy"])
 def proxy_get_address(address_id: UUID):
     """Proxy: get a single address via the User Service."""
-    resp = requests.get(
+    resp = upstream.get(
         f"{USER_SERVICE_URL}/addresses/{address_id}"
     )
-    return _check(resp, "Address")
+    return _relay(resp, "Address", AddressRead)
 
 @app.patch("/composite/addresses/{address_id}", response_model=AddressRead, tags=["User Proxy"])
 def proxy_update_address(address_id: UUID, update: AddressUpdate):
     """Proxy: update an address via the User Service."""
-    resp = requests.patch(
+    resp = upstream.patch(
         f"{USER_SERVICE_URL}/addresses/{address_id}",
         json=update.model_dump(mode="json", exclude_none=True)
     )
-    return _check(resp, "Address")
+    if resp.ok:
+        address_resolver.invalidate(address_id)
+    return _relay(resp, "Address", AddressRead)
 
 @app.delete("/composite/addresses/{address_id}", status_code=204, tags=["User Proxy"])
 def proxy_delete_address(address_id: UUID):
     """Proxy: delete an address via the User Service."""
-    resp = requests.delete(
+    resp = upstream.delete(
         f"{USER_SERVICE_URL}/addresses/{address_id}"
     )
+    address_resolver.invalidate(address_id)
 
     if resp.status_code == 204:
         return Response(status_code=204)
@@ -204,11 +437,11 @@ proxy for preferences
 @app.post("/composite/preferences", response_model=PreferenceRead, status_code=201, tags=["User Proxy"])
 def proxy_create_preference(pref: PreferenceCreate):
     """Proxy: create a preference via the User Service."""
-    resp = requests.post(
+    resp = upstream.post(
         f"{USER_SERVICE_URL}/preferences",
         json=pref.model_dump(mode="json")
     )
-    return _check(resp, "Preference")
+    return _relay(resp, "Preference", PreferenceRead, status_code=201)
 
 @app.get("/composite/preferences", response_model=List[PreferenceRead], tags=["User Proxy"])
 def proxy_list_preferences(
@@ -223,33 +456,33 @@ def proxy_list_preferences(
         }.items() if v is not None
     }
 
-    resp = requests.get(
+    resp = upstream.get(
         f"{USER_SERVICE_URL}/preferences",
         params=params
     )
-    return _check(resp, "Preference list")
+    return _relay(resp, "Preference list", List[PreferenceRead])
 
 @app.get("/composite/preferences/{user_id}", response_model=PreferenceRead, tags=["User Proxy"])
 def proxy_get_preference(user_id: UUID):
     """Proxy: get a preference via the User Service."""
-    resp = requests.get(
+    resp = upstream.get(
         f"{USER_SERVICE_URL}/preferences/{user_id}"
     )
-    return _check(resp, "Preference")
+    return _relay(resp, "Preference", PreferenceRead)
 
 @app.patch("/composite/preferences/{user_id}", response_model=PreferenceRead, tags=["User Proxy"])
 def proxy_update_preference(user_id: UUID, update: PreferenceUpdate):
     """Proxy: update a preference via the User Service."""
-    resp = requests.patch(
+    resp = upstream.patch(
         f"{USER_SERVICE_URL}/preferences/{user_id}",
         json=update.model_dump(mode="json", exclude_none=True)
     )
-    return _check(resp, "Preference")
+    return _relay(resp, "Preference", PreferenceRead)
 
 @app.delete("/composite/preferences/{user_id}", status_code=204, tags=["User Proxy"])
 def proxy_delete_preference(user_id: UUID):
     """Proxy: delete a preference via the User Service."""
-    resp = requests.delete(
+    resp = upstream.delete(
         f"{USER_SERVICE_URL}/preferences/{user_id}"
     )
 
@@ -268,10 +501,10 @@ proxy for user_address
 )
 def proxy_get_user_address(user_id: UUID, addr_id: UUID):
     """Proxy: get a user-address mapping via the User Service."""
-    resp = requests.get(
+    resp = upstream.get(
         f"{USER_SERVICE_URL}/user_addresses/{user_id}/{addr_id}"
     )
-    return _check(resp, "UserAddress")
+    return _relay(resp, "UserAddress", UserAddressRead)
 
 
 @app.delete(
@@ -281,7 +514,7 @@ def proxy_get_user_address(user_id: UUID, addr_id: UUID):
 )
 def proxy_delete_user_address(user_id: UUID, addr_id: UUID):
     """Proxy: delete a user-address mapping via the User Service."""
-    resp = requests.delete(
+    resp = upstream.delete(
         f"{USER_SERVICE_URL}/user_addresses/{user_id}/{addr_id}"
     )
 
@@ -301,11 +534,12 @@ proxy for product
 )
 def proxy_create_product(product: ProductCreate):
     """Proxy: create a product via the Product Service."""
-    resp = requests.post(
+    resp = upstream.post(
         f"{PRODUCT_SERVICE_URL}/products",
         json=product.model_dump(mode="json")
     )
-    return _check(resp, "Product")
+    _replicate("products", resp)
+    return _relay(resp, "Product", ProductRead, status_code=201)
 @app.get(
     "/composite/products",
     response_model=List[ProductRead],
@@ -316,6 +550,9 @@ def proxy_list_products(
     inventory_id: Optional[UUID] = None,
 ):
     """Proxy: list products via the Product Service."""
+    rows = _replica_query("products", category_id=category_id, inventory_id=inventory_id)
+    if rows is not None:
+        return FastJSONResponse(rows)
     params = {
         k: v for k, v in {
             "category_id": category_id,
@@ -323,18 +560,104 @@ def proxy_list_products(
         }.items() if v is not None
     }
 
-    resp = requests.get(
+    resp = upstream.get(
         f"{PRODUCT_SERVICE_URL}/products",
         params=params
     )
-    return _check(resp, "Product list")
+    return _relay(resp, "Product list", List[ProductRead])
+
+
+def _refresh_search_index() -> None:
+    # runs in its own thread holding _search_refresh_lock; a failed refresh
+    # keeps the old index and the next stale search tries again
+    try:
+        resp = upstream.get(f"{PRODUCT_SERVICE_URL}/products")
+        if resp.ok:
+            product_search.sync(_json(resp))
+    except Exception:
+        pass
+    finally:
+        _search_refresh_lock.release()
+
+
+def _product_search_index() -> search.ProductSearchIndex:
+    """The search index, kept current by the catalog replica while it is fresh.
+
+    Otherwise (no replica, replica not loaded yet or too stale) it is
+    refreshed from the Product Service: only the first load blocks, and a
+    stale index keeps serving while one background refresh replaces it.
+    """
+    if catalog_replica is not None and catalog_replica.fresh():
+        return product_search
+    age = product_search.age()
+    if age is None:
+        with _search_refresh_lock:
+            if product_search.age() is None:
+                resp = upstream.get(f"{PRODUCT_SERVICE_URL}/products")
+                product_search.sync(_check(resp, "Product list"))
+        return product_search
+    timing.record_cache_hit()
+    if age > search.SEARCH_REFRESH_SECONDS and _search_refresh_lock.acquire(blocking=False):
+        threading.Thread(target=_refresh_search_index, name="search-refresh", daemon=True).start()
+    return product_search
+
+@app.get(
+    "/composite/products/search",
+    response_model=List[ProductRead],
+    tags=["Product Proxy"],
+)
+def search_products(
+    response: Response,
+    q: str = Query(..., min_length=1, description="Words to match in product name or description; the last letters of a word may be omitted."),
+    category_id: Optional[UUID] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    """Search products by name/description, best matches first.
+
+    Every word must match a word in the product (exactly or as a prefix);
+    name matches rank above description matches. X-Total-Count carries the
+    number of matches before paging.
+    """
+    index = _product_search_index()
+    total, rows = index.search(q, category_id, min_price, max_price, limit, offset)
+    response.headers["X-Total-Count"] = str(total)
+    return rows
+
+
+@app.post(
+    "/composite/products:batchGet",
+    response_model=ProductBatchGetResponse,
+    tags=["Product Proxy"],
+)
+def batch_get_products(body: ProductBatchGetRequest):
+    """Fetch many products at once, in request order.
+
+    Duplicate ids are looked up once; ids the Product Service does not
+    know come back with ``found: false``.
+    """
+    rows = product_resolver.resolve(body.ids)
+    out = []
+    for pid in body.ids:
+        row = rows.get(str(pid))
+        out.append({"product_id": str(pid), "found": row is not None, "product": row})
+    if not trusted.is_trusted():
+        return {"products": out}  # validated and filtered by response_model
+    content = fastjson.dumps({"products": out})
+    trusted.maybe_validate(ProductBatchGetResponse, content)
+    return Response(content=content, media_type="application/json")
 
 
 @app.get("/composite/products/{product_id}", response_model=ProductRead, tags=["Product Proxy"],)
 def proxy_get_product(product_id: UUID):
     """Proxy: get a single product via the Product Service."""
-    resp = requests.get(f"{PRODUCT_SERVICE_URL}/products/{product_id}")
-    return _check(resp, "Product")
+    row = _replica_get("products", product_id)
+    if row is not None:
+        return FastJSONResponse(row)
+    resp = upstream.get(f"{PRODUCT_SERVICE_URL}/products/{product_id}")
+    return _relay(resp, "Product", ProductRead)
 
 @app.put(
     "/composite/products/{product_id}",
@@ -343,11 +666,14 @@ def proxy_get_product(product_id: UUID):
 )
 def proxy_update_product(product_id: UUID, update: ProductUpdate):
     """Proxy: update a product via the Product Service."""
-    resp = requests.put(
+    resp = upstream.put(
         f"{PRODUCT_SERVICE_URL}/products/{product_id}",
         json=update.model_dump(mode="json")
     )
-    return _check(resp, "Product")
+    _replicate("products", resp)
+    if resp.ok:
+        product_resolver.invalidate(product_id)
+    return _relay(resp, "Product", ProductRead)
 
 @app.delete(
     "/composite/products/{product_id}",
@@ -356,13 +682,15 @@ def proxy_update_product(product_id: UUID, update: ProductUpdate):
 )
 def proxy_delete_product(product_id: UUID):
     """Proxy: delete a product via the Product Service."""
-    resp = requests.delete(
+    resp = upstream.delete(
         f"{PRODUCT_SERVICE_URL}/products/{product_id}"
     )
+    _replicate("products", resp, pk=product_id)
+    product_resolver.invalidate(product_id)
 
     # atomic 返回 JSON
     if resp.status_code < 400:
-        return resp.json()
+        return _json(resp)
 
     return _check(resp, "Product")
 
@@ -377,11 +705,12 @@ proxy for category
 )
 def proxy_create_category(category: CategoryCreate):
     """Proxy: create a category via the Category Service."""
-    resp = requests.post(
+    resp = upstream.post(
         f"{PRODUCT_SERVICE_URL}/categories",
         json=category.model_dump(mode="json")
     )
-    return _check(resp, "Category")
+    _replicate("categories", resp)
+    return _relay(resp, "Category", CategoryRead, status_code=201)
 
 @app.get(
     "/composite/categories",
@@ -390,15 +719,18 @@ def proxy_create_category(category: CategoryCreate):
 )
 def proxy_list_categories(name: Optional[str] = None):
     """Proxy: list categories via the Category Service."""
+    rows = _replica_query("categories", name=name)
+    if rows is not None:
+        return FastJSONResponse(rows)
     params = {}
     if name is not None:
         params["name"] = name
 
-    resp = requests.get(
+    resp = upstream.get(
         f"{PRODUCT_SERVICE_URL}/categories",
         params=params
     )
-    return _check(resp, "Category list")
+    return _relay(resp, "Category list", List[CategoryRead])
 
 @app.get(
     "/composite/categories/{category_id}",
@@ -407,10 +739,13 @@ def proxy_list_categories(name: Optional[str] = None):
 )
 def proxy_get_category(category_id: UUID):
     """Proxy: get a category via the Category Service."""
-    resp = requests.get(
+    row = _replica_get("categories", category_id)
+    if row is not None:
+        return FastJSONResponse(row)
+    resp = upstream.get(
         f"{PRODUCT_SERVICE_URL}/categories/{category_id}"
     )
-    return _check(resp, "Category")
+    return _relay(resp, "Category", CategoryRead)
 
 @app.put(
     "/composite/categories/{category_id}",
@@ -419,11 +754,12 @@ def proxy_get_category(category_id: UUID):
 )
 def proxy_update_category(category_id: UUID, update: CategoryUpdate):
     """Proxy: update a category via the Category Service."""
-    resp = requests.put(
+    resp = upstream.put(
         f"{PRODUCT_SERVICE_URL}/categories/{category_id}",
         json=update.model_dump(mode="json")
     )
-    return _check(resp, "Category")
+    _replicate("categories", resp)
+    return _relay(resp, "Category", CategoryRead)
 
 @app.delete(
     "/composite/categories/{category_id}",
@@ -432,12 +768,13 @@ def proxy_update_category(category_id: UUID, update: CategoryUpdate):
 )
 def proxy_delete_category(category_id: UUID):
     """Proxy: delete a category via the Category Service."""
-    resp = requests.delete(
+    resp = upstream.delete(
         f"{PRODUCT_SERVICE_URL}/categories/{category_id}"
     )
+    _replicate("categories", resp, pk=category_id)
 
     if resp.status_code < 400:
-        return resp.json()
+        return _json(resp)
 
     return _check(resp, "Category")
 
@@ -452,11 +789,12 @@ proxy for inventory
 )
 def proxy_create_inventory(inventory: InventoryCreate):
     """Proxy: create an inventory via the Product Service."""
-    resp = requests.post(
+    resp = upstream.post(
         f"{PRODUCT_SERVICE_URL}/inventories",
         json=inventory.model_dump(mode="json")
     )
-    return _check(resp, "Inventory")
+    _replicate("inventories", resp)
+    return _relay(resp, "Inventory", InventoryRead, status_code=201)
 
 @app.get(
     "/composite/inventories",
@@ -468,6 +806,9 @@ def proxy_list_inventories(
     warehouse_location: Optional[str] = None,
 ):
     """Proxy: list inventories via the Product Service."""
+    rows = _replica_query("inventories", product_id=product_id, warehouse_location=warehouse_location)
+    if rows is not None:
+        return FastJSONResponse(rows)
     params = {
         k: v for k, v in {
             "product_id": product_id,
@@ -475,11 +816,11 @@ def proxy_list_inventories(
         }.items() if v is not None
     }
 
-    resp = requests.get(
+    resp = upstream.get(
         f"{PRODUCT_SERVICE_URL}/inventories",
         params=params
     )
-    return _check(resp, "Inventory list")
+    return _relay(resp, "Inventory list", List[InventoryRead])
 
 @app.get(
     "/composite/inventories/{inventory_id}",
@@ -488,10 +829,13 @@ def proxy_list_inventories(
 )
 def proxy_get_inventory(inventory_id: UUID):
     """Proxy: get an inventory via the Product Service."""
-    resp = requests.get(
+    row = _replica_get("inventories", inventory_id)
+    if row is not None:
+        return FastJSONResponse(row)
+    resp = upstream.get(
         f"{PRODUCT_SERVICE_URL}/inventories/{inventory_id}"
     )
-    return _check(resp, "Inventory")
+    return _relay(resp, "Inventory", InventoryRead)
 
 @app.put(
     "/composite/inventories/{inventory_id}",
@@ -500,11 +844,12 @@ def proxy_get_inventory(inventory_id: UUID):
 )
 def proxy_update_inventory(inventory_id: UUID, update: InventoryUpdate):
     """Proxy: update an inventory via the Product Service."""
-    resp = requests.put(
+    resp = upstream.put(
         f"{PRODUCT_SERVICE_URL}/inventories/{inventory_id}",
         json=update.model_dump(mode="json")
     )
-    return _check(resp, "Inventory")
+    _replicate("inventories", resp)
+    return _relay(resp, "Inventory", InventoryRead)
 
 @app.delete(
     "/composite/inventories/{inventory_id}",
@@ -513,12 +858,13 @@ def proxy_update_inventory(inventory_id: UUID, update: InventoryUpdate):
 )
 def proxy_delete_inventory(inventory_id: UUID):
     """Proxy: delete an inventory via the Product Service."""
-    resp = requests.delete(
+    resp = upstream.delete(
         f"{PRODUCT_SERVICE_URL}/inventories/{inventory_id}"
     )
+    _replicate("inventories", resp, pk=inventory_id)
 
     if resp.status_code < 400:
-        return resp.json()
+        return _json(resp)
 
     return _check(resp, "Inventory")
 
@@ -528,7 +874,7 @@ def proxy_delete_inventory(inventory_id: UUID):
 )
 def proxy_get_product_inventory(product_id: UUID):
     """Proxy: get inventory for a product via the Product Service."""
-    resp = requests.get(
+    resp = upstream.get(
         f"{PRODUCT_SERVICE_URL}/products/{product_id}/inventory"
     )
     return _check(resp, "Inventory")
@@ -547,7 +893,7 @@ def proxy_create_order(order: OrderCreate, request: Request):
     if "authorization" in request.headers:
         headers["Authorization"] = request.headers["authorization"]
 
-    resp = requests.post(
+    resp = upstream.post(
         f"{ORDER_SERVICE_URL}/orders",
         json=order.model_dump(mode="json"),
         headers=headers,
@@ -597,11 +943,11 @@ def proxy_list_orders(
         }.items() if v is not None
     }
 
-    resp = requests.get(
+    resp = upstream.get(
         f"{ORDER_SERVICE_URL}/orders",
         params=params
     )
-    return _check(resp, "Order list")
+    return _relay(resp, "Order list", List[OrderRead])
 
 @app.get(
     "/composite/orders/{order_id}",
@@ -616,7 +962,7 @@ def proxy_get_order(
     if if_none_match:
         headers["If-None-Match"] = if_none_match
 
-    resp = requests.get(
+    resp = upstream.get(
         f"{ORDER_SERVICE_URL}/orders/{order_id}",
         headers=headers
     )
@@ -646,7 +992,7 @@ def proxy_update_order(
     if if_match:
         headers["If-Match"] = if_match
 
-    resp = requests.put(
+    resp = upstream.put(
         f"{ORDER_SERVICE_URL}/orders/{order_id}",
         json=update.model_dump(mode="json"),
         headers=headers,
@@ -669,10 +1015,10 @@ def proxy_update_order(
     tags=["Order Proxy"],
 )
 def proxy_delete_order(order_id: UUID):
-    resp = requests.delete(
+    resp = upstream.delete(
         f"{ORDER_SERVICE_URL}/orders/{order_id}"
     )
-    return _check(resp, "Order")
+    return _relay(resp, "Order", OrderRead)
 
 '''
 Proxy for payments
@@ -685,7 +1031,7 @@ Proxy for payments
 )
 def proxy_create_payment(payment: PaymentCreate):
     """Proxy: create a payment via the Order Service."""
-    resp = requests.post(
+    resp = upstream.post(
         f"{ORDER_SERVICE_URL}/payments",
         json=payment.model_dump(mode="json")
     )
@@ -734,11 +1080,11 @@ def proxy_list_payments(
         }.items() if v is not None
     }
 
-    resp = requests.get(
+    resp = upstream.get(
         f"{ORDER_SERVICE_URL}/payments",
         params=params
     )
-    return _check(resp, "Payment list")
+    return _relay(resp, "Payment list", List[PaymentRead])
 
 @app.get(
     "/composite/payments/{payment_id}",
@@ -747,10 +1093,10 @@ def proxy_list_payments(
 )
 def proxy_get_payment(payment_id: UUID):
     """Proxy: get a payment via the Order Service."""
-    resp = requests.get(
+    resp = upstream.get(
         f"{ORDER_SERVICE_URL}/payments/{payment_id}"
     )
-    return _check(resp, "Payment")
+    return _relay(resp, "Payment", PaymentRead)
 
 @app.put(
     "/composite/payments/{payment_id}",
@@ -759,11 +1105,11 @@ def proxy_get_payment(payment_id: UUID):
 )
 def proxy_update_payment(payment_id: UUID, update: PaymentUpdate):
     """Proxy: update a payment via the Order Service."""
-    resp = requests.put(
+    resp = upstream.put(
         f"{ORDER_SERVICE_URL}/payments/{payment_id}",
         json=update.model_dump(mode="json")
     )
-    return _check(resp, "Payment")
+    return _relay(resp, "Payment", PaymentRead)
 
 @app.delete(
     "/composite/payments/{payment_id}",
@@ -772,10 +1118,10 @@ def proxy_update_payment(payment_id: UUID, update: PaymentUpdate):
 )
 def proxy_delete_payment(payment_id: UUID):
     """Proxy: delete a payment via the Order Service."""
-    resp = requests.delete(
+    resp = upstream.delete(
         f"{ORDER_SERVICE_URL}/payments/{payment_id}"
     )
-    return _check(resp, "Payment")
+    return _relay(resp, "Payment", PaymentRead)
 
 '''
 Proxy for Order Detail
@@ -788,7 +1134,7 @@ Proxy for Order Detail
 )
 def proxy_create_order_detail(order_detail: OrderDetailCreate):
     """Proxy: create an order detail via the Order Service."""
-    resp = requests.post(
+    resp = upstream.post(
         f"{ORDER_SERVICE_URL}/order-details",
         json=order_detail.model_dump(mode="json")
     )
@@ -836,11 +1182,11 @@ def proxy_list_order_details(
         }.items() if v is not None
     }
 
-    resp = requests.get(
+    resp = upstream.get(
         f"{ORDER_SERVICE_URL}/order-details",
         params=params
     )
-    return _check(resp, "OrderDetail list")
+    return _relay(resp, "OrderDetail list", List[OrderDetailRead])
 
 @app.get(
     "/composite/order-details/{order_id}/{prod_id}",
@@ -849,10 +1195,10 @@ def proxy_list_order_details(
 )
 def proxy_get_order_detail(order_id: UUID, prod_id: UUID):
     """Proxy: get an order detail via the Order Service."""
-    resp = requests.get(
+    resp = upstream.get(
         f"{ORDER_SERVICE_URL}/order-details/{order_id}/{prod_id}"
     )
-    return _check(resp, "OrderDetail")
+    return _relay(resp, "OrderDetail", OrderDetailRead)
 @app.put(
     "/composite/order-details/{order_id}/{prod_id}",
     response_model=OrderDetailRead,
@@ -864,11 +1210,11 @@ def proxy_update_order_detail(
     update: OrderDetailUpdate,
 ):
     """Proxy: update an order detail via the Order Service."""
-    resp = requests.put(
+    resp = upstream.put(
         f"{ORDER_SERVICE_URL}/order-details/{order_id}/{prod_id}",
         json=update.model_dump(mode="json")
     )
-    return _check(resp, "OrderDetail")
+    return _relay(resp, "OrderDetail", OrderDetailRead)
 
 @app.delete(
     "/composite/order-details/{order_id}/{prod_id}",
@@ -877,15 +1223,15 @@ def proxy_update_order_detail(
 )
 def proxy_delete_order_detail(order_id: UUID, prod_id: UUID):
     """Proxy: delete an order detail via the Order Service."""
-    resp = requests.delete(
+    resp = upstream.delete(
         f"{ORDER_SERVICE_URL}/order-details/{order_id}/{prod_id}"
     )
-    return _check(resp, "OrderDetail")
+    return _relay(resp, "OrderDetail", OrderDetailRead)
 
 @app.post("/composite/orders/process", status_code=202, tags=["Order Proxy"],)
 def proxy_process_order_async(order: OrderCreate):
     """Proxy: asynchronously process an order via the Order Service."""
-    resp = requests.post(
+    resp = upstream.post(
         f"{ORDER_SERVICE_URL}/orders/process",
         json=order.model_dump(mode="json")
     )
@@ -902,50 +1248,111 @@ def proxy_process_order_async(order: OrderCreate):
 
     return response
 
-@app.get("/composite/tasks/{task_id}/status", tags=["Order Proxy"])
-def proxy_get_task_status(task_id: UUID):
-    """Proxy: get async task status via the Order Service."""
-    resp = requests.get(
+def _task_status(task_id: UUID):
+    cached = task_poller.cached(str(task_id))
+    if cached is not None:
+        timing.record_cache_hit()
+        return cached
+    resp = upstream.get(
         f"{ORDER_SERVICE_URL}/tasks/{task_id}/status"
     )
-    return _check(resp, "TaskStatus")
+    body = _check(resp, "TaskStatus")
+    task_poller.remember(str(task_id), body)
+    return body
 
-# -------------------------------------------------------------------
-# 1) Checkout
-# -------------------------------------------------------------------
-@app.post("/composite/users/{user_id}/checkout", status_code=201)
-def checkout(user_id: UUID, body: CheckoutRequest, request: Request):
-    user_resp = requests.get(f"{USER_SERVICE_URL}/users/{user_id}")
-    user_json = _check(user_resp, "User")
 
-    items_info: List[Dict[str, Any]] = []
+def _wait_seconds(wait: Optional[str]) -> float:
+    if not wait:
+        return 0.0
+    try:
+        return operations.parse_wait(wait)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-    for item in body.items:
-        product_id = item.product_id
 
-        p_resp = requests.get(f"{PRODUCT_SERVICE_URL}/products/{product_id}")
-        product = _check(p_resp, "Product")
+WAIT_QUERY = Query(None, description="Long poll: hold the request until the status changes or this "
+                                     "long passes, e.g. 30s (capped at LONG_POLL_MAX_SECONDS).")
 
-        inv_resp = requests.get(
-            f"{PRODUCT_SERVICE_URL}/products/{product_id}/inventory"
-        )
-        inventory = _check(inv_resp, "Inventory")
 
-        if inventory["stock_quantity"] < item.quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Not enough stock for product {product_id}"
-            )
+@app.get("/composite/tasks/{task_id}/status", tags=["Order Proxy"])
+async def proxy_get_task_status(task_id: UUID, wait: Optional[str] = WAIT_QUERY):
+    """Proxy: get async task status via the Order Service."""
+    timeout = _wait_seconds(wait)
+    body = await anyio.to_thread.run_sync(_task_status, task_id)
+    if not timeout or operations.is_terminal(body):
+        return body
+    return await task_poller.wait_for_change(str(task_id), body, timeout)
+
+
+def _last_event_id(value: Optional[str]) -> int:
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        return 0
+
+
+@app.get("/composite/tasks/{task_id}/events", tags=["Order Proxy"])
+async def stream_task_status(task_id: UUID, last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events: one ``status`` event per task status change.
+
+    All subscribers of a task share a single upstream poller; the stream
+    ends after a terminal status. A reconnect after that gets 204.
+    """
+    key = str(task_id)
+    seen = _last_event_id(last_event_id)
+    if operations.stream_finished(task_poller.statuses, key, seen):
+        return Response(status_code=204)
+
+    async def events():
+        # subscribed only once the stream runs, so a client that leaves
+        # before the first chunk never holds the poller
+        task_poller.subscribe(key)
+        try:
+            async for chunk in operations.status_events(task_poller.statuses, key, lambda r: r, seen):
+                yield chunk
+        finally:
+            task_poller.unsubscribe(key)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=operations.SSE_HEADERS)
+
+# -------------------------------------------------------------------
+# 1) Checkout
+# -------------------------------------------------------------------
+@app.post("/composite/users/{user_id}/cart/quote")
+def quote_cart(user_id: UUID, body: CheckoutRequest):
+    """Validate a cart's stock and prices without placing an order.
+
+    A valid cart gets a signed ``quote_id`` good for QUOTE_TTL seconds;
+    passing it to checkout reuses this snapshot instead of re-fetching
+    products and inventory. Invalid lines carry an ``issue``.
+    """
+    return FastJSONResponse(quote_service.create(user_id, body.items))
 
-        line_total = product["price"] * item.quantity
 
-        items_info.append({
-            "product_id": product["product_id"],
-            "product": product,
-            "inventory": inventory,
-            "quantity": item.quantity,
-            "line_total": line_total,
-        })
+@app.post("/composite/users/{user_id}/checkout", status_code=201)
+def checkout(user_id: UUID, body: CheckoutRequest, request: Request):
+    snapshot = quote_service.redeem(body.quote_id, user_id, body.items) if body.quote_id else None
+    if snapshot is not None:
+        # the quote fixes user and prices; stock is read again right before
+        # it is decremented, since other checkouts may have taken some
+        user_json = snapshot["user"]
+        items_info = quote_service.restock(snapshot["lines"])
+        for line in items_info:
+            if line["inventory"]["stock_quantity"] < line["quantity"]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Not enough stock for product {line['product_id']}"
+                )
+    else:
+        user_json, items_info = quote_service.price(user_id, body.items)
+        for line in items_info:
+            if line.get("issue") == "not_found":
+                raise HTTPException(status_code=404, detail="Product not found")
+            if line.get("issue") == "insufficient_stock":
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Not enough stock for product {line['product_id']}"
+                )
     headers = {}
     if "authorization" in request.headers:
         headers["Authorization"] = request.headers["authorization"]
@@ -957,7 +1364,7 @@ def checkout(user_id: UUID, body: CheckoutRequest, request: Request):
         "total_price": total_price,
         "status": "PENDING",
     }
-    order_resp = requests.post(
+    order_resp = upstream.post(
         f"{ORDER_SERVICE_URL}/orders",
         json=order_payload,
         headers=headers,
@@ -975,7 +1382,7 @@ def checkout(user_id: UUID, body: CheckoutRequest, request: Request):
             "subtotal": item["line_total"],
         }
 
-        d_resp = requests.post(
+        d_resp = upstream.post(
             f"{ORDER_SERVICE_URL}/order-details",
             json=detail_payload
         )
@@ -986,7 +1393,7 @@ def checkout(user_id: UUID, body: CheckoutRequest, request: Request):
         new_qty = item["inventory"]["stock_quantity"] - item["quantity"]
         inv_update_payload = {"stock_quantity": new_qty}
 
-        inv_up_resp = requests.put(
+        inv_up_resp = upstream.put(
             f"{PRODUCT_SERVICE_URL}/inventories/{item['inventory']['inventory_id']}",
             json=inv_update_payload,
         )
@@ -999,61 +1406,50 @@ def checkout(user_id: UUID, body: CheckoutRequest, request: Request):
         "payment_date": datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
         "amount": total_price,
     }
-    pay_resp = requests.post(f"{ORDER_SERVICE_URL}/payments", json=pay_payload)
+    pay_resp = upstream.post(f"{ORDER_SERVICE_URL}/payments", json=pay_payload)
     payment_json = _check(pay_resp, "Payment")
 
-    return {
+    return FastJSONResponse({
         "user": user_json,
         "order": order_json,
         "order_details": details_out,
         "payment": payment_json,
-    }
+    }, status_code=201)
+
+
+@app.get("/composite/users/{user_id}/addresses", response_model=List[AddressRead])
+def user_addresses(user_id: UUID):
+    """All addresses linked to a user, resolved through the shared address cache."""
+    return address_resolver.for_user(user_id)
 
 
 @app.get("/composite/users/{user_id}/order-summary")
 def order_summary(user_id: UUID):
-    executor = summary_executor
+    return FastJSONResponse(build_order_summary(user_id))
+
+
+def build_order_summary(user_id: UUID, executor: ContextThreadPoolExecutor = summary_executor) -> Dict[str, Any]:
     def f_user():
-        resp = requests.get(f"{USER_SERVICE_URL}/users/{user_id}")
+        resp = upstream.get(f"{USER_SERVICE_URL}/users/{user_id}")
         return _check(resp, "User")
 
     def f_pref():
-        resp = requests.get(f"{USER_SERVICE_URL}/preferences/{user_id}")
+        resp = upstream.get(f"{USER_SERVICE_URL}/preferences/{user_id}")
         if resp.status_code == 404 or resp.status_code == 501:
             return None
         return _check(resp, "Preference")
 
     def f_addresses():
-        resp = requests.get(
-            f"{USER_SERVICE_URL}/user_addresses",
-            params={"user_id": str(user_id)}
-        )
-        if resp.status_code in (404, 501):
-            return []
-
-        mappings = _check(resp, "UserAddress")
-
-        out = []
-        for m in mappings:
-            addr_id = m["addr_id"]
-            ar = requests.get(f"{USER_SERVICE_URL}/addresses/{addr_id}")
-
-            if ar.status_code in (404, 501):
-                continue
-
-            addr_json = _check(ar, "Address")
-            out.append(addr_json)
-
-        return out
+        return address_resolver.for_user(user_id)
 
     def f_orders():
-        resp = requests.get(
+        resp = upstream.get(
             f"{ORDER_SERVICE_URL}/orders",
             params={"user_id": str(user_id)}
         )
         if not resp.ok:
             return []
-        return resp.json()
+        return _json(resp)
 
     futures = {
         executor.submit(f_user): "user",
@@ -1071,21 +1467,24 @@ def order_summary(user_id: UUID):
 
     def enrich(order):
         oid = order["order_id"]
+        with tracing.span("enrich_order", order_id=oid):
+            return _enrich(order, oid)
 
-        pay_r = requests.get(f"{ORDER_SERVICE_URL}/payments", params={"order_id": oid})
-        payments = pay_r.json() if pay_r.ok else []
+    def _enrich(order, oid):
+        pay_r = upstream.get(f"{ORDER_SERVICE_URL}/payments", params={"order_id": oid})
+        payments = _json(pay_r) if pay_r.ok else []
 
-        det_r = requests.get(f"{ORDER_SERVICE_URL}/order-details", params={"order_id": oid})
-        details = det_r.json() if det_r.ok else []
+        det_r = upstream.get(f"{ORDER_SERVICE_URL}/order-details", params={"order_id": oid})
+        details = _json(det_r) if det_r.ok else []
 
         for d in details:
             pid = d["prod_id"]
-            p_r = requests.get(f"{PRODUCT_SERVICE_URL}/products/{pid}")
+            p_r = upstream.get(f"{PRODUCT_SERVICE_URL}/products/{pid}")
             if p_r.ok:
-                d["product"] = p_r.json()
-            i_r = requests.get(f"{PRODUCT_SERVICE_URL}/inventories/{pid}")
+                d["product"] = _json(p_r)
+            i_r = upstream.get(f"{PRODUCT_SERVICE_URL}/inventories/{pid}")
             if i_r.ok:
-                d["inventory"] = i_r.json()
+                d["inventory"] = _json(i_r)
 
         return {
             "order": order,
@@ -1113,10 +1512,12 @@ def generate_report(user_id: UUID):
 
     def job():
         try:
-            r = order_summary(user_id)
+            r = build_order_summary(user_id, report_fanout_executor)
+            # stored pre-compressed so polls never re-encode the payload
+            body = fastjson.dumps({"status": "COMPLETED", "result": r})
             operations_store[op_id] = {
                 "status": "COMPLETED",
-                "result": r
+                "gzip": compression.compress(body),
             }
         except Exception as e:
             operations_store[op_id] = {
@@ -1124,7 +1525,11 @@ def generate_report(user_id: UUID):
                 "error": str(e)
             }
 
-    report_executor.submit(job)
+    try:
+        report_executor.submit(job)
+    except bulkhead.BulkheadFull:
+        operations_store.pop(op_id, None)
+        raise
 
     return {
         "operation_id": op_id,
@@ -1134,12 +1539,142 @@ def generate_report(user_id: UUID):
 
 
 @app.get("/composite/reports/user-orders/{operation_id}")
-def get_report(operation_id: str):
+async def get_report(operation_id: str, accept_encoding: Optional[str] = Header(None),
+                     wait: Optional[str] = WAIT_QUERY):
+    timeout = _wait_seconds(wait)
+    version = operations_store.version(operation_id)
     if operation_id not in operations_store:
         raise HTTPException(status_code=404, detail="Operation not found")
-    return operations_store[operation_id]
+    op = operations_store[operation_id]
+    if timeout and not operations.is_terminal(op):
+        await operations_store.wait(operation_id, version, timeout)
+        op = operations_store.get(operation_id) or op
+    if "gzip" in op:
+        if not compression.accepts_gzip(accept_encoding):
+            # inflating a large report would stall the event loop
+            return await anyio.to_thread.run_sync(compression.gzip_response, op["gzip"], accept_encoding)
+        return compression.gzip_response(op["gzip"], accept_encoding)
+    return FastJSONResponse(op)
 # double check
 
+
+def _report_status(operation_id: str):
+    def render(op: Dict[str, Any]) -> Dict[str, Any]:
+        event = {"operation_id": operation_id, "status": op["status"]}
+        if "error" in op:
+            event["error"] = op["error"]
+        return event
+    return render
+
+
+@app.get("/composite/reports/user-orders/{operation_id}/events")
+async def stream_report_status(operation_id: str, last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events for a report: status changes until it completes or fails.
+
+    The report itself is then fetched from GET /composite/reports/user-orders/{operation_id};
+    a reconnect after the final event gets 204.
+    """
+    if operation_id not in operations_store:
+        raise HTTPException(status_code=404, detail="Operation not found")
+    seen = _last_event_id(last_event_id)
+    if operations.stream_finished(operations_store, operation_id, seen):
+        return Response(status_code=204)
+    return StreamingResponse(
+        operations.status_events(operations_store, operation_id, _report_status(operation_id), seen),
+        media_type="text/event-stream",
+        headers=operations.SSE_HEADERS,
+    )
+
+
+# -------------------------------------------------------------------
+# Batch: many composite sub-requests in one round trip
+# -------------------------------------------------------------------
+batch_executor = batch.BatchExecutor(app, bulkheads=request_bulkheads, charge=ratelimit.charge)
+
+
+@app.post("/composite/batch", response_model=BatchResponse)
+async def batch_requests(body: BatchRequest, request: Request):
+    """Run sub-requests against composite routes concurrently.
+
+    Items may reference earlier results with ``{{id.field}}`` placeholders
+    in their path or body; such items wait for those results and fail with
+    424 if a dependency did not succeed.
+    """
+    responses = await batch_executor.run(request.scope, body.requests)
+    return FastJSONResponse({"responses": responses})
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/debug/traces", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+def debug_list_traces(limit: int = 50):
+    exporter = tracing.memory_exporter()
+    if exporter is None:
+        raise HTTPException(status_code=404, detail="In-memory trace exporter not enabled")
+    return exporter.traces(limit)
+
+@app.get("/debug/traces/{trace_id}", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+def debug_get_trace(trace_id: str):
+    exporter = tracing.memory_exporter()
+    if exporter is None:
+        raise HTTPException(status_code=404, detail="In-memory trace exporter not enabled")
+    spans = exporter.trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return spans
+
+@app.get("/debug/profiles", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+def debug_list_profiles():
+    return profiling.list_profiles()
+
+@app.get("/debug/profiles/{name}", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+def debug_get_profile(name: str, format: str = "pstats", sort: str = "cumulative", limit: int = 50):
+    path = profiling.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        if sort not in profiling.SORT_KEYS:
+            raise HTTPException(
+                status_code=422,
+                detail=f"sort must be one of: {', '.join(sorted(profiling.SORT_KEYS))}"
+            )
+        return PlainTextResponse(profiling.render_text(path, sort, limit))
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
+
+@app.get("/ready", include_in_schema=False)
+def ready():
+    """Readiness probe: 503 until upstream DNS and connections are warm."""
+    state = warmup.status()
+    ok = state["status"] == "ready"
+    if catalog_replica is not None:
+        state["catalog"] = catalog_replica.stats()
+        ok = ok and catalog_replica.loaded
+    return FastJSONResponse(state, status_code=200 if ok else 503)
+
+@app.get("/debug/dns", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+def debug_dns():
+    return dns_cache.cache.snapshot()
+
+@app.get("/debug/limits", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+def debug_limits():
+    return limiter.all_stats()
+
+
+@app.get("/debug/bulkheads", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+def debug_bulkheads():
+    return bulkhead.all_stats()
+
+
+@app.get("/debug/admission", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+def debug_admission():
+    return admission.admission_controller.stats()
+
+
+@app.get("/debug/startup", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+def debug_startup():
+    return startup.report()
+
 @app.get("/favicon.ico")
 def favicon():
     return {}, 204
@@ -1153,6 +1688,8 @@ def root():
     return {"message": "Composite service ready. Orchestrating User/Order/Product."}
 
 
+startup.mark("app_ready")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=port)
@@ -0,0 +1,255 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Pattern, Sequence, Tuple
+
+from middleware import metrics
+from utils import fastjson
+
+# -------------------------------------------------------------------
+# Priority-aware admission control
+# -------------------------------------------------------------------
+# At most ADMISSION_MAX_CONCURRENCY requests run at once. Anything beyond
+# waits in one priority queue; a freed slot goes to the highest-priority
+# waiter. Under overload (queue depth or latency past their thresholds)
+# the lowest priorities are shed first, and checkout is shed last.
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "1") == "1"
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 64))
+ADMISSION_QUEUE = int(os.getenv("ADMISSION_QUEUE", 256))
+# EWMA of admitted request latency above which low priority is shed
+# outright, and twice which normal priority is too
+ADMISSION_LATENCY_TARGET = float(os.getenv("ADMISSION_LATENCY_TARGET", 1.0))
+_LATENCY_ALPHA = 0.1
+
+CRITICAL, NORMAL, LOW = 0, 1, 2
+PRIORITY_NAMES = {CRITICAL: "critical", NORMAL: "normal", LOW: "low"}
+_BY_NAME = {name: p for p, name in PRIORITY_NAMES.items()}
+
+# longest a request of each priority waits for a slot
+MAX_WAIT = {
+    CRITICAL: float(os.getenv("ADMISSION_WAIT_CRITICAL", 5.0)),
+    NORMAL: float(os.getenv("ADMISSION_WAIT_NORMAL", 1.0)),
+    LOW: float(os.getenv("ADMISSION_WAIT_LOW", 0.25)),
+}
+# queue depth (as a share of ADMISSION_QUEUE) at which each priority stops queueing
+QUEUE_SHED_AT = {CRITICAL: 1.0, NORMAL: 0.75, LOW: 0.25}
+RETRY_AFTER = {CRITICAL: 1, NORMAL: 2, LOW: 5}
+
+ADMISSION_DECISIONS = metrics.counter(
+    "composite_admission_total",
+    "Admission decisions by priority: admitted, queued, or shed and why.",
+    ["priority", "outcome"],
+)
+
+# (priority, method or None for any, path pattern); first match wins.
+# Paths outside /composite (health, metrics, debug) are never queued.
+PRIORITY_RULES: Sequence[Tuple[int, Optional[str], Pattern[str]]] = (
+    (CRITICAL, "POST", re.compile(r"^/composite/users/[^/]+/checkout$")),
+    (CRITICAL, None, re.compile(r"^/composite/users/[^/]+/cart(/|$)")),
+    (LOW, None, re.compile(r"^/composite/reports/")),
+    (NORMAL, None, re.compile(r"^/composite/")),
+)
+
+
+# event streams and long polls (?wait=) stay open for a long time without
+# using a thread; they are not admitted like ordinary requests
+STREAM_PATH = re.compile(r"^/composite/.+/events$")
+_WAIT_PARAM = re.compile(rb"(?:^|&)wait=")
+
+
+def is_long_lived(method: str, path: str, query_string: bytes = b"") -> bool:
+    return method == "GET" and bool(STREAM_PATH.match(path) or _WAIT_PARAM.search(query_string))
+
+
+def classify(method: str, path: str, header: Optional[str] = None) -> Optional[int]:
+    """Priority of a request, or None when it bypasses admission.
+
+    ``X-Priority`` (critical/normal/low) may lower a request's priority,
+    e.g. for dashboard polls, but never raise it above its route's class.
+    """
+    priority = None
+    for rule_priority, rule_method, pattern in PRIORITY_RULES:
+        if (rule_method is None or rule_method == method) and pattern.match(path):
+            priority = rule_priority
+            break
+    if priority is None:
+        return None
+    requested = _BY_NAME.get((header or "").strip().lower())
+    if requested is not None and requested > priority:
+        return requested
+    return priority
+
+
+class Shed(Exception):
+    def __init__(self, priority: int, reason: str):
+        super().__init__(f"{PRIORITY_NAMES[priority]} request shed ({reason})")
+        self.priority = priority
+        self.reason = reason
+
+
+class AdmissionController:
+    """Concurrency slots handed out in priority order on the event loop."""
+
+    def __init__(self, max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+                 max_queue: int = ADMISSION_QUEUE,
+                 latency_target: float = ADMISSION_LATENCY_TARGET):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.latency_target = latency_target
+        self.active = 0
+        self.latency = 0.0
+        # heap of [priority, seq, future]; entries whose future is done are stale
+        self._heap: List[List[Any]] = []
+        self._waiting = {p: 0 for p in PRIORITY_NAMES}
+        self._seq = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(self._waiting.values())
+
+    def _shed(self, priority: int, reason: str) -> Shed:
+        ADMISSION_DECISIONS.inc(PRIORITY_NAMES[priority], f"shed_{reason}")
+        return Shed(priority, reason)
+
+    def _overloaded(self, priority: int) -> Optional[str]:
+        if priority == CRITICAL:
+            return None
+        if self.queued >= self.max_queue * QUEUE_SHED_AT[priority]:
+            return "queue_depth"
+        # latency only counts while busy, so it cannot keep shedding an idle service
+        busy = self.queued or self.active * 2 >= self.max_concurrency
+        if busy and self.latency_target > 0 \
+                and self.latency > self.latency_target * (1 if priority == LOW else 2):
+            return "latency"
+        return None
+
+    def _evict_lowest(self, below: int) -> bool:
+        """Shed the newest waiter of the lowest priority worse than ``below``."""
+        victim = None
+        for entry in self._heap:
+            if entry[2].done() or entry[0] <= below:
+                continue
+            if victim is None or (entry[0], entry[1]) > (victim[0], victim[1]):
+                victim = entry
+        if victim is None:
+            return False
+        victim[2].set_result(False)
+        return True
+
+    async def acquire(self, priority: int) -> None:
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+            ADMISSION_DECISIONS.inc(PRIORITY_NAMES[priority], "admitted")
+            return
+        reason = self._overloaded(priority)
+        if reason:
+            raise self._shed(priority, reason)
+        if self.queued >= self.max_queue and not self._evict_lowest(priority):
+            raise self._shed(priority, "queue_full")
+
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, [priority, next(self._seq), fut])
+        self._waiting[priority] += 1
+        ADMISSION_DECISIONS.inc(PRIORITY_NAMES[priority], "queued")
+        try:
+            await asyncio.wait((fut,), timeout=MAX_WAIT[priority])
+        except asyncio.CancelledError:
+            # client went away while queued; pass on a slot it was just given
+            if fut.done() and fut.result():
+                self.release(0.0, sample=False)
+            fut.cancel()
+            raise
+        finally:
+            self._waiting[priority] -= 1
+        if not fut.done():
+            fut.cancel()
+            raise self._shed(priority, "queue_timeout")
+        if not fut.result():
+            raise self._shed(priority, "evicted")
+        # the slot was handed over by release(); active already counts it
+
+    def release(self, elapsed: float, sample: bool = True) -> None:
+        if sample:
+            self.latency += _LATENCY_ALPHA * (elapsed - self.latency)
+        while self._heap:
+            _, _, fut = heapq.heappop(self._heap)
+            if not fut.done():
+                fut.set_result(True)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "max_queue": self.max_queue,
+            "queued": {PRIORITY_NAMES[p]: n for p, n in self._waiting.items()},
+            "latency_ewma_ms": round(self.latency * 1000, 2),
+            "latency_target_ms": round(self.latency_target * 1000, 2),
+        }
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware putting /composite requests through the controller.
+
+    Shed requests get 503 with a Retry-After that grows as priority drops.
+    """
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_CONTROL:
+            await self.app(scope, receive, send)
+            return
+        header = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-priority":
+                header = value.decode("latin-1")
+                break
+        priority = classify(scope["method"], scope["path"], header)
+        if priority is None or is_long_lived(scope["method"], scope["path"], scope.get("query_string", b"")):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.controller.acquire(priority)
+        except Shed as e:
+            body = fastjson.dumps({"detail": "Service is overloaded, retry shortly"})
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(RETRY_AFTER[e.priority]).encode()),
+                    (b"x-shed-reason", e.reason.encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(time.perf_counter() - start)
+
+
+admission_controller = AdmissionController()
+
+metrics.gauge_callback(
+    "composite_admission_queue",
+    "Requests waiting for admission, by priority.",
+    ["priority"],
+    lambda: [((PRIORITY_NAMES[p],), n) for p, n in admission_controller._waiting.items()],
+)
+metrics.gauge_callback(
+    "composite_admission_latency_seconds",
+    "Smoothed latency of admitted requests, compared against ADMISSION_LATENCY_TARGET.",
+    [],
+    lambda: admission_controller.latency,
+)
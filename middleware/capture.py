@@ -0,0 +1,205 @@
+from __future__ import annotations
+import hashlib
+import hmac
+import json
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import parse_qsl
+
+# -------------------------------------------------------------------
+# Sampled, anonymized traffic capture to rotating JSONL files
+# -------------------------------------------------------------------
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0"))
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "captures")
+CAPTURE_MAX_FILE_BYTES = int(os.getenv("CAPTURE_MAX_FILE_BYTES", 50 * 1024 * 1024))
+CAPTURE_MAX_FILES = int(os.getenv("CAPTURE_MAX_FILES", 10))
+CAPTURE_MAX_BODY_BYTES = int(os.getenv("CAPTURE_MAX_BODY_BYTES", 64 * 1024))
+CAPTURE_QUEUE_SIZE = int(os.getenv("CAPTURE_QUEUE_SIZE", 10000))
+# HMAC key for pseudonyms, so small keyspaces (zip codes, names) cannot be
+# reversed by hashing guesses. Set it to keep pseudonyms stable across
+# restarts and replicas; the per-process default only keeps them stable
+# within one process.
+CAPTURE_SALT = (os.getenv("CAPTURE_SALT") or secrets.token_hex(32)).encode()
+
+# Fields replaced with stable pseudonyms; IDs are kept so replays hit the
+# same shape of data.
+SENSITIVE_FIELDS = frozenset({
+    "email", "phone", "password", "first_name", "last_name",
+    "street", "zip_code", "postal_code",
+})
+
+
+def _pseudonym(value: Any) -> str:
+    return hmac.new(CAPTURE_SALT, str(value).encode(), hashlib.sha256).hexdigest()[:12]
+
+
+def anonymize(value: Any, key: Optional[str] = None) -> Any:
+    """Recursively replace sensitive fields, keeping values format-valid."""
+    if isinstance(value, dict):
+        return {k: anonymize(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [anonymize(v, key) for v in value]
+    if key in SENSITIVE_FIELDS and value is not None:
+        token = _pseudonym(value)
+        if key == "email":
+            return f"anon-{token}@example.com"
+        if key == "phone":
+            return f"+1-000-{int(token[:6], 16) % 10000000:07d}"
+        return f"anon-{token}"
+    return value
+
+
+class RotatingJsonlWriter:
+    """Writes records from a bounded queue on a background thread.
+
+    ``submit`` never blocks the event loop: when the queue is full the
+    record is dropped and counted.
+    """
+
+    def __init__(self, directory: str = CAPTURE_DIR, max_file_bytes: int = CAPTURE_MAX_FILE_BYTES,
+                 max_files: int = CAPTURE_MAX_FILES, queue_size: int = CAPTURE_QUEUE_SIZE):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        self._fh = None
+        self._size = 0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, record: Dict[str, Any]) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"capture-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{random.randrange(1 << 16):04x}.jsonl"
+        self._fh = open(os.path.join(self.directory, name), "a", encoding="utf-8")
+        self._size = 0
+        self._prune()
+
+    def _prune(self) -> None:
+        files = sorted(
+            (f for f in os.listdir(self.directory) if f.startswith("capture-") and f.endswith(".jsonl")),
+            key=lambda f: os.path.getmtime(os.path.join(self.directory, f)),
+        )
+        for f in files[: max(len(files) - self.max_files, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, f))
+            except OSError:
+                pass
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            line = json.dumps(record, default=str) + "\n"
+            if self._fh is None or self._size + len(line) > self.max_file_bytes:
+                if self._fh is not None:
+                    self._fh.close()
+                self._open()
+            self._fh.write(line)
+            self._size += len(line)
+            self.written += 1
+            if self._queue.empty():
+                self._fh.flush()
+        if self._fh is not None:
+            self._fh.close()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+class CaptureMiddleware:
+    """Pure ASGI middleware sampling requests into a RotatingJsonlWriter.
+
+    Only method, path, route template, query, JSON body, status and timing
+    are kept; headers are never recorded.
+    """
+
+    def __init__(self, app, sample_rate: float = CAPTURE_SAMPLE_RATE,
+                 writer: Optional[RotatingJsonlWriter] = None,
+                 skip_prefixes: Sequence[str] = ("/metrics", "/debug/", "/docs", "/openapi.json")):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.writer = writer or RotatingJsonlWriter()
+        self.skip_prefixes = tuple(skip_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            self.sample_rate <= 0
+            or scope["type"] != "http"
+            or scope["path"].startswith(self.skip_prefixes)
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        chunks: List[bytes] = []
+        size = 0
+        truncated = False
+        status_code = 500
+
+        async def receive_wrapper():
+            nonlocal size, truncated
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                if size + len(body) <= CAPTURE_MAX_BODY_BYTES:
+                    chunks.append(body)
+                else:
+                    truncated = True
+                size += len(body)
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        wall = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            body: Any = None
+            if chunks and not truncated:
+                try:
+                    body = anonymize(json.loads(b"".join(chunks)))
+                except ValueError:
+                    body = None
+            query = anonymize(dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"))))
+            route = scope.get("route")
+            self.writer.submit({
+                "ts": wall,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "query": query,
+                "body": body,
+                "body_truncated": truncated,
+                "status": status_code,
+                "duration_ms": round(duration * 1000, 3),
+            })
@@ -0,0 +1,155 @@
+from __future__ import annotations
+import gzip
+import os
+from typing import List, Optional, Tuple
+
+import anyio
+from fastapi import Response
+
+from middleware import metrics
+
+# -------------------------------------------------------------------
+# Size-aware gzip compression
+# -------------------------------------------------------------------
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", 1024))
+# payloads above this are compressed off the event loop
+GZIP_THREAD_THRESHOLD = int(os.getenv("GZIP_THREAD_THRESHOLD", 256 * 1024))
+
+# (max payload bytes, gzip level): small bodies get better ratios, large
+# ones a cheaper level so CPU per response stays bounded.
+LEVELS: List[Tuple[int, int]] = [
+    (64 * 1024, 6),
+    (1024 * 1024, 4),
+    (8 * 1024 * 1024, 2),
+]
+LARGEST_LEVEL = 1
+
+SKIP_MEDIA_TYPES = (b"text/event-stream", b"application/gzip", b"image/", b"application/octet-stream")
+
+COMPRESSION_BYTES = metrics.counter(
+    "composite_compression_bytes_total",
+    "Response bytes before and after gzip compression.",
+    ["stage"],
+)
+
+
+def choose_level(size: int) -> int:
+    for limit, level in LEVELS:
+        if size <= limit:
+            return level
+    return LARGEST_LEVEL
+
+
+def compress(body: bytes, level: Optional[int] = None) -> bytes:
+    if level is None:
+        level = choose_level(len(body))
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    if not accept_encoding:
+        return False
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        if token.strip().lower() in ("gzip", "*"):
+            params = params.replace(" ", "")
+            return params not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _vary(values: List[bytes]) -> bytes:
+    """The app's Vary values (e.g. Origin from CORS) plus Accept-Encoding."""
+    fields = [f.strip() for v in values for f in v.split(b",") if f.strip()]
+    if b"*" in fields:
+        return b"*"
+    if not any(f.lower() == b"accept-encoding" for f in fields):
+        fields.append(b"Accept-Encoding")
+    return b", ".join(fields)
+
+
+def gzip_response(gz_body: bytes, accept_encoding: Optional[str],
+                  media_type: str = "application/json", status_code: int = 200) -> Response:
+    """Serve an already-compressed body, inflating only for clients without gzip."""
+    if accepts_gzip(accept_encoding):
+        return Response(
+            content=gz_body, status_code=status_code, media_type=media_type,
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+        )
+    return Response(content=gzip.decompress(gz_body), status_code=status_code,
+                    media_type=media_type, headers={"Vary": "Accept-Encoding"})
+
+
+class GZipMiddleware:
+    """Pure ASGI gzip middleware with a size threshold and size-based level.
+
+    Only complete (non-streaming) bodies are compressed; streamed responses,
+    SSE, and responses that already carry Content-Encoding pass through.
+    """
+
+    def __init__(self, app, minimum_size: int = GZIP_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = None
+        for k, v in scope.get("headers", ()):
+            if k == b"accept-encoding":
+                accept = v.decode("latin-1")
+                break
+        if not accepts_gzip(accept):
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                skip = message["status"] in (204, 304) or any(
+                    (k.lower() == b"content-encoding")
+                    or (k.lower() == b"content-type" and v.startswith(SKIP_MEDIA_TYPES))
+                    for k, v in headers
+                )
+                if skip:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # streaming or too small: send unchanged
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) > GZIP_THREAD_THRESHOLD:
+                compressed = await anyio.to_thread.run_sync(compress, body)
+            else:
+                compressed = compress(body)
+            COMPRESSION_BYTES.inc("in", amount=len(body))
+            COMPRESSION_BYTES.inc("out", amount=len(compressed))
+            original = start_message.get("headers", [])
+            headers = [(k, v) for k, v in original if k.lower() not in (b"content-length", b"vary")]
+            headers += [
+                (b"content-encoding", b"gzip"),
+                (b"vary", _vary([v for k, v in original if k.lower() == b"vary"])),
+                (b"content-length", str(len(compressed)).encode()),
+            ]
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,294 @@
+from __future__ import annotations
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# -------------------------------------------------------------------
+# Minimal Prometheus-style registry (text exposition format 0.0.4)
+# -------------------------------------------------------------------
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic counter keyed by label values."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+            for k, v in items
+        ]
+
+
+class Gauge(_Metric):
+    """Gauge that can go up and down."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+            for k, v in items
+        ]
+
+
+class GaugeCallback(_Metric):
+    """Gauge whose samples are computed at scrape time.
+
+    ``fn`` returns either a single number (no labels) or an iterable of
+    ``(label_values, value)`` pairs.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 fn: Callable[[], object]):
+        super().__init__(name, documentation, labelnames)
+        self._fn = fn
+
+    def samples(self) -> List[str]:
+        result = self._fn()
+        if isinstance(result, (int, float)):
+            pairs: Iterable[Tuple[LabelValues, float]] = [((), result)]
+        else:
+            pairs = result  # type: ignore[assignment]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+            for k, v in pairs
+        ]
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed buckets."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = [0.0] * (len(self.buckets) + 2)
+                self._values[labels] = row
+            row[idx] += 1
+            row[-1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = []
+        for labels, row in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                out.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} "
+                    f"{_format_value(cumulative)}"
+                )
+            label_str = _format_labels(self.labelnames, labels)
+            out.append(f"{self.name}_sum{label_str} {_format_value(row[-1])}")
+            out.append(f"{self.name}_count{label_str} {_format_value(cumulative)}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.header())
+            lines.extend(m.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+
+def gauge_callback(name: str, documentation: str, labelnames: Sequence[str],
+                   fn: Callable[[], object]) -> GaugeCallback:
+    return REGISTRY.register(GaugeCallback(name, documentation, labelnames, fn))  # type: ignore[return-value]
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# -------------------------------------------------------------------
+# Built-in metrics
+# -------------------------------------------------------------------
+HTTP_REQUESTS = counter(
+    "composite_http_requests_total",
+    "Incoming HTTP requests by method, route template and status.",
+    ["method", "route", "status"],
+)
+HTTP_LATENCY = histogram(
+    "composite_http_request_duration_seconds",
+    "Incoming HTTP request latency by method and route template.",
+    ["method", "route"],
+)
+HTTP_IN_FLIGHT = gauge(
+    "composite_http_requests_in_flight",
+    "Incoming HTTP requests currently being handled.",
+)
+UPSTREAM_REQUESTS = counter(
+    "composite_upstream_requests_total",
+    "Calls to atomic services by host, method, path template and status.",
+    ["host", "method", "path", "status"],
+)
+UPSTREAM_LATENCY = histogram(
+    "composite_upstream_request_duration_seconds",
+    "Latency of calls to atomic services by host, method, path template and status.",
+    ["host", "method", "path", "status"],
+)
+UPSTREAM_IN_FLIGHT = gauge(
+    "composite_upstream_requests_in_flight",
+    "Calls to atomic services currently outstanding, by host.",
+    ["host"],
+)
+
+
+# -------------------------------------------------------------------
+# ASGI middleware
+# -------------------------------------------------------------------
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route request counts and latency.
+
+    The route label is the matched path template (e.g.
+    ``/composite/users/{user_id}``), so label cardinality stays bounded.
+    """
+
+    def __init__(self, app, skip_paths: Optional[Sequence[str]] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = frozenset(skip_paths or ())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, template, str(status_code))
+            HTTP_LATENCY.observe(elapsed, method, template)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+import anyio
+
+from framework.debug import is_debug_token
+
+# -------------------------------------------------------------------
+# On-demand per-request profiling
+# -------------------------------------------------------------------
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
+
+_NAME_RE = re.compile(r"^[\w.\-]+\.pstats$")
+
+
+class ProfileSession:
+    """Collects cProfile data from every thread that works on one request.
+
+    cProfile only sees the thread it is enabled in, so the endpoint wrapper
+    and ContextThreadPoolExecutor each profile their own slice of the work
+    and hand it back here to be merged.
+    """
+
+    def __init__(self, profile_id: str):
+        self.profile_id = profile_id
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def run(self, fn, *args, **kwargs):
+        if self.closed:
+            return fn(*args, **kwargs)
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # another profiler is already active in this thread
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            prof.disable()
+            with self._lock:
+                if not self.closed:
+                    self._profiles.append(prof)
+
+    def close(self) -> List[cProfile.Profile]:
+        with self._lock:
+            self.closed = True
+            profiles, self._profiles = self._profiles, []
+        return profiles
+
+
+_session: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+
+
+def current_session() -> Optional[ProfileSession]:
+    return _session.get()
+
+
+def call(fn, *args, **kwargs):
+    """Run ``fn`` under the active profile session, if any."""
+    s = _session.get()
+    if s is None:
+        return fn(*args, **kwargs)
+    return s.run(fn, *args, **kwargs)
+
+
+def _dump(profiles: List[cProfile.Profile], path: str) -> None:
+    stats = pstats.Stats(profiles[0])
+    for p in profiles[1:]:
+        stats.add(p)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    stats.dump_stats(path)
+    _prune()
+
+
+def _prune() -> None:
+    files = list_profiles()
+    for entry in files[PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, entry["name"]))
+        except OSError:
+            pass
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Stored profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    out = []
+    for name in os.listdir(PROFILE_DIR):
+        if not _NAME_RE.match(name):
+            continue
+        st = os.stat(os.path.join(PROFILE_DIR, name))
+        out.append({"name": name, "size": st.st_size, "created_at": st.st_mtime})
+    out.sort(key=lambda e: e["created_at"], reverse=True)
+    return out
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Resolve a stored profile name to a path, rejecting anything else."""
+    if not _NAME_RE.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+# pstats.SortKey values plus the older aliases (tottime, cumtime, ncalls, ...)
+SORT_KEYS = frozenset(k.value for k in pstats.SortKey) | frozenset(pstats.Stats.sort_arg_dict_default)
+
+
+def render_text(path: str, sort: str = "cumulative", limit: int = 50) -> str:
+    """Text report of a stored profile; ``sort`` must be one of SORT_KEYS."""
+    buf = io.StringIO()
+    stats = pstats.Stats(path, stream=buf)
+    stats.sort_stats(sort).print_stats(limit)
+    return buf.getvalue()
+
+
+# -------------------------------------------------------------------
+# ASGI middleware
+# -------------------------------------------------------------------
+class ProfilingMiddleware:
+    """Profiles a request when asked for with ``X-Profile: 1`` plus a valid
+    ``X-Debug-Token``, or when it falls in ``PROFILE_SAMPLE_RATE``.
+
+    When neither applies the only cost is a header scan per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wanted(self, scope) -> bool:
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return True
+        flag = token = None
+        for k, v in scope.get("headers", ()):
+            if k == b"x-profile":
+                flag = v
+            elif k == b"x-debug-token":
+                token = v
+        return flag in (b"1", b"true") and is_debug_token(token.decode("latin-1") if token else None)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/debug/") or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(f"{int(time.time())}-{uuid.uuid4().hex[:8]}")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", f"{session.profile_id}.pstats".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _session.set(session)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _session.reset(token)
+            profiles = session.close()
+            if profiles:
+                path = os.path.join(PROFILE_DIR, f"{session.profile_id}.pstats")
+                await anyio.to_thread.run_sync(_dump, profiles, path)
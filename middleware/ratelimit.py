@@ -0,0 +1,266 @@
+from __future__ import annotations
+import hashlib
+import logging
+import math
+import os
+import re
+import time
+from typing import Dict, List, Optional, Pattern, Sequence, Tuple
+
+from middleware import metrics
+from utils import fastjson
+
+try:
+    import redis.asyncio as _redis
+except ImportError:  # pragma: no cover - redis is optional
+    _redis = None
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------------------------------------
+# Per-client token-bucket rate limiting
+# -------------------------------------------------------------------
+# Each client (known API key, else IP) has one bucket of RATE_LIMIT_BURST
+# tokens refilled at RATE_LIMIT_RATE tokens/s. A request takes tokens in
+# proportion to the upstream calls it fans out to, so an order summary
+# costs far more than a single product lookup. Off unless RATE_LIMIT=1.
+RATE_LIMIT = os.getenv("RATE_LIMIT", "0") == "1"
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", 20))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", 200))
+RATE_LIMIT_CLEANUP_SECONDS = float(os.getenv("RATE_LIMIT_CLEANUP_SECONDS", 60))
+# proxies in front of us that append to X-Forwarded-For; 0 uses the peer address.
+# Behind Cloud Run every peer is its front end, so set 1 there or all
+# clients share one bucket.
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", 0))
+# comma-separated API keys that get a bucket of their own; any other
+# X-API-Key is ignored, so made-up keys cannot mint fresh buckets
+RATE_LIMIT_API_KEYS = frozenset(
+    k.strip().encode() for k in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if k.strip()
+)
+# shared buckets across replicas; unset keeps state in-process
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+
+RATE_LIMITED = metrics.counter(
+    "composite_rate_limited_total",
+    "Requests rejected by the per-client rate limiter, by route class.",
+    ["route"],
+)
+
+
+def _cost(name: str, default: float) -> float:
+    return float(os.getenv(f"RATE_LIMIT_COST_{name.upper()}", default))
+
+
+# (name, method or None for any, path pattern, tokens); first match wins.
+# Costs follow the upstream fan-out of each route; a cost of 0 exempts
+# the route. Report status polls are exempt: the job was paid for by
+# its POST, and polling it touches no upstream.
+COST_RULES: Sequence[Tuple[str, Optional[str], Pattern[str], float]] = (
+    ("summary", "GET", re.compile(r"^/composite/users/[^/]+/order-summary$"), _cost("summary", 50)),
+    ("report", "POST", re.compile(r"^/composite/reports/"), _cost("report", 50)),
+    ("report_status", "GET", re.compile(r"^/composite/reports/"), _cost("report_status", 0)),
+    ("checkout", "POST", re.compile(r"^/composite/users/[^/]+/checkout$"), _cost("checkout", 5)),
+    ("quote", "POST", re.compile(r"^/composite/users/[^/]+/cart/quote$"), _cost("quote", 5)),
+    ("addresses", "GET", re.compile(r"^/composite/users/[^/]+/addresses$"), _cost("addresses", 5)),
+    ("product_batch", "POST", re.compile(r"^/composite/products:batchGet$"), _cost("product_batch", 10)),
+    ("search", "GET", re.compile(r"^/composite/products/search$"), _cost("search", 1)),
+    ("default", None, re.compile(r"^/composite/"), _cost("default", 1)),
+)
+
+
+def route_cost(method: str, path: str) -> Optional[Tuple[str, float]]:
+    for name, rule_method, pattern, cost in COST_RULES:
+        if (rule_method is None or rule_method == method) and pattern.match(path):
+            return (name, cost) if cost > 0 else None
+    return None
+
+
+def client_key(scope) -> str:
+    """A known API key (hashed) when present, else the client IP."""
+    forwarded = None
+    for name, value in scope.get("headers", ()):
+        if name == b"x-api-key" and value in RATE_LIMIT_API_KEYS:
+            return "key:" + hashlib.sha256(value).hexdigest()[:16]
+        if name == b"x-forwarded-for":
+            forwarded = value
+    if RATE_LIMIT_PROXY_HOPS and forwarded:
+        hops = [h.strip() for h in forwarded.decode("latin-1").split(",")]
+        if len(hops) >= RATE_LIMIT_PROXY_HOPS:
+            return "ip:" + hops[-RATE_LIMIT_PROXY_HOPS]
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+# -------------------------------------------------------------------
+# Backends: take(key, cost) -> (allowed, remaining tokens, seconds until full)
+# -------------------------------------------------------------------
+class LocalBackend:
+    """In-process buckets as ``key -> (tokens, last refill)`` tuples.
+
+    Only touched from the event loop, so no lock is needed. Buckets that
+    have refilled completely are dropped every RATE_LIMIT_CLEANUP_SECONDS.
+    """
+
+    def __init__(self, rate: float = RATE_LIMIT_RATE, burst: float = RATE_LIMIT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        self._next_cleanup = time.monotonic() + RATE_LIMIT_CLEANUP_SECONDS
+
+    def _cleanup(self, now: float) -> None:
+        full_after = self.burst / self.rate
+        self.buckets = {k: b for k, b in self.buckets.items() if now - b[1] < full_after}
+        self._next_cleanup = now + RATE_LIMIT_CLEANUP_SECONDS
+
+    def take_now(self, key: str, cost: float) -> Tuple[bool, float, float]:
+        now = time.monotonic()
+        if now >= self._next_cleanup:
+            self._cleanup(now)
+        tokens, last = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self.buckets[key] = (tokens, now)
+        return allowed, tokens, (self.burst - tokens) / self.rate
+
+    async def take(self, key: str, cost: float) -> Tuple[bool, float, float]:
+        return self.take_now(key, cost)
+
+
+# refill and take atomically; bucket hash expires once it would be full again
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(b[1]) or burst
+local ts = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBackend:
+    """Buckets shared between replicas in Redis.
+
+    Falls back to a local bucket while Redis is unreachable, so an outage
+    loosens limits to per-replica rather than rejecting traffic.
+    """
+
+    def __init__(self, url: str, rate: float = RATE_LIMIT_RATE, burst: float = RATE_LIMIT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.client = _redis.from_url(url)
+        self.script = self.client.register_script(_TAKE_SCRIPT)
+        self.fallback = LocalBackend(rate, burst)
+
+    async def take(self, key: str, cost: float) -> Tuple[bool, float, float]:
+        try:
+            allowed, tokens = await self.script(keys=[f"ratelimit:{key}"],
+                                                args=[self.rate, self.burst, cost])
+        except Exception as e:
+            logger.warning("rate limit backend unavailable, using local buckets: %s", e)
+            return self.fallback.take_now(key, cost)
+        tokens = float(tokens)
+        return bool(allowed), tokens, (self.burst - tokens) / self.rate
+
+
+def default_backend():
+    if RATE_LIMIT_REDIS_URL and _redis is not None:
+        return RedisBackend(RATE_LIMIT_REDIS_URL)
+    if RATE_LIMIT_REDIS_URL:
+        logger.warning("RATE_LIMIT_REDIS_URL is set but redis is not installed; using local buckets")
+    return LocalBackend()
+
+
+_backend = None
+
+
+def shared_backend():
+    global _backend
+    if _backend is None:
+        _backend = default_backend()
+    return _backend
+
+
+async def charge(scope, method: str, path: str) -> Optional[int]:
+    """Take tokens for a sub-request made on behalf of ``scope``'s client.
+
+    Returns None when allowed, else the seconds to wait before retrying.
+    """
+    if not RATE_LIMIT:
+        return None
+    rule = route_cost(method, path)
+    if rule is None:
+        return None
+    name, cost = rule
+    backend = shared_backend()
+    cost = min(cost, backend.burst)
+    allowed, remaining, _ = await backend.take(client_key(scope), cost)
+    if allowed:
+        return None
+    RATE_LIMITED.inc(name)
+    return max(math.ceil((cost - remaining) / backend.rate), 1)
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware enforcing per-client buckets on /composite routes.
+
+    Every limited response carries RateLimit-Limit / -Remaining / -Reset
+    (IETF draft headers); rejections are 429 with Retry-After.
+    """
+
+    def __init__(self, app, backend=None):
+        self.app = app
+        self.backend = backend or shared_backend()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT:
+            await self.app(scope, receive, send)
+            return
+        rule = route_cost(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+        name, cost = rule
+        cost = min(cost, self.backend.burst)
+        allowed, remaining, reset = await self.backend.take(client_key(scope), cost)
+        limit_headers: List[Tuple[bytes, bytes]] = [
+            (b"ratelimit-limit", str(int(self.backend.burst)).encode()),
+            (b"ratelimit-remaining", str(int(remaining)).encode()),
+            (b"ratelimit-reset", str(math.ceil(reset)).encode()),
+            (b"ratelimit-policy", f"{int(self.backend.burst)};w={math.ceil(self.backend.burst / self.backend.rate)}".encode()),
+        ]
+        if not allowed:
+            RATE_LIMITED.inc(name)
+            retry_after = math.ceil((cost - remaining) / self.backend.rate)
+            body = fastjson.dumps({"detail": "Rate limit exceeded, retry later"})
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(max(retry_after, 1)).encode()),
+                    *limit_headers,
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + limit_headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
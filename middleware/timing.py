@@ -0,0 +1,121 @@
+from __future__ import annotations
+import threading
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence
+
+# -------------------------------------------------------------------
+# Per-request timing context rendered as a Server-Timing header
+# -------------------------------------------------------------------
+
+
+class RequestTiming:
+    """Accumulates timings for one request.
+
+    Upstream durations are summed per service, so with concurrent fan-out
+    (order_summary) they can exceed the total wall-clock time.
+    """
+    __slots__ = (
+        "start", "upstream", "upstream_calls", "cache_hits",
+        "json_time", "handler_time", "route_time", "_lock",
+    )
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.upstream: Dict[str, List[float]] = {}   # service -> [seconds, calls]
+        self.upstream_calls = 0
+        self.cache_hits = 0
+        self.json_time = 0.0
+        self.handler_time: Optional[float] = None
+        self.route_time: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add_upstream(self, service: str, seconds: float) -> None:
+        with self._lock:
+            row = self.upstream.get(service)
+            if row is None:
+                self.upstream[service] = [seconds, 1]
+            else:
+                row[0] += seconds
+                row[1] += 1
+            self.upstream_calls += 1
+
+    def add_json(self, seconds: float) -> None:
+        with self._lock:
+            self.json_time += seconds
+
+    def add_cache_hit(self, n: int = 1) -> None:
+        with self._lock:
+            self.cache_hits += n
+
+    def header_value(self) -> str:
+        total = perf_counter() - self.start
+        parts = [f"total;dur={total * 1000:.1f}"]
+        if self.handler_time is not None:
+            parts.append(f"handler;dur={self.handler_time * 1000:.1f}")
+        with self._lock:
+            upstream = {k: tuple(v) for k, v in self.upstream.items()}
+            calls, hits, json_time = self.upstream_calls, self.cache_hits, self.json_time
+        for service, (seconds, n) in upstream.items():
+            parts.append(f'{service};dur={seconds * 1000:.1f};desc="{int(n)} calls"')
+        parts.append(f'upstream;desc="calls={calls}"')
+        parts.append(f'cache;desc="hits={hits}"')
+        parts.append(f"json;dur={json_time * 1000:.1f}")
+        if self.route_time is not None and self.handler_time is not None:
+            # body parsing + response_model validation + serialization
+            validate = max(self.route_time - self.handler_time, 0.0)
+            parts.append(f"validate;dur={validate * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def current() -> Optional[RequestTiming]:
+    return _current.get()
+
+
+def record_upstream(service: str, seconds: float) -> None:
+    t = _current.get()
+    if t is not None:
+        t.add_upstream(service, seconds)
+
+
+def record_json(seconds: float) -> None:
+    t = _current.get()
+    if t is not None:
+        t.add_json(seconds)
+
+
+def record_cache_hit(n: int = 1) -> None:
+    t = _current.get()
+    if t is not None:
+        t.add_cache_hit(n)
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware adding a ``Server-Timing`` header to responses."""
+
+    def __init__(self, app, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        t = RequestTiming()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", t.header_value().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current.set(t)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
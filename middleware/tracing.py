@@ -0,0 +1,302 @@
+from __future__ import annotations
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence
+
+# -------------------------------------------------------------------
+# Lightweight tracing with W3C traceparent propagation
+# -------------------------------------------------------------------
+# off by default; when on, sample a tenth of new traces (an incoming
+# traceparent keeps its own sampled flag) so the span buffer stays cheap
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0") == "1"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "memory")  # comma-separated: memory,jsonl,none
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "traces.jsonl")
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 5000))
+
+
+class Span:
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind", "sampled",
+        "start_time", "end_time", "attributes", "status", "_start_perf",
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str],
+                 kind: str = "internal", sampled: bool = True,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.start_time = time.time()
+        self._start_perf = time.perf_counter()
+        self.end_time: Optional[float] = None
+        self.attributes: Dict[str, Any] = attributes or {}
+        self.status = "ok"
+
+    @property
+    def duration_ms(self) -> float:
+        if self.end_time is None:
+            return 0.0
+        return (self.end_time - self.start_time) * 1000
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        self.end_time = self.start_time + (time.perf_counter() - self._start_perf)
+
+    def traceparent(self) -> str:
+        flags = "01" if self.sampled else "00"
+        return f"00-{self.trace_id}-{self.span_id}-{flags}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+# -------------------------------------------------------------------
+# Exporters
+# -------------------------------------------------------------------
+class SpanExporter:
+    """Base exporter; subclasses receive every finished, sampled span."""
+
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    """Ring buffer of the most recent spans, viewable via /debug/traces."""
+
+    def __init__(self, maxlen: int = TRACE_BUFFER_SIZE):
+        self._spans: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+
+    def export(self, span: Span) -> None:
+        self._spans.append(span.to_dict())
+
+    def spans(self) -> List[Dict[str, Any]]:
+        return list(self._spans)
+
+    def traces(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Summaries of the most recent root spans, newest first."""
+        out = []
+        for s in reversed(self.spans()):
+            if s["parent_id"] is None or s["kind"] == "server":
+                out.append({
+                    "trace_id": s["trace_id"],
+                    "name": s["name"],
+                    "start_time": s["start_time"],
+                    "duration_ms": s["duration_ms"],
+                    "status": s["status"],
+                })
+                if len(out) >= limit:
+                    break
+        return out
+
+    def trace(self, trace_id: str) -> List[Dict[str, Any]]:
+        return sorted(
+            (s for s in self.spans() if s["trace_id"] == trace_id),
+            key=lambda s: s["start_time"],
+        )
+
+
+class JsonlExporter(SpanExporter):
+    """Appends one JSON object per span to a local file."""
+
+    def __init__(self, path: str = TRACE_JSONL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._fh.write(line + "\n")
+            if span.kind == "server":
+                self._fh.flush()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+
+class MultiExporter(SpanExporter):
+    def __init__(self, exporters: Sequence[SpanExporter]):
+        self.exporters = list(exporters)
+
+    def export(self, span: Span) -> None:
+        for e in self.exporters:
+            e.export(span)
+
+    def shutdown(self) -> None:
+        for e in self.exporters:
+            e.shutdown()
+
+
+def _exporter_from_env() -> Optional[SpanExporter]:
+    exporters: List[SpanExporter] = []
+    for name in (n.strip() for n in TRACE_EXPORTER.split(",")):
+        if name == "memory":
+            exporters.append(InMemoryExporter())
+        elif name == "jsonl":
+            exporters.append(JsonlExporter())
+    if not exporters:
+        return None
+    return exporters[0] if len(exporters) == 1 else MultiExporter(exporters)
+
+
+_exporter: Optional[SpanExporter] = _exporter_from_env() if TRACING_ENABLED else None
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def set_exporter(exporter: Optional[SpanExporter]) -> None:
+    """Replace the active exporter (``None`` disables tracing)."""
+    global _exporter
+    if _exporter is not None:
+        _exporter.shutdown()
+    _exporter = exporter
+
+
+def memory_exporter() -> Optional[InMemoryExporter]:
+    """Return the in-memory ring buffer exporter, if one is configured."""
+    if isinstance(_exporter, InMemoryExporter):
+        return _exporter
+    if isinstance(_exporter, MultiExporter):
+        for e in _exporter.exporters:
+            if isinstance(e, InMemoryExporter):
+                return e
+    return None
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def parse_traceparent(value: Optional[str]):
+    """Parse a W3C ``traceparent`` header into (trace_id, parent_id, sampled)."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    trace_id, parent_id, flags = parts[1], parts[2], parts[3]
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    try:
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return trace_id.lower(), parent_id.lower(), sampled
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes: Any) -> Iterator[Optional[Span]]:
+    """Start a child of the current span (no-op when there is no active trace)."""
+    parent = _current_span.get()
+    if _exporter is None or parent is None:
+        yield None
+        return
+    s = Span(name, parent.trace_id, parent.span_id, kind, parent.sampled, attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException:
+        s.status = "error"
+        raise
+    finally:
+        _current_span.reset(token)
+        s.end()
+        if s.sampled:
+            _exporter.export(s)
+
+
+def inject(headers: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+    """Return ``headers`` with a ``traceparent`` for the current span added."""
+    s = _current_span.get()
+    if s is None:
+        return headers
+    out = dict(headers) if headers else {}
+    out.setdefault("traceparent", s.traceparent())
+    return out
+
+
+# -------------------------------------------------------------------
+# ASGI middleware
+# -------------------------------------------------------------------
+class TracingMiddleware:
+    """Pure ASGI middleware opening a root (server) span per request."""
+
+    def __init__(self, app, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            _exporter is None
+            or scope["type"] != "http"
+            or scope["path"] in self.skip_paths
+            or scope["path"].startswith("/debug/")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for k, v in scope.get("headers", ()):
+            if k == b"traceparent":
+                incoming = parse_traceparent(v.decode("latin-1"))
+                break
+        if incoming is not None:
+            trace_id, parent_id, sampled = incoming
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+            sampled = random.random() < TRACE_SAMPLE_RATE
+
+        root = Span(f"{scope['method']} {scope['path']}", trace_id, parent_id, "server", sampled)
+        root.attributes["http.method"] = scope["method"]
+        root.attributes["http.target"] = scope["path"]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                if message["status"] >= 500:
+                    root.status = "error"
+                headers = list(message.get("headers", []))
+                headers.append((b"traceparent", root.traceparent().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            root.status = "error"
+            raise
+        finally:
+            _current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+                root.attributes["http.route"] = route.path
+            root.end()
+            if root.sampled and _exporter is not None:
+                _exporter.export(root)
@@ -1,15 +1,54 @@
 from __future__ import annotations
+import os
 from uuid import UUID
-from typing import List
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 
+from models.product import ProductRead
+
 class CheckoutItem(BaseModel):
     product_id: UUID
     quantity: int = Field(gt=0)
 
 class CheckoutRequest(BaseModel):
     items: List[CheckoutItem]
+    quote_id: Optional[str] = Field(None, description="From POST /composite/users/{user_id}/cart/quote; skips re-pricing while fresh")
 
 class OperationStatus(BaseModel):
     operation_id: str
     status: str
+
+class BatchItem(BaseModel):
+    id: Optional[str] = Field(None, description="Name other items use to reference this one's result")
+    method: str = Field("GET", json_schema_extra={"example": "GET"})
+    path: str = Field(..., description="Composite route, optionally with a query string",
+                      json_schema_extra={"example": "/composite/users/{{user.user_id}}/addresses"})
+    body: Optional[Any] = None
+    headers: Dict[str, str] = Field(default_factory=dict)
+    depends_on: List[str] = Field(default_factory=list)
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(..., min_length=1)
+
+class BatchItemResult(BaseModel):
+    id: Optional[str] = None
+    status: int
+    headers: Dict[str, str] = Field(default_factory=dict)
+    body: Optional[Any] = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchItemResult]
+
+# most ids one POST /composite/products:batchGet may ask for
+PRODUCT_BATCH_MAX_IDS = int(os.getenv("PRODUCT_BATCH_MAX_IDS", 500))
+
+class ProductBatchGetRequest(BaseModel):
+    ids: List[UUID] = Field(..., min_length=1, max_length=PRODUCT_BATCH_MAX_IDS)
+
+class ProductBatchGetItem(BaseModel):
+    product_id: UUID
+    found: bool
+    product: Optional[ProductRead] = None
+
+class ProductBatchGetResponse(BaseModel):
+    products: List[ProductBatchGetItem]
@@ -0,0 +1,110 @@
+from __future__ import annotations
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import HTTPException
+
+from framework.executor import ContextThreadPoolExecutor
+from middleware import metrics, timing
+from services import upstream
+from utils import fastjson
+from utils.cache import TTLCache
+
+# -------------------------------------------------------------------
+# Address resolution for users (shared cache keyed by addr_id)
+# -------------------------------------------------------------------
+ADDRESS_CACHE_TTL = float(os.getenv("ADDRESS_CACHE_TTL", 300))
+ADDRESS_CACHE_SIZE = int(os.getenv("ADDRESS_CACHE_SIZE", 10000))
+ADDRESS_FETCH_WORKERS = int(os.getenv("ADDRESS_FETCH_WORKERS", 16))
+# set to 1 when the User Service accepts GET /addresses?ids=a,b,c
+ADDRESS_BATCH_LOOKUP = os.getenv("ADDRESS_BATCH_LOOKUP", "0") == "1"
+ADDRESS_BATCH_SIZE = int(os.getenv("ADDRESS_BATCH_SIZE", 100))
+
+ADDRESS_LOOKUPS = metrics.counter(
+    "composite_address_lookups_total",
+    "Address lookups by source: cache, batch request or single request.",
+    ["source"],
+)
+
+
+def _upstream_error(resp) -> HTTPException:
+    return HTTPException(status_code=502, detail=f"Upstream error from Address ({resp.status_code})")
+
+
+class AddressResolver:
+    """Resolves addr_ids to address rows with a TTL cache and concurrent fetches.
+
+    Own executor: callers already run inside summary_executor tasks, and
+    waiting on the same pool from one of its workers could deadlock.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.cache: TTLCache[Dict[str, Any]] = TTLCache(ADDRESS_CACHE_TTL, ADDRESS_CACHE_SIZE)
+        self.executor = ContextThreadPoolExecutor(max_workers=ADDRESS_FETCH_WORKERS,
+                                                  thread_name_prefix="address")
+
+    def _fetch_one(self, addr_id: str) -> Optional[Dict[str, Any]]:
+        resp = upstream.get(f"{self.base_url}/addresses/{addr_id}")
+        if resp.status_code in (404, 501):
+            return None
+        if not resp.ok:
+            raise _upstream_error(resp)
+        return fastjson.loads(resp.content)
+
+    def _fetch_batch(self, ids: List[str]) -> List[Dict[str, Any]]:
+        resp = upstream.get(f"{self.base_url}/addresses", params={"ids": ",".join(ids)})
+        if not resp.ok:
+            raise _upstream_error(resp)
+        return fastjson.loads(resp.content)
+
+    def resolve(self, addr_ids: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        """addr_id -> address for every id that exists upstream."""
+        ids = list(dict.fromkeys(str(a) for a in addr_ids))
+        found: Dict[str, Dict[str, Any]] = self.cache.get_many(ids)  # type: ignore[assignment]
+        if found:
+            ADDRESS_LOOKUPS.inc("cache", amount=len(found))
+            timing.record_cache_hit(len(found))
+        missing = [a for a in ids if a not in found]
+        if not missing:
+            return found
+
+        fetched: List[Dict[str, Any]] = []
+        if ADDRESS_BATCH_LOOKUP:
+            chunks = [missing[i:i + ADDRESS_BATCH_SIZE] for i in range(0, len(missing), ADDRESS_BATCH_SIZE)]
+            ADDRESS_LOOKUPS.inc("batch", amount=len(missing))
+            if len(chunks) == 1:
+                fetched = self._fetch_batch(chunks[0])
+            else:
+                for rows in self.executor.map(self._fetch_batch, chunks):
+                    fetched.extend(rows)
+        else:
+            ADDRESS_LOOKUPS.inc("single", amount=len(missing))
+            if len(missing) == 1:
+                results = [self._fetch_one(missing[0])]
+            else:
+                results = list(self.executor.map(self._fetch_one, missing))
+            fetched = [r for r in results if r is not None]
+
+        wanted = set(missing)
+        for row in fetched:
+            key = str(row.get("addr_id"))
+            if key in wanted:
+                self.cache.set(key, row)
+                found[key] = row
+        return found
+
+    def for_user(self, user_id: Any) -> List[Dict[str, Any]]:
+        """Addresses linked to a user, in mapping order."""
+        resp = upstream.get(f"{self.base_url}/user_addresses", params={"user_id": str(user_id)})
+        if resp.status_code in (404, 501):
+            return []
+        if not resp.ok:
+            raise HTTPException(status_code=502, detail=f"Upstream error from UserAddress ({resp.status_code})")
+        ids = [str(m["addr_id"]) for m in fastjson.loads(resp.content)]
+        rows = self.resolve(ids)
+        return [rows[a] for a in dict.fromkeys(ids) if a in rows]
+
+    def invalidate(self, addr_id: Any) -> None:
+        """Drop a cached address after it was changed through this service."""
+        self.cache.delete(str(addr_id))
@@ -0,0 +1,306 @@
+from __future__ import annotations
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from middleware import metrics
+from models.category import CategoryRead
+from models.inventory import InventoryRead
+from models.product import ProductRead
+from services import upstream
+from utils import fastjson
+
+# -------------------------------------------------------------------
+# In-memory replica of the product catalog
+# -------------------------------------------------------------------
+# Products, categories and inventories change a few times an hour, so the
+# list/get proxies can be answered from a local copy. The replica does a
+# full load at startup, delta syncs on updated_at every
+# CATALOG_SYNC_SECONDS, and a full resync every CATALOG_FULL_SYNC_SECONDS
+# to pick up deletions made elsewhere. Writes made through this service
+# are applied immediately. If no sync has succeeded within
+# CATALOG_MAX_STALENESS, callers fall back to the Product Service.
+#
+# Delta syncs rely on the Product Service honouring an
+# ``<updated_field>_from`` filter on its list routes. A table whose delta
+# comes back with rows older than the watermark is taken to ignore the
+# filter: that response is merged as a full sync and the table is fully
+# synced from then on. CATALOG_DELTA_SYNC=0 skips deltas altogether.
+CATALOG_REPLICA = os.getenv("CATALOG_REPLICA", "0") == "1"
+CATALOG_SYNC_SECONDS = float(os.getenv("CATALOG_SYNC_SECONDS", 30))
+CATALOG_FULL_SYNC_SECONDS = float(os.getenv("CATALOG_FULL_SYNC_SECONDS", 600))
+CATALOG_MAX_STALENESS = float(os.getenv("CATALOG_MAX_STALENESS", 120))
+CATALOG_TIMEOUT = float(os.getenv("CATALOG_TIMEOUT", 10))
+CATALOG_DELTA_SYNC = os.getenv("CATALOG_DELTA_SYNC", "1") == "1"
+
+logger = logging.getLogger("composite.catalog")
+
+CATALOG_SYNCS = metrics.counter(
+    "composite_catalog_syncs_total",
+    "Catalog replica syncs by kind (full/delta) and outcome.",
+    ["kind", "outcome"],
+)
+CATALOG_READS = metrics.counter(
+    "composite_catalog_reads_total",
+    "Catalog reads served from the replica or passed to the Product Service.",
+    ["table", "source"],
+)
+CATALOG_INVALID = metrics.counter(
+    "composite_catalog_invalid_rows_total",
+    "Upstream catalog rows skipped because they failed validation.",
+    ["table"],
+)
+
+# listener(table, op, row) with op in {"upsert", "delete"}
+Listener = Callable[[str, str, Dict[str, Any]], None]
+
+
+class Table:
+    """Rows keyed by primary key with hash indexes on selected fields."""
+
+    def __init__(self, name: str, path: str, key: str, updated_field: str,
+                 model: type, indexes: Sequence[str]):
+        self.name = name
+        self.path = path
+        self.key = key
+        self.updated_field = updated_field
+        self.adapter: TypeAdapter = TypeAdapter(model)
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.indexes: Dict[str, Dict[str, Set[str]]] = {f: {} for f in indexes}
+        self.watermark: Optional[str] = None
+        # None until a delta sync shows whether the upstream filters on updated_field
+        self.delta_supported: Optional[bool] = None if CATALOG_DELTA_SYNC else False
+
+    def normalize(self, raw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Validate once at ingest so reads can be served without re-validation."""
+        try:
+            model: BaseModel = self.adapter.validate_python(raw)
+        except ValidationError:
+            CATALOG_INVALID.inc(self.name)
+            return None
+        return model.model_dump(mode="json")
+
+    def _index(self, pk: str, row: Dict[str, Any]) -> None:
+        for field, index in self.indexes.items():
+            value = row.get(field)
+            if value is not None:
+                index.setdefault(str(value), set()).add(pk)
+
+    def _unindex(self, pk: str, row: Dict[str, Any]) -> None:
+        for field, index in self.indexes.items():
+            value = row.get(field)
+            if value is None:
+                continue
+            keys = index.get(str(value))
+            if keys is not None:
+                keys.discard(pk)
+                if not keys:
+                    del index[str(value)]
+
+    def upsert(self, row: Dict[str, Any]) -> bool:
+        pk = str(row[self.key])
+        old = self.rows.get(pk)
+        if old == row:
+            return False
+        if old is not None:
+            self._unindex(pk, old)
+        self.rows[pk] = row
+        self._index(pk, row)
+        updated = row.get(self.updated_field)
+        if updated is not None and (self.watermark is None or str(updated) > self.watermark):
+            self.watermark = str(updated)
+        return True
+
+    def ignored_filter(self, rows: List[Dict[str, Any]], since: str) -> bool:
+        """Whether a delta since ``since`` returned rows it should have filtered out."""
+        return any(
+            r.get(self.updated_field) is not None and str(r[self.updated_field]) < since
+            for r in rows
+        )
+
+    def remove(self, pk: str) -> Optional[Dict[str, Any]]:
+        old = self.rows.pop(pk, None)
+        if old is not None:
+            self._unindex(pk, old)
+        return old
+
+    def where(self, **filters: Any) -> List[Dict[str, Any]]:
+        """Rows matching every non-None filter (exact match, like the upstream)."""
+        active = {k: str(v) for k, v in filters.items() if v is not None}
+        if not active:
+            return list(self.rows.values())
+        candidates: Optional[Set[str]] = None
+        rest = {}
+        for field, value in active.items():
+            index = self.indexes.get(field)
+            if index is None:
+                rest[field] = value
+                continue
+            keys = index.get(value, set())
+            candidates = keys if candidates is None else candidates & keys
+            if not candidates:
+                return []
+        rows: Iterable[Dict[str, Any]] = (
+            self.rows.values() if candidates is None else (self.rows[pk] for pk in candidates)
+        )
+        if rest:
+            rows = (r for r in rows if all(str(r.get(f)) == v for f, v in rest.items()))
+        return list(rows)
+
+
+class CatalogReplica:
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.tables: Dict[str, Table] = {
+            "products": Table("products", "/products", "product_id", "updated_at",
+                              ProductRead, ["category_id", "inventory_id"]),
+            "categories": Table("categories", "/categories", "category_id", "updated_at",
+                                CategoryRead, ["name"]),
+            "inventories": Table("inventories", "/inventories", "inventory_id", "update_time",
+                                 InventoryRead, ["product_id", "warehouse_location"]),
+        }
+        self.listeners: List[Listener] = []
+        self.last_sync: Optional[float] = None
+        self.last_full_sync: Optional[float] = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- change notification ----
+    def add_listener(self, fn: Listener) -> None:
+        self.listeners.append(fn)
+
+    def _notify(self, table: str, op: str, row: Dict[str, Any]) -> None:
+        for fn in self.listeners:
+            try:
+                fn(table, op, row)
+            except Exception:
+                logger.exception("Catalog listener failed")
+
+    # ---- sync ----
+    def _fetch(self, table: Table, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        resp = upstream.get(self.base_url + table.path, params=params, timeout=CATALOG_TIMEOUT)
+        resp.raise_for_status()
+        return fastjson.loads(resp.content)
+
+    def sync(self, full: bool = False) -> None:
+        kind = "full" if full else "delta"
+        try:
+            for table in self.tables.values():
+                params = {}
+                since = table.watermark
+                table_full = full or since is None or table.delta_supported is False
+                if not table_full:
+                    params[f"{table.updated_field}_from"] = since
+                fetched = self._fetch(table, params)
+                rows = [r for r in (table.normalize(raw) for raw in fetched) if r is not None]
+                if not table_full:
+                    if table.ignored_filter(rows, since):
+                        logger.warning("Product Service ignores %s_from on %s; using full syncs",
+                                       table.updated_field, table.path)
+                        table.delta_supported = False
+                        table_full = True
+                    elif rows:
+                        table.delta_supported = True
+                self._merge(table, rows, table_full)
+        except Exception as e:
+            CATALOG_SYNCS.inc(kind, "error")
+            logger.warning("Catalog %s sync failed: %s", kind, e)
+            return
+        CATALOG_SYNCS.inc(kind, "ok")
+        now = time.monotonic()
+        self.last_sync = now
+        if full:
+            self.last_full_sync = now
+
+    def _merge(self, table: Table, rows: List[Dict[str, Any]], full: bool) -> None:
+        changed: List[Dict[str, Any]] = []
+        removed: List[Dict[str, Any]] = []
+        with self._lock:
+            for row in rows:
+                if table.upsert(row):
+                    changed.append(row)
+            if full:
+                seen = {str(r[table.key]) for r in rows}
+                for pk in [pk for pk in table.rows if pk not in seen]:
+                    removed.append(table.remove(pk))  # type: ignore[arg-type]
+        for row in changed:
+            self._notify(table.name, "upsert", row)
+        for row in removed:
+            self._notify(table.name, "delete", row)
+
+    def _run(self) -> None:
+        self.sync(full=True)
+        while not self._stop.wait(CATALOG_SYNC_SECONDS):
+            due_full = (
+                self.last_full_sync is None
+                or time.monotonic() - self.last_full_sync >= CATALOG_FULL_SYNC_SECONDS
+            )
+            self.sync(full=due_full)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="catalog-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # ---- reads ----
+    @property
+    def loaded(self) -> bool:
+        return self.last_full_sync is not None
+
+    def staleness(self) -> Optional[float]:
+        return None if self.last_sync is None else time.monotonic() - self.last_sync
+
+    def fresh(self) -> bool:
+        age = self.staleness()
+        return age is not None and age <= CATALOG_MAX_STALENESS
+
+    def query(self, table: str, **filters: Any) -> Optional[List[Dict[str, Any]]]:
+        """Matching rows, or None when the replica is too stale to answer."""
+        if not self.fresh():
+            CATALOG_READS.inc(table, "upstream")
+            return None
+        with self._lock:
+            rows = self.tables[table].where(**filters)
+        CATALOG_READS.inc(table, "replica")
+        return rows
+
+    def get(self, table: str, pk: Any) -> Optional[Dict[str, Any]]:
+        """One row, or None when it is unknown locally or the replica is stale."""
+        row = self.tables[table].rows.get(str(pk)) if self.fresh() else None
+        CATALOG_READS.inc(table, "replica" if row is not None else "upstream")
+        return row
+
+    # ---- write-through from this service's own proxies ----
+    def apply(self, table: str, raw: Dict[str, Any]) -> None:
+        t = self.tables[table]
+        row = t.normalize(raw)
+        if row is None:
+            return
+        with self._lock:
+            changed = t.upsert(row)
+        if changed:
+            self._notify(table, "upsert", row)
+
+    def remove(self, table: str, pk: Any) -> None:
+        with self._lock:
+            row = self.tables[table].remove(str(pk))
+        if row is not None:
+            self._notify(table, "delete", row)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "staleness_s": None if self.staleness() is None else round(self.staleness(), 3),
+            "tables": {
+                name: {"rows": len(t.rows), "watermark": t.watermark, "delta": t.delta_supported}
+                for name, t in self.tables.items()
+            },
+        }
@@ -0,0 +1,166 @@
+from __future__ import annotations
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import urllib3.util.connection as urllib3_connection
+
+from middleware import metrics
+
+# -------------------------------------------------------------------
+# TTL-respecting DNS cache for upstream hostnames
+# -------------------------------------------------------------------
+# urllib3 resolves the host on every new pooled connection. This cache
+# answers from memory instead and refreshes entries in the background
+# before they expire. Addresses always come from getaddrinfo, so
+# /etc/hosts and other nsswitch sources keep precedence; dnspython, when
+# installed, only supplies the record TTL.
+DNS_CACHE_ENABLED = os.getenv("DNS_CACHE_ENABLED", "1") == "1"
+DNS_DEFAULT_TTL = float(os.getenv("DNS_DEFAULT_TTL", 60))
+DNS_MIN_TTL = float(os.getenv("DNS_MIN_TTL", 5))
+DNS_MAX_TTL = float(os.getenv("DNS_MAX_TTL", 300))
+DNS_RESOLVE_TIMEOUT = float(os.getenv("DNS_RESOLVE_TIMEOUT", 2.0))
+# refresh entries this many seconds before they expire; kept under half of
+# DNS_MIN_TTL so a short-TTL entry is not refreshed on every tick
+DNS_REFRESH_AHEAD = min(float(os.getenv("DNS_REFRESH_AHEAD", 2)), DNS_MIN_TTL / 2)
+
+logger = logging.getLogger("composite.dns")
+
+DNS_LOOKUPS = metrics.counter(
+    "composite_dns_lookups_total",
+    "Upstream hostname lookups by cache result.",
+    ["host", "result"],
+)
+
+try:
+    import dns.resolver as _dns_resolver
+except ImportError:  # pragma: no cover - dnspython is optional
+    _dns_resolver = None
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+
+def _clamp(ttl: float) -> float:
+    return max(DNS_MIN_TTL, min(DNS_MAX_TTL, ttl))
+
+
+def _dns_ttl(host: str, addresses: List[str]) -> Optional[float]:
+    """TTL of the DNS records behind ``addresses``, if DNS is where they came from."""
+    if _dns_resolver is None:
+        return None
+    for rdtype in ("A", "AAAA"):
+        try:
+            answer = _dns_resolver.resolve(host, rdtype, lifetime=DNS_RESOLVE_TIMEOUT)
+        except Exception:
+            continue
+        # a different answer means /etc/hosts (or another source) overrides DNS
+        if {r.to_text() for r in answer} & set(addresses):
+            return float(answer.rrset.ttl)
+    return None
+
+
+def resolve(host: str) -> Tuple[List[str], float]:
+    """Resolve ``host`` to addresses and a TTL in seconds.
+
+    Addresses come from getaddrinfo. The TTL is the DNS record's when
+    dnspython can see the same addresses, else DNS_DEFAULT_TTL.
+    """
+    infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    ttl = _dns_ttl(host, addresses)
+    return addresses, _clamp(DNS_DEFAULT_TTL if ttl is None else ttl)
+
+
+class DNSCache:
+    def __init__(self):
+        self._entries: Dict[str, Tuple[List[str], float]] = {}
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def refresh(self, host: str) -> Optional[List[str]]:
+        try:
+            addresses, ttl = resolve(host)
+        except OSError as e:
+            DNS_LOOKUPS.inc(host, "error")
+            logger.warning("DNS lookup for %s failed: %s", host, e)
+            with self._lock:
+                entry = self._entries.get(host)
+                if entry is not None:
+                    # keep serving the last good answer for a little longer
+                    self._entries[host] = (entry[0], time.monotonic() + DNS_MIN_TTL)
+                    return entry[0]
+            return None
+        with self._lock:
+            self._entries[host] = (addresses, time.monotonic() + ttl)
+        return addresses
+
+    def lookup(self, host: str) -> Optional[List[str]]:
+        """Cached addresses for ``host``; None means resolve it the usual way."""
+        if _is_ip(host):
+            return None
+        entry = self._entries.get(host)
+        if entry is not None and entry[1] > time.monotonic():
+            DNS_LOOKUPS.inc(host, "hit")
+            return entry[0]
+        DNS_LOOKUPS.inc(host, "miss")
+        return self.refresh(host)
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                host: {"addresses": addrs, "expires_in": round(expires - now, 1)}
+                for host, (addrs, expires) in self._entries.items()
+            }
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(1.0):
+            now = time.monotonic()
+            due = [h for h, (_, expires) in list(self._entries.items()) if expires - now <= DNS_REFRESH_AHEAD]
+            for host in due:
+                self.refresh(host)
+
+    def start_refresher(self) -> None:
+        if self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop, name="dns-refresh", daemon=True)
+            self._refresher.start()
+
+    def stop_refresher(self) -> None:
+        self._stop.set()
+
+
+cache = DNSCache()
+_original_create_connection = urllib3_connection.create_connection
+
+
+def _create_connection(address, *args, **kwargs):
+    host, port = address
+    addresses = cache.lookup(host)
+    if not addresses:
+        return _original_create_connection(address, *args, **kwargs)
+    error: Optional[OSError] = None
+    for ip in addresses:
+        try:
+            # TLS SNI and certificate checks use the connection's hostname,
+            # not this address, so connecting by IP is safe.
+            return _original_create_connection((ip, port), *args, **kwargs)
+        except OSError as e:
+            error = e
+    raise error  # type: ignore[misc]
+
+
+def install() -> None:
+    """Route urllib3's new connections through the cache (idempotent)."""
+    if DNS_CACHE_ENABLED:
+        urllib3_connection.create_connection = _create_connection
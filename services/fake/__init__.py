@@ -0,0 +1,24 @@
+"""
+In-process fake User, Order and Product services for local testing and
+benchmarking. Run ``python -m services.fake`` and point the composite at
+them through USER_SERVICE_URL / ORDER_SERVICE_URL / PRODUCT_SERVICE_URL.
+"""
+from services.fake.apps import (
+    FakeServers,
+    create_order_app,
+    create_product_app,
+    create_user_app,
+    serve_in_background,
+)
+from services.fake.behavior import FaultConfig
+from services.fake.data import FakeData
+
+__all__ = [
+    "FakeServers",
+    "FakeData",
+    "FaultConfig",
+    "create_order_app",
+    "create_product_app",
+    "create_user_app",
+    "serve_in_background",
+]
@@ -0,0 +1,32 @@
+"""
+Run the fake upstream services in the foreground:
+
+    python -m services.fake
+
+then start the composite with the printed *_SERVICE_URL values. Scale and
+behaviour come from FAKE_* env vars (see services/fake/data.py and
+services/fake/behavior.py).
+"""
+import asyncio
+import os
+
+from services.fake.apps import FakeServers
+
+
+def main():
+    servers = FakeServers(host=os.getenv("FAKE_HOST", "127.0.0.1"))
+    data = servers.data
+    print(
+        f"Fake upstreams: {len(data.users)} users, {len(data.products)} products, "
+        f"{len(data.orders)} orders"
+    )
+    for key, value in servers.env().items():
+        print(f"export {key}={value}")
+    try:
+        asyncio.run(servers.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
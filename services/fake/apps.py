@@ -0,0 +1,529 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from services.fake.behavior import FaultConfig, FaultInjectionMiddleware
+from services.fake.data import FakeData, now_iso
+
+# -------------------------------------------------------------------
+# Fake User / Order / Product services
+# -------------------------------------------------------------------
+TASK_SECONDS = float(os.getenv("FAKE_TASK_SECONDS", "2"))
+
+# query params the composite sends under a different name than the row field
+_PARAM_ALIASES = {"postal_code": "zip_code"}
+
+
+def _not_found(name: str) -> JSONResponse:
+    return JSONResponse({"detail": f"{name} not found"}, status_code=404)
+
+
+def _filter(rows: Iterable[Dict[str, Any]], params: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Apply the list filters the atomic services accept.
+
+    ``min_<f>``/``max_<f>`` are numeric ranges, ``<f>_from``/``<f>_to`` date
+    ranges, ``sort_by``/``order``/``limit``/``offset`` paging; anything else
+    is an exact match on the field.
+    """
+    params = dict(params)
+    limit = params.pop("limit", None)
+    offset = int(params.pop("offset", 0) or 0)
+    sort_by = params.pop("sort_by", None)
+    order = params.pop("order", "asc")
+    out = list(rows)
+    for key, value in params.items():
+        if key.startswith("min_"):
+            f = key[4:]
+            out = [r for r in out if r.get(f) is not None and r[f] >= float(value)]
+        elif key.startswith("max_"):
+            f = key[4:]
+            out = [r for r in out if r.get(f) is not None and r[f] <= float(value)]
+        elif key.endswith("_from"):
+            f = key[:-5]
+            out = [r for r in out if str(r.get(f, ""))[:19] >= value[:19]]
+        elif key.endswith("_to"):
+            f = key[:-3]
+            out = [r for r in out if str(r.get(f, ""))[:19] <= value[:19]]
+        else:
+            f = _PARAM_ALIASES.get(key, key)
+            out = [r for r in out if str(r.get(f)) == value]
+    if sort_by:
+        out.sort(key=lambda r: (r.get(sort_by) is None, r.get(sort_by)), reverse=(order == "desc"))
+    out = out[offset:]
+    if limit is not None:
+        out = out[: int(limit)]
+    return out
+
+
+def _apply(row: Dict[str, Any], update: Dict[str, Any], ts_field: Optional[str] = "updated_at") -> Dict[str, Any]:
+    for k, v in update.items():
+        if v is not None and k in row:
+            row[k] = v
+    if ts_field:
+        row[ts_field] = now_iso()
+    return row
+
+
+def _etag(row: Dict[str, Any]) -> str:
+    digest = hashlib.sha1(json.dumps(row, sort_keys=True).encode()).hexdigest()[:16]
+    return f'"{digest}"'
+
+
+def _etag_response(request: Request, row: Dict[str, Any], status_code: int = 200) -> Response:
+    tag = _etag(row)
+    if request.method == "GET" and request.headers.get("if-none-match") == tag:
+        return Response(status_code=304, headers={"ETag": tag})
+    return JSONResponse(row, status_code=status_code, headers={"ETag": tag})
+
+
+# -------------------------------------------------------------------
+# User Service
+# -------------------------------------------------------------------
+def create_user_app(data: FakeData) -> FastAPI:
+    app = FastAPI(title="Fake User Service")
+
+    @app.post("/users", status_code=201)
+    async def create_user(body: Dict[str, Any]):
+        uid = data.new_id()
+        ts = now_iso()
+        row = {**body, "user_id": uid, "created_at": ts, "updated_at": ts}
+        data.users[uid] = row
+        return row
+
+    @app.get("/users")
+    async def list_users(request: Request):
+        return _filter(data.users.values(), dict(request.query_params))
+
+    @app.get("/users/{user_id}")
+    async def get_user(user_id: str):
+        row = data.users.get(user_id)
+        return row if row is not None else _not_found("User")
+
+    @app.patch("/users/{user_id}")
+    async def update_user(user_id: str, body: Dict[str, Any]):
+        row = data.users.get(user_id)
+        return _apply(row, body) if row is not None else _not_found("User")
+
+    @app.delete("/users/{user_id}")
+    async def delete_user(user_id: str):
+        if data.users.pop(user_id, None) is None:
+            return _not_found("User")
+        return Response(status_code=204)
+
+    @app.post("/addresses", status_code=201)
+    async def create_address(body: Dict[str, Any]):
+        aid = body.get("addr_id") or data.new_id()
+        ts = now_iso()
+        row = {**body, "addr_id": aid, "created_at": ts, "updated_at": ts}
+        data.addresses[aid] = row
+        return row
+
+    @app.get("/addresses")
+    async def list_addresses(request: Request):
+        params = dict(request.query_params)
+        ids = params.pop("ids", None)
+        if ids is not None:
+            rows = [data.addresses[i] for i in ids.split(",") if i in data.addresses]
+            return _filter(rows, params)
+        return _filter(data.addresses.values(), params)
+
+    @app.get("/addresses/{addr_id}")
+    async def get_address(addr_id: str):
+        row = data.addresses.get(addr_id)
+        return row if row is not None else _not_found("Address")
+
+    @app.patch("/addresses/{addr_id}")
+    async def update_address(addr_id: str, body: Dict[str, Any]):
+        row = data.addresses.get(addr_id)
+        return _apply(row, body) if row is not None else _not_found("Address")
+
+    @app.delete("/addresses/{addr_id}")
+    async def delete_address(addr_id: str):
+        if data.addresses.pop(addr_id, None) is None:
+            return _not_found("Address")
+        return Response(status_code=204)
+
+    @app.post("/preferences", status_code=201)
+    async def create_preference(body: Dict[str, Any]):
+        data.preferences[body["user_id"]] = dict(body)
+        return body
+
+    @app.get("/preferences")
+    async def list_preferences(request: Request):
+        return _filter(data.preferences.values(), dict(request.query_params))
+
+    @app.get("/preferences/{user_id}")
+    async def get_preference(user_id: str):
+        row = data.preferences.get(user_id)
+        return row if row is not None else _not_found("Preference")
+
+    @app.patch("/preferences/{user_id}")
+    async def update_preference(user_id: str, body: Dict[str, Any]):
+        row = data.preferences.get(user_id)
+        return _apply(row, body, ts_field=None) if row is not None else _not_found("Preference")
+
+    @app.delete("/preferences/{user_id}")
+    async def delete_preference(user_id: str):
+        if data.preferences.pop(user_id, None) is None:
+            return _not_found("Preference")
+        return Response(status_code=204)
+
+    @app.get("/user_addresses")
+    async def list_user_addresses(request: Request):
+        return _filter(data.user_addresses.values(), dict(request.query_params))
+
+    @app.get("/user_addresses/{user_id}/{addr_id}")
+    async def get_user_address(user_id: str, addr_id: str):
+        row = data.user_addresses.get((user_id, addr_id))
+        return row if row is not None else _not_found("UserAddress")
+
+    @app.delete("/user_addresses/{user_id}/{addr_id}")
+    async def delete_user_address(user_id: str, addr_id: str):
+        if data.user_addresses.pop((user_id, addr_id), None) is None:
+            return _not_found("UserAddress")
+        return Response(status_code=204)
+
+    return app
+
+
+# -------------------------------------------------------------------
+# Product Service
+# -------------------------------------------------------------------
+def create_product_app(data: FakeData) -> FastAPI:
+    app = FastAPI(title="Fake Product Service")
+
+    @app.post("/products", status_code=201)
+    async def create_product(body: Dict[str, Any]):
+        pid = data.new_id()
+        ts = now_iso()
+        row = {**body, "product_id": pid, "created_at": ts, "updated_at": ts}
+        data.products[pid] = row
+        return row
+
+    @app.get("/products")
+    async def list_products(request: Request):
+        params = dict(request.query_params)
+        ids = params.pop("ids", None)
+        if ids is not None:
+            rows = [data.products[i] for i in ids.split(",") if i in data.products]
+            return _filter(rows, params)
+        return _filter(data.products.values(), params)
+
+    @app.get("/products/{product_id}")
+    async def get_product(product_id: str):
+        row = data.products.get(product_id)
+        return row if row is not None else _not_found("Product")
+
+    @app.get("/products/{product_id}/inventory")
+    async def get_product_inventory(product_id: str):
+        product = data.products.get(product_id)
+        inv = data.inventories.get(product.get("inventory_id") or "") if product else None
+        return inv if inv is not None else _not_found("Inventory")
+
+    @app.put("/products/{product_id}")
+    async def update_product(product_id: str, body: Dict[str, Any]):
+        row = data.products.get(product_id)
+        return _apply(row, body) if row is not None else _not_found("Product")
+
+    @app.delete("/products/{product_id}")
+    async def delete_product(product_id: str):
+        if data.products.pop(product_id, None) is None:
+            return _not_found("Product")
+        return {"detail": "Product deleted", "product_id": product_id}
+
+    @app.post("/categories", status_code=201)
+    async def create_category(body: Dict[str, Any]):
+        cid = body.get("category_id") or data.new_id()
+        ts = now_iso()
+        row = {**body, "category_id": cid, "created_at": ts, "updated_at": ts}
+        data.categories[cid] = row
+        return row
+
+    @app.get("/categories")
+    async def list_categories(request: Request):
+        return _filter(data.categories.values(), dict(request.query_params))
+
+    @app.get("/categories/{category_id}")
+    async def get_category(category_id: str):
+        row = data.categories.get(category_id)
+        return row if row is not None else _not_found("Category")
+
+    @app.put("/categories/{category_id}")
+    async def update_category(category_id: str, body: Dict[str, Any]):
+        row = data.categories.get(category_id)
+        return _apply(row, body) if row is not None else _not_found("Category")
+
+    @app.delete("/categories/{category_id}")
+    async def delete_category(category_id: str):
+        if data.categories.pop(category_id, None) is None:
+            return _not_found("Category")
+        return {"detail": "Category deleted", "category_id": category_id}
+
+    @app.post("/inventories", status_code=201)
+    async def create_inventory(body: Dict[str, Any]):
+        iid = body.get("inventory_id") or data.new_id()
+        ts = now_iso()
+        row = {**body, "inventory_id": iid, "update_time": ts, "created_at": ts}
+        data.inventories[iid] = row
+        return row
+
+    @app.get("/inventories")
+    async def list_inventories(request: Request):
+        return _filter(data.inventories.values(), dict(request.query_params))
+
+    @app.get("/inventories/{inventory_id}")
+    async def get_inventory(inventory_id: str):
+        row = data.inventories.get(inventory_id)
+        return row if row is not None else _not_found("Inventory")
+
+    @app.put("/inventories/{inventory_id}")
+    async def update_inventory(inventory_id: str, body: Dict[str, Any]):
+        row = data.inventories.get(inventory_id)
+        return _apply(row, body, ts_field="update_time") if row is not None else _not_found("Inventory")
+
+    @app.delete("/inventories/{inventory_id}")
+    async def delete_inventory(inventory_id: str):
+        if data.inventories.pop(inventory_id, None) is None:
+            return _not_found("Inventory")
+        return {"detail": "Inventory deleted", "inventory_id": inventory_id}
+
+    return app
+
+
+# -------------------------------------------------------------------
+# Order Service
+# -------------------------------------------------------------------
+def create_order_app(data: FakeData) -> FastAPI:
+    app = FastAPI(title="Fake Order Service")
+
+    def new_order(body: Dict[str, Any]) -> Dict[str, Any]:
+        oid = data.new_id()
+        ts = now_iso()
+        row = {
+            "order_date": ts, "status": "PENDING", **body,
+            "order_id": oid, "created_at": ts, "updated_at": ts,
+            "links": {"self": f"/orders/{oid}"},
+        }
+        data.orders[oid] = row
+        return row
+
+    @app.post("/orders")
+    async def create_order(body: Dict[str, Any]):
+        row = new_order(body)
+        return JSONResponse(row, status_code=201,
+                            headers={"Location": f"/orders/{row['order_id']}", "ETag": _etag(row)})
+
+    @app.get("/orders")
+    async def list_orders(request: Request):
+        return _filter(data.orders.values(), dict(request.query_params))
+
+    @app.get("/orders/{order_id}")
+    async def get_order(order_id: str, request: Request):
+        row = data.orders.get(order_id)
+        return _etag_response(request, row) if row is not None else _not_found("Order")
+
+    @app.put("/orders/{order_id}")
+    async def update_order(order_id: str, body: Dict[str, Any], request: Request):
+        row = data.orders.get(order_id)
+        if row is None:
+            return _not_found("Order")
+        if_match = request.headers.get("if-match")
+        if if_match and if_match != _etag(row):
+            return JSONResponse({"detail": "Precondition Failed"}, status_code=412)
+        return _etag_response(request, _apply(row, body))
+
+    @app.delete("/orders/{order_id}")
+    async def delete_order(order_id: str):
+        row = data.orders.pop(order_id, None)
+        return row if row is not None else _not_found("Order")
+
+    @app.post("/orders/process", status_code=202)
+    async def process_order(body: Dict[str, Any]):
+        tid = data.new_id()
+        ts = now_iso()
+        data.tasks[tid] = {"task_id": tid, "body": body, "started": time.monotonic(),
+                           "created_at": ts, "order_id": None}
+        status_url = f"/tasks/{tid}/status"
+        payload = {
+            "task_id": tid, "status_url": status_url,
+            "message": "Order processing started. Poll the status URL for updates.",
+            "links": {"status": status_url, "self": f"/tasks/{tid}"},
+        }
+        return JSONResponse(payload, status_code=202, headers={"Location": status_url})
+
+    @app.get("/tasks/{task_id}/status")
+    async def task_status(task_id: str):
+        task = data.tasks.get(task_id)
+        if task is None:
+            return _not_found("Task")
+        elapsed = time.monotonic() - task["started"]
+        result = None
+        if elapsed >= TASK_SECONDS:
+            if task["order_id"] is None:
+                task["order_id"] = new_order(task["body"])["order_id"]
+            status, result = "completed", {"order_id": task["order_id"]}
+        elif elapsed >= TASK_SECONDS * 0.3:
+            status = "processing"
+        else:
+            status = "pending"
+        return {
+            "task_id": task_id, "status": status, "created_at": task["created_at"],
+            "updated_at": now_iso(), "result": result, "error": None,
+            "links": {"self": f"/tasks/{task_id}", "status": f"/tasks/{task_id}/status"},
+        }
+
+    @app.post("/payments")
+    async def create_payment(body: Dict[str, Any]):
+        pid = data.new_id()
+        ts = now_iso()
+        row = {**body, "payment_id": pid, "created_at": ts, "updated_at": ts,
+               "links": {"self": f"/payments/{pid}"}}
+        data.payments[pid] = row
+        return JSONResponse(row, status_code=201,
+                            headers={"Location": f"/payments/{pid}", "ETag": _etag(row)})
+
+    @app.get("/payments")
+    async def list_payments(request: Request):
+        return _filter(data.payments.values(), dict(request.query_params))
+
+    @app.get("/payments/{payment_id}")
+    async def get_payment(payment_id: str, request: Request):
+        row = data.payments.get(payment_id)
+        return _etag_response(request, row) if row is not None else _not_found("Payment")
+
+    @app.put("/payments/{payment_id}")
+    async def update_payment(payment_id: str, body: Dict[str, Any]):
+        row = data.payments.get(payment_id)
+        return _apply(row, body) if row is not None else _not_found("Payment")
+
+    @app.delete("/payments/{payment_id}")
+    async def delete_payment(payment_id: str):
+        row = data.payments.pop(payment_id, None)
+        return row if row is not None else _not_found("Payment")
+
+    @app.post("/order-details")
+    async def create_order_detail(body: Dict[str, Any]):
+        ts = now_iso()
+        key = (str(body["order_id"]), str(body["prod_id"]))
+        row = {**body, "created_at": ts, "updated_at": ts,
+               "links": {"self": f"/order-details/{key[0]}/{key[1]}"}}
+        data.order_details[key] = row
+        return JSONResponse(row, status_code=201, headers={"Location": row["links"]["self"]})
+
+    @app.get("/order-details")
+    async def list_order_details(request: Request):
+        return _filter(data.order_details.values(), dict(request.query_params))
+
+    @app.get("/order-details/{order_id}/{prod_id}")
+    async def get_order_detail(order_id: str, prod_id: str):
+        row = data.order_details.get((order_id, prod_id))
+        return row if row is not None else _not_found("OrderDetail")
+
+    @app.put("/order-details/{order_id}/{prod_id}")
+    async def update_order_detail(order_id: str, prod_id: str, body: Dict[str, Any]):
+        row = data.order_details.get((order_id, prod_id))
+        return _apply(row, body) if row is not None else _not_found("OrderDetail")
+
+    @app.delete("/order-details/{order_id}/{prod_id}")
+    async def delete_order_detail(order_id: str, prod_id: str):
+        row = data.order_details.pop((order_id, prod_id), None)
+        return row if row is not None else _not_found("OrderDetail")
+
+    return app
+
+
+# -------------------------------------------------------------------
+# Serving
+# -------------------------------------------------------------------
+FACTORIES = {
+    "user": create_user_app,
+    "order": create_order_app,
+    "product": create_product_app,
+}
+DEFAULT_PORTS = {
+    "user": int(os.getenv("FAKE_USER_PORT", 9001)),
+    "order": int(os.getenv("FAKE_ORDER_PORT", 9002)),
+    "product": int(os.getenv("FAKE_PRODUCT_PORT", 9003)),
+}
+
+
+def build_services(data: FakeData, configs: Optional[Dict[str, FaultConfig]] = None,
+                   seed: Optional[int] = None) -> Dict[str, FaultInjectionMiddleware]:
+    """Build the three fake services as ASGI apps wrapped in fault injection."""
+    configs = configs or {}
+    return {
+        name: FaultInjectionMiddleware(factory(data), configs.get(name) or FaultConfig.from_env(name), seed)
+        for name, factory in FACTORIES.items()
+    }
+
+
+class FakeServers:
+    """Runs the fake services with uvicorn on a background thread."""
+
+    def __init__(self, data: Optional[FakeData] = None, host: str = "127.0.0.1",
+                 ports: Optional[Dict[str, int]] = None,
+                 configs: Optional[Dict[str, FaultConfig]] = None):
+        import uvicorn
+
+        self.data = data or FakeData.from_env()
+        self.host = host
+        self.ports = {**DEFAULT_PORTS, **(ports or {})}
+        self.apps = build_services(self.data, configs)
+        self._servers = [
+            uvicorn.Server(uvicorn.Config(app, host=host, port=self.ports[name],
+                                          log_level="warning", lifespan="off"))
+            for name, app in self.apps.items()
+        ]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def urls(self) -> Dict[str, str]:
+        return {name: f"http://{self.host}:{port}" for name, port in self.ports.items()}
+
+    def env(self) -> Dict[str, str]:
+        """The *_SERVICE_URL settings that point the composite at these fakes."""
+        return {f"{name.upper()}_SERVICE_URL": url for name, url in self.urls.items()}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: app.stats.to_dict() for name, app in self.apps.items()}
+
+    def reset_stats(self) -> None:
+        for app in self.apps.values():
+            app.stats = type(app.stats)()
+
+    async def serve(self) -> None:
+        await asyncio.gather(*(s.serve() for s in self._servers))
+
+    def start(self, timeout: float = 10.0) -> "FakeServers":
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.serve()), daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not all(s.started for s in self._servers):
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Fake upstream services failed to start")
+            time.sleep(0.02)
+        return self
+
+    def stop(self) -> None:
+        for s in self._servers:
+            s.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "FakeServers":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def serve_in_background(**kwargs) -> FakeServers:
+    return FakeServers(**kwargs).start()
@@ -0,0 +1,146 @@
+from __future__ import annotations
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from services.upstream import path_template
+
+# -------------------------------------------------------------------
+# Latency / fault injection for the fake upstream services
+# -------------------------------------------------------------------
+
+
+def parse_latency(spec: str):
+    """Parse a latency spec into a sampler returning seconds.
+
+    Specs (all values in milliseconds):
+      ``fixed:20``, ``uniform:10:50``, ``normal:30:10``,
+      ``lognormal:30:0.5`` (median, sigma) and ``exp:20`` (mean).
+    """
+    parts = spec.split(":")
+    kind, args = parts[0], [float(a) for a in parts[1:]]
+    if kind in ("", "none"):
+        return lambda rng: 0.0
+    if kind == "fixed":
+        return lambda rng: args[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1]) / 1000
+    if kind == "normal":
+        return lambda rng: max(rng.gauss(args[0], args[1]), 0.0) / 1000
+    if kind == "lognormal":
+        mu = math.log(args[0])
+        return lambda rng: rng.lognormvariate(mu, args[1]) / 1000
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / args[0]) / 1000
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+@dataclass
+class FaultConfig:
+    latency: str = "none"
+    error_rate: float = 0.0
+    error_status: int = 503
+    cold_start_ms: float = 0.0
+    cold_start_idle_s: float = 300.0
+
+    @classmethod
+    def from_env(cls, service: Optional[str] = None) -> "FaultConfig":
+        """Read ``FAKE_*`` settings; ``FAKE_<SERVICE>_*`` overrides per service."""
+        def env(key: str, default: str) -> str:
+            if service:
+                value = os.getenv(f"FAKE_{service.upper()}_{key}")
+                if value is not None:
+                    return value
+            return os.getenv(f"FAKE_{key}", default)
+
+        return cls(
+            latency=env("LATENCY", "none"),
+            error_rate=float(env("ERROR_RATE", "0")),
+            error_status=int(env("ERROR_STATUS", "503")),
+            cold_start_ms=float(env("COLD_START_MS", "0")),
+            cold_start_idle_s=float(env("COLD_START_IDLE_S", "300")),
+        )
+
+
+@dataclass
+class FakeStats:
+    requests: int = 0
+    errors: int = 0
+    cold_starts: int = 0
+    by_path: Dict[str, int] = field(default_factory=dict)
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "cold_starts": self.cold_starts,
+            "by_path": dict(self.by_path),
+        }
+
+
+class FaultInjectionMiddleware:
+    """Adds sampled latency, random errors and cold-start spikes.
+
+    Also counts requests, exposed at ``/__fake__/stats`` (reset with
+    ``POST /__fake__/reset``); those paths bypass injection.
+    """
+
+    def __init__(self, app, config: Optional[FaultConfig] = None, seed: Optional[int] = None):
+        self.app = app
+        self.config = config or FaultConfig.from_env()
+        self.sample_latency = parse_latency(self.config.latency)
+        self.rng = random.Random(seed)
+        self.stats = FakeStats()
+        self._last_request: Optional[float] = None
+
+    async def _send_json(self, send, status: int, body) -> None:
+        payload = json.dumps(body).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(payload)).encode())],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if path == "/__fake__/stats":
+            await self._send_json(send, 200, self.stats.to_dict())
+            return
+        if path == "/__fake__/reset":
+            self.stats = FakeStats()
+            await self._send_json(send, 200, {"reset": True})
+            return
+
+        self.stats.requests += 1
+        key = f"{scope['method']} {path_template(path)}"
+        self.stats.by_path[key] = self.stats.by_path.get(key, 0) + 1
+
+        now = time.monotonic()
+        delay = self.sample_latency(self.rng)
+        cfg = self.config
+        if cfg.cold_start_ms and (
+            self._last_request is None or now - self._last_request > cfg.cold_start_idle_s
+        ):
+            self.stats.cold_starts += 1
+            delay += cfg.cold_start_ms / 1000
+        self._last_request = now
+        if delay:
+            await asyncio.sleep(delay)
+
+        if cfg.error_rate and self.rng.random() < cfg.error_rate:
+            self.stats.errors += 1
+            await self._send_json(send, cfg.error_status, {"detail": "Injected fault"})
+            return
+
+        await self.app(scope, receive, send)
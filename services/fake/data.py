@@ -0,0 +1,159 @@
+from __future__ import annotations
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# -------------------------------------------------------------------
+# Synthetic data for the fake upstream services
+# -------------------------------------------------------------------
+FIRST_NAMES = ["Ada", "Grace", "Alan", "Edsger", "Barbara", "Donald", "Frances", "Ken", "Margaret", "Linus"]
+LAST_NAMES = ["Lovelace", "Hopper", "Turing", "Dijkstra", "Liskov", "Knuth", "Allen", "Thompson", "Hamilton", "Torvalds"]
+CITIES = [("New York", "NY", "10001"), ("Boston", "MA", "02115"), ("Chicago", "IL", "60601"),
+          ("Seattle", "WA", "98101"), ("Austin", "TX", "73301"), ("Denver", "CO", "80202")]
+CATEGORY_NAMES = ["Electronics", "Books", "Home", "Garden", "Toys", "Sports", "Office", "Kitchen",
+                  "Audio", "Gaming", "Outdoors", "Beauty", "Health", "Automotive", "Music",
+                  "Tools", "Pets", "Baby", "Grocery", "Apparel"]
+ADJECTIVES = ["Wireless", "Ergonomic", "Compact", "Portable", "Premium", "Classic", "Smart", "Durable",
+              "Lightweight", "Mechanical", "Organic", "Deluxe"]
+NOUNS = ["Mouse", "Keyboard", "Headphones", "Lamp", "Backpack", "Blender", "Chair", "Speaker",
+         "Notebook", "Bottle", "Monitor", "Charger", "Kettle", "Tent", "Watch", "Camera"]
+ORDER_STATUSES = ["PENDING", "PAID", "SHIPPED", "DELIVERED", "CANCELLED"]
+PAYMENT_METHODS = ["CREDIT_CARD", "PAYPAL", "DEBIT_CARD"]
+
+
+def now_iso() -> str:
+    return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+
+
+def new_id(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+class FakeData:
+    """In-memory tables shared by the three fake services.
+
+    Rows are stored as JSON-ready dicts keyed by ID string, so the fakes do
+    as little work per request as possible.
+    """
+
+    def __init__(self, users: int = 100, products: int = 500, orders_per_user: int = 5,
+                 seed: int = 42):
+        self.rng = random.Random(seed)
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.addresses: Dict[str, Dict[str, Any]] = {}
+        self.preferences: Dict[str, Dict[str, Any]] = {}
+        self.user_addresses: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.categories: Dict[str, Dict[str, Any]] = {}
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self.inventories: Dict[str, Dict[str, Any]] = {}
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.payments: Dict[str, Dict[str, Any]] = {}
+        self.order_details: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self._seed(users, products, orders_per_user)
+
+    @classmethod
+    def from_env(cls) -> "FakeData":
+        return cls(
+            users=int(os.getenv("FAKE_USERS", 100)),
+            products=int(os.getenv("FAKE_PRODUCTS", 500)),
+            orders_per_user=int(os.getenv("FAKE_ORDERS_PER_USER", 5)),
+            seed=int(os.getenv("FAKE_SEED", 42)),
+        )
+
+    def _ts(self, days_back: int = 365) -> str:
+        dt = datetime(2025, 1, 1) + timedelta(seconds=self.rng.randrange(days_back * 86400))
+        return dt.isoformat() + "Z"
+
+    def _seed(self, n_users: int, n_products: int, orders_per_user: int) -> None:
+        rng = self.rng
+        for name in CATEGORY_NAMES:
+            cid = new_id(rng)
+            ts = self._ts()
+            self.categories[cid] = {
+                "category_id": cid, "name": name, "description": f"All things {name.lower()}.",
+                "created_at": ts, "updated_at": ts,
+            }
+        category_ids = list(self.categories)
+
+        for i in range(n_products):
+            pid, iid = new_id(rng), new_id(rng)
+            ts = self._ts()
+            name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}"
+            self.products[pid] = {
+                "product_id": pid, "name": name,
+                "description": f"{name} with {rng.choice(ADJECTIVES).lower()} design.",
+                "price": round(rng.uniform(2, 500), 2), "rating": round(rng.uniform(1, 5), 1),
+                "category_id": rng.choice(category_ids), "inventory_id": iid,
+                "created_at": ts, "updated_at": ts,
+            }
+            self.inventories[iid] = {
+                "inventory_id": iid, "product_id": pid,
+                "stock_quantity": rng.randrange(0, 1000),
+                "warehouse_location": f"Warehouse {rng.choice('ABCD')} - Section {rng.randrange(1, 20)}",
+                "update_time": ts, "created_at": ts,
+            }
+        product_ids = list(self.products)
+
+        for i in range(n_users):
+            uid = new_id(rng)
+            ts = self._ts()
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            self.users[uid] = {
+                "user_id": uid, "first_name": first, "last_name": last,
+                "email": f"{first.lower()}.{last.lower()}{i}@example.com",
+                "phone": f"+1-212-555-{i % 10000:04d}", "password": "fake-password",
+                "created_at": ts, "updated_at": ts,
+            }
+            self.preferences[uid] = {"user_id": uid, "language": "en", "currency": "USD"}
+            for _ in range(rng.randrange(1, 4)):
+                aid = new_id(rng)
+                city, state, zip_code = rng.choice(CITIES)
+                self.addresses[aid] = {
+                    "addr_id": aid, "street": f"{rng.randrange(1, 999)} Main St",
+                    "city": city, "state": state, "zip_code": zip_code,
+                    "created_at": ts, "updated_at": ts,
+                }
+                self.user_addresses[(uid, aid)] = {"user_id": uid, "addr_id": aid}
+
+            if not product_ids:
+                continue
+            for _ in range(orders_per_user):
+                oid = new_id(rng)
+                ots = self._ts()
+                picks = rng.sample(product_ids, k=min(len(product_ids), rng.randrange(1, 5)))
+                total = 0.0
+                for pid in picks:
+                    qty = rng.randrange(1, 4)
+                    subtotal = round(self.products[pid]["price"] * qty, 2)
+                    total += subtotal
+                    self.order_details[(oid, pid)] = {
+                        "order_id": oid, "prod_id": pid, "quantity": qty, "subtotal": subtotal,
+                        "created_at": ots, "updated_at": ots,
+                        "links": {"self": f"/order-details/{oid}/{pid}"},
+                    }
+                self.orders[oid] = {
+                    "order_id": oid, "user_id": uid, "order_date": ots,
+                    "total_price": round(total, 2), "status": rng.choice(ORDER_STATUSES),
+                    "created_at": ots, "updated_at": ots,
+                    "links": {"self": f"/orders/{oid}"},
+                }
+                pay_id = new_id(rng)
+                self.payments[pay_id] = {
+                    "payment_id": pay_id, "order_id": oid,
+                    "payment_method": rng.choice(PAYMENT_METHODS), "payment_date": ots,
+                    "amount": round(total, 2), "created_at": ots, "updated_at": ots,
+                    "links": {"self": f"/payments/{pay_id}"},
+                }
+
+    def new_id(self) -> str:
+        return str(uuid.uuid4())
+
+    def sample_user_id(self) -> Optional[str]:
+        return self.rng.choice(list(self.users)) if self.users else None
+
+    def sample_product_ids(self, k: int) -> List[str]:
+        ids = list(self.products)
+        return self.rng.sample(ids, k=min(k, len(ids)))
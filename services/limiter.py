@@ -0,0 +1,218 @@
+from __future__ import annotations
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+
+from middleware import metrics
+
+# -------------------------------------------------------------------
+# Adaptive concurrency limit per upstream host
+# -------------------------------------------------------------------
+# Gradient limiter: the limit grows by about sqrt(limit) per sample while
+# short-term latency stays within UPSTREAM_LIMIT_TOLERANCE of the no-load
+# baseline (minimum RTT), and shrinks in proportion once it rises above that.
+# 502/503/504 responses (upstream.OVERLOAD_STATUSES) and transport errors
+# back the limit off multiplicatively (AIMD). Reads over the limit wait up
+# to UPSTREAM_LIMIT_QUEUE_TIMEOUT in a queue of at most UPSTREAM_LIMIT_QUEUE;
+# anything beyond that is shed. Writes are never shed: they may be one step
+# of a multi-call flow such as checkout, so they take a slot over the limit.
+# Off unless UPSTREAM_ADAPTIVE_LIMIT=1.
+ADAPTIVE_LIMIT = os.getenv("UPSTREAM_ADAPTIVE_LIMIT", "0") == "1"
+LIMIT_INITIAL = float(os.getenv("UPSTREAM_LIMIT_INITIAL", 20))
+LIMIT_MIN = float(os.getenv("UPSTREAM_LIMIT_MIN", 2))
+LIMIT_MAX = float(os.getenv("UPSTREAM_LIMIT_MAX", 200))
+# per-service ceilings (UPSTREAM_LIMIT_MAX_ORDER=40, ...) act as hard
+# bulkheads, so one slow upstream cannot hold every worker thread
+LIMIT_TOLERANCE = float(os.getenv("UPSTREAM_LIMIT_TOLERANCE", 1.5))
+LIMIT_BACKOFF = float(os.getenv("UPSTREAM_LIMIT_BACKOFF", 0.9))
+LIMIT_SMOOTHING = float(os.getenv("UPSTREAM_LIMIT_SMOOTHING", 0.2))
+QUEUE_SIZE = int(os.getenv("UPSTREAM_LIMIT_QUEUE", 50))
+QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_LIMIT_QUEUE_TIMEOUT", 0.5))
+# RTT samples are averaged over a window before the limit is recomputed
+LIMIT_WINDOW = float(os.getenv("UPSTREAM_LIMIT_WINDOW", 0.1))
+LIMIT_WINDOW_MIN_SAMPLES = 5
+
+# EWMA weight of each window's mean RTT; the baseline tracks the minimum
+# window RTT and otherwise drifts towards the short-term value this fast
+_SHORT_ALPHA = 0.5
+_BASELINE_DRIFT = 0.002
+
+UPSTREAM_SHED = metrics.counter(
+    "composite_upstream_shed_total",
+    "Upstream calls rejected by the adaptive limiter.",
+    ["host", "reason"],
+)
+
+
+class UpstreamOverloaded(requests.RequestException):
+    """Raised instead of calling an upstream that is at its concurrency limit."""
+
+    def __init__(self, host: str, reason: str):
+        super().__init__(f"Upstream {host} over its concurrency limit ({reason})")
+        self.host = host
+        self.reason = reason
+
+
+def _max_for(service: Optional[str]) -> float:
+    if service:
+        value = os.getenv(f"UPSTREAM_LIMIT_MAX_{service.upper()}")
+        if value:
+            return float(value)
+    return LIMIT_MAX
+
+
+class AdaptiveLimiter:
+    def __init__(self, host: str, service: Optional[str] = None):
+        self.host = host
+        self.service = service
+        self.max_limit = _max_for(service)
+        self.limit = min(LIMIT_INITIAL, self.max_limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.short_rtt = 0.0
+        self.baseline_rtt = 0.0
+        self.completed = 0
+        self.dropped = 0
+        self.shed = 0
+        self._window_start = time.monotonic()
+        self._window_sum = 0.0
+        self._window_count = 0
+        self._window_peak = 0
+        self._cond = threading.Condition()
+
+    def _acquire(self, shed: bool = True) -> None:
+        with self._cond:
+            if self.in_flight < int(self.limit) or not shed:
+                self.in_flight += 1
+                self._window_peak = max(self._window_peak, self.in_flight)
+                return
+            if self.waiting >= QUEUE_SIZE:
+                self.shed += 1
+                UPSTREAM_SHED.inc(self.host, "queue_full")
+                raise UpstreamOverloaded(self.host, "queue_full")
+            self.waiting += 1
+            deadline = time.monotonic() + QUEUE_TIMEOUT
+            try:
+                while self.in_flight >= int(self.limit):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed += 1
+                        UPSTREAM_SHED.inc(self.host, "queue_timeout")
+                        raise UpstreamOverloaded(self.host, "queue_timeout")
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            self._window_peak = max(self._window_peak, self.in_flight)
+
+    def _release(self, rtt: float, dropped: bool) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self.completed += 1
+            if dropped:
+                self.dropped += 1
+                self.limit = max(LIMIT_MIN, self.limit * LIMIT_BACKOFF)
+            else:
+                self._window_sum += rtt
+                self._window_count += 1
+                now = time.monotonic()
+                if now - self._window_start >= LIMIT_WINDOW and self._window_count >= LIMIT_WINDOW_MIN_SAMPLES:
+                    self._update(self._window_sum / self._window_count, self._window_peak)
+                    self._window_start = now
+                    self._window_sum = 0.0
+                    self._window_count = 0
+                    self._window_peak = self.in_flight
+            self._cond.notify()
+
+    def _update(self, rtt: float, peak_in_flight: int) -> None:
+        if self.baseline_rtt == 0.0:
+            self.short_rtt = self.baseline_rtt = rtt
+            return
+        self.short_rtt += _SHORT_ALPHA * (rtt - self.short_rtt)
+        if rtt < self.baseline_rtt:
+            self.baseline_rtt = rtt
+        else:
+            # lets the baseline follow a lasting change in upstream speed
+            self.baseline_rtt += _BASELINE_DRIFT * (self.short_rtt - self.baseline_rtt)
+        if peak_in_flight * 2 < self.limit and self.short_rtt <= self.baseline_rtt * LIMIT_TOLERANCE:
+            return  # app-limited: no evidence the upstream could take more
+        gradient = max(0.5, min(1.0, LIMIT_TOLERANCE * self.baseline_rtt / self.short_rtt))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit * (1 - LIMIT_SMOOTHING) + target * LIMIT_SMOOTHING
+        self.limit = max(LIMIT_MIN, min(self.max_limit, limit))
+
+    @contextmanager
+    def acquire(self, shed: bool = True) -> Iterator["_Outcome"]:
+        """Hold one slot for the duration of an upstream call.
+
+        With ``shed=False`` the call is admitted even over the limit.
+        Set ``outcome.dropped`` for overload signals (502/503/504) that did not raise.
+        """
+        self._acquire(shed)
+        outcome = _Outcome()
+        start = time.perf_counter()
+        try:
+            yield outcome
+        except Exception:
+            outcome.dropped = True
+            raise
+        finally:
+            self._release(time.perf_counter() - start, outcome.dropped)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "service": self.service,
+            "limit": round(self.limit, 2),
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "short_rtt_ms": round(self.short_rtt * 1000, 2),
+            "baseline_rtt_ms": round(self.baseline_rtt * 1000, 2),
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "shed": self.shed,
+        }
+
+
+class _Outcome:
+    __slots__ = ("dropped",)
+
+    def __init__(self):
+        self.dropped = False
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_lock = threading.Lock()
+
+
+def for_host(host: str, service: Optional[str] = None) -> AdaptiveLimiter:
+    limiter = _limiters.get(host)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(host)
+            if limiter is None:
+                limiter = _limiters[host] = AdaptiveLimiter(host, service)
+    return limiter
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    return {host: lim.stats() for host, lim in list(_limiters.items())}
+
+
+metrics.gauge_callback(
+    "composite_upstream_concurrency_limit",
+    "Current adaptive concurrency limit per upstream host.",
+    ["host"],
+    lambda: [((h,), lim.limit) for h, lim in list(_limiters.items())],
+)
+metrics.gauge_callback(
+    "composite_upstream_limiter_queue",
+    "Upstream calls waiting for a limiter slot.",
+    ["host"],
+    lambda: [((h,), lim.waiting) for h, lim in list(_limiters.items())],
+)
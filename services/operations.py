@@ -0,0 +1,309 @@
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import anyio
+
+from middleware import metrics
+from services import upstream
+from utils import fastjson
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------------------------------------------
+# Status stores with change notification, and shared task pollers
+# -------------------------------------------------------------------
+# Seconds between upstream polls of one task; the last entry repeats.
+# The schedule restarts whenever the status changes.
+TASK_POLL_SCHEDULE = [float(s) for s in os.getenv("TASK_POLL_SCHEDULE", "0.5,1,2,3,5").split(",")]
+# terminal task statuses are remembered this long so polls skip the upstream
+TASK_STATUS_TTL = float(os.getenv("TASK_STATUS_TTL", 300))
+# upper bound for ?wait= on long-poll endpoints
+LONG_POLL_MAX_SECONDS = float(os.getenv("LONG_POLL_MAX_SECONDS", 60))
+
+# not_found is what pollers publish when the Order Service has no such task
+TERMINAL_STATUSES = frozenset({"completed", "failed", "cancelled", "not_found"})
+
+TASK_POLLS = metrics.counter(
+    "composite_task_polls_total",
+    "Upstream task status polls made by shared pollers.",
+    ["result"],
+)
+
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(ms|s|m)?\s*$")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, None: 1.0}
+
+
+def parse_wait(value: str) -> float:
+    """Seconds for a ``wait`` value such as ``30s``, ``500ms``, ``1m`` or ``30``.
+
+    Capped at LONG_POLL_MAX_SECONDS; raises ValueError when malformed.
+    """
+    m = _DURATION.match(value)
+    if m is None:
+        raise ValueError(f"invalid wait duration {value!r}")
+    return min(float(m.group(1)) * _UNITS[m.group(2)], LONG_POLL_MAX_SECONDS)
+
+
+def is_terminal(record: Optional[Dict[str, Any]]) -> bool:
+    return record is not None and str(record.get("status", "")).lower() in TERMINAL_STATUSES
+
+
+def _state(record: Optional[Dict[str, Any]]) -> Tuple[Any, ...]:
+    # timestamps such as updated_at change on every read and are not a change
+    if record is None:
+        return ()
+    return record.get("status"), record.get("result"), record.get("error")
+
+
+class StatusStore:
+    """Dict-like store that stamps every write with a version.
+
+    Versions come from one store-wide counter, so a key that is dropped
+    and written again never reuses a version a client has already seen.
+    Writers may be any thread; waiters are asyncio tasks woken through
+    their own loop, so a waiting client holds no thread.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._clock = 0
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        return self._data[key]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._data.get(key)
+
+    def version(self, key: str) -> int:
+        return self._versions.get(key, 0)
+
+    def __setitem__(self, key: str, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._data[key] = record
+            self._clock += 1
+            self._versions[key] = self._clock
+            waiters = self._waiters.pop(key, ())
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(_wake, fut)
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            self._versions.pop(key, None)
+            return self._data.pop(key, default)
+
+    async def wait(self, key: str, since: int, timeout: Optional[float]) -> int:
+        """Wait until ``key`` has a version newer than ``since``; returns the version.
+
+        Returns the unchanged version when ``timeout`` passes first.
+        """
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        entry = (loop, fut)
+        with self._lock:
+            current = self._versions.get(key, 0)
+            if current > since:
+                return current
+            self._waiters.setdefault(key, set()).add(entry)
+        try:
+            await asyncio.wait((fut,), timeout=timeout)
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(entry)
+                    if not waiters:
+                        del self._waiters[key]
+        return self._versions.get(key, 0)
+
+    def waiting(self) -> int:
+        return sum(len(w) for w in self._waiters.values())
+
+
+def _wake(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class TaskStatusPoller:
+    """One upstream poller per task id, shared by every subscriber.
+
+    Pollers run on the event loop and fetch through the threadpool. A
+    poller stops once its task is terminal or its last subscriber leaves.
+    """
+
+    def __init__(self, order_base_url: str):
+        self.order_base_url = order_base_url.rstrip("/")
+        self.statuses = StatusStore()
+        self._subscribers: Dict[str, int] = {}
+        self._pollers: Dict[str, asyncio.Task] = {}
+        self._expiry: Dict[str, float] = {}
+
+    def _fetch(self, task_id: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+        resp = upstream.get(f"{self.order_base_url}/tasks/{task_id}/status")
+        if not resp.ok:
+            return resp.status_code, None
+        return resp.status_code, fastjson.loads(resp.content)
+
+    def _publish(self, task_id: str, record: Dict[str, Any]) -> None:
+        self.statuses[task_id] = record
+        if is_terminal(record) and record.get("status") != "not_found":
+            now = time.monotonic()
+            for key in [k for k, t in self._expiry.items() if t < now]:
+                self._expiry.pop(key, None)
+                if not self._subscribers.get(key):
+                    self.statuses.pop(key)
+            self._expiry[task_id] = now + TASK_STATUS_TTL
+
+    def cached(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """A remembered terminal status, which can no longer change."""
+        record = self.statuses.get(task_id)
+        if record is None or not is_terminal(record):
+            return None
+        if self._expiry.get(task_id, 0) < time.monotonic():
+            self.statuses.pop(task_id)
+            self._expiry.pop(task_id, None)
+            return None
+        return record
+
+    def remember(self, task_id: str, record: Dict[str, Any]) -> None:
+        """Record a status fetched outside the poller (e.g. a plain GET)."""
+        if is_terminal(record) and _state(self.statuses.get(task_id)) != _state(record):
+            self._publish(task_id, record)
+
+    async def wait_for_change(self, task_id: str, current: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """Long poll: the first status that differs from ``current``, or
+        ``current`` itself once ``timeout`` passes.
+
+        Joins (or starts) the task's shared poller for the duration.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        since = self.statuses.version(task_id)
+        self.subscribe(task_id)
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return current
+                since = await self.statuses.wait(task_id, since, remaining)
+                record = self.statuses.get(task_id)
+                if record is not None and _state(record) != _state(current):
+                    return record
+        finally:
+            self.unsubscribe(task_id)
+
+    async def _poll(self, task_id: str) -> None:
+        step = 0
+        try:
+            while self._subscribers.get(task_id):
+                try:
+                    status_code, record = await anyio.to_thread.run_sync(self._fetch, task_id)
+                except Exception as e:
+                    TASK_POLLS.inc("error")
+                    logger.warning("task %s status poll failed: %s", task_id, e)
+                    status_code, record = 0, None
+                if record is None:
+                    TASK_POLLS.inc("error" if status_code != 404 else "not_found")
+                    if status_code == 404:
+                        self._publish(task_id, {"task_id": task_id, "status": "not_found"})
+                        return
+                elif _state(record) != _state(self.statuses.get(task_id)):
+                    TASK_POLLS.inc("changed")
+                    self._publish(task_id, record)
+                    step = 0
+                    if is_terminal(record):
+                        return
+                else:
+                    TASK_POLLS.inc("unchanged")
+                await asyncio.sleep(TASK_POLL_SCHEDULE[min(step, len(TASK_POLL_SCHEDULE) - 1)])
+                step += 1
+        finally:
+            self._pollers.pop(task_id, None)
+
+    def subscribe(self, task_id: str) -> None:
+        self._subscribers[task_id] = self._subscribers.get(task_id, 0) + 1
+        if task_id not in self._pollers and self.cached(task_id) is None:
+            self._pollers[task_id] = asyncio.get_running_loop().create_task(self._poll(task_id))
+
+    def unsubscribe(self, task_id: str) -> None:
+        left = self._subscribers.get(task_id, 0) - 1
+        if left > 0:
+            self._subscribers[task_id] = left
+            return
+        self._subscribers.pop(task_id, None)
+        if self.cached(task_id) is None:
+            self.statuses.pop(task_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pollers": len(self._pollers),
+            "subscribers": sum(self._subscribers.values()),
+            "remembered": len(self.statuses),
+        }
+
+
+# -------------------------------------------------------------------
+# Server-Sent Events
+# -------------------------------------------------------------------
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(data: Any, event: str = "status", event_id: Optional[int] = None) -> bytes:
+    lines: List[bytes] = [f"event: {event}".encode()]
+    if event_id is not None:
+        lines.append(f"id: {event_id}".encode())
+    lines.append(b"data: " + fastjson.dumps(data))
+    return b"\n".join(lines) + b"\n\n"
+
+
+def stream_finished(store: StatusStore, key: str, last_event_id: int) -> bool:
+    """Whether a reconnecting client already received ``key``'s terminal event.
+
+    EventSource reconnects whenever a stream closes; answering these
+    with 204 is what makes it stop.
+    """
+    return bool(last_event_id) and is_terminal(store.get(key)) and store.version(key) <= last_event_id
+
+
+async def status_events(store: StatusStore, key: str, render, last_event_id: int = 0):
+    """SSE stream of ``render(record)`` for each new version of ``key``.
+
+    Sends a comment line as heartbeat while nothing changes and ends
+    after a terminal status. A missing key waits for its first write. A
+    ``last_event_id`` the store has not reached (the key was dropped, or
+    the process restarted) replays the current status.
+    """
+    if stream_finished(store, key, last_event_id):
+        return
+    version = last_event_id
+    if store.version(key) < version:
+        version = 0
+    while True:
+        current = store.version(key)
+        record = store.get(key)
+        if current > version and record is not None:
+            version = current
+            yield sse_event(render(record), event_id=version)
+            if is_terminal(record):
+                return
+            continue
+        await store.wait(key, version, SSE_HEARTBEAT_SECONDS)
+        if store.version(key) == version:
+            yield b": keepalive\n\n"
@@ -0,0 +1,111 @@
+from __future__ import annotations
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import HTTPException
+
+from framework.executor import ContextThreadPoolExecutor
+from middleware import metrics, timing
+from services import upstream
+from utils import fastjson
+from utils.cache import TTLCache
+
+# -------------------------------------------------------------------
+# Bulk product lookup (replica, then shared cache, then upstream)
+# -------------------------------------------------------------------
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", 30))
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", 20000))
+PRODUCT_FETCH_WORKERS = int(os.getenv("PRODUCT_FETCH_WORKERS", 16))
+# set to 1 when the Product Service accepts GET /products?ids=a,b,c
+PRODUCT_BATCH_LOOKUP = os.getenv("PRODUCT_BATCH_LOOKUP", "0") == "1"
+PRODUCT_BATCH_SIZE = int(os.getenv("PRODUCT_BATCH_SIZE", 100))
+
+PRODUCT_LOOKUPS = metrics.counter(
+    "composite_product_lookups_total",
+    "Bulk product lookups by source: replica, cache, batch request or single request.",
+    ["source"],
+)
+
+
+def _upstream_error(resp) -> HTTPException:
+    return HTTPException(status_code=502, detail=f"Upstream error from Product ({resp.status_code})")
+
+
+class ProductResolver:
+    """Resolves product ids to rows for bulk reads.
+
+    The catalog replica answers first when it is enabled and fresh; the
+    TTL cache covers the rest between calls.
+    """
+
+    def __init__(self, base_url: str, replica=None):
+        self.base_url = base_url.rstrip("/")
+        self.replica = replica
+        self.cache: TTLCache[Dict[str, Any]] = TTLCache(PRODUCT_CACHE_TTL, PRODUCT_CACHE_SIZE)
+        self.executor = ContextThreadPoolExecutor(max_workers=PRODUCT_FETCH_WORKERS,
+                                                  thread_name_prefix="product")
+
+    def _fetch_one(self, product_id: str) -> Optional[Dict[str, Any]]:
+        resp = upstream.get(f"{self.base_url}/products/{product_id}")
+        if resp.status_code == 404:
+            return None
+        if not resp.ok:
+            raise _upstream_error(resp)
+        return fastjson.loads(resp.content)
+
+    def _fetch_batch(self, ids: List[str]) -> List[Dict[str, Any]]:
+        resp = upstream.get(f"{self.base_url}/products", params={"ids": ",".join(ids)})
+        if not resp.ok:
+            raise _upstream_error(resp)
+        return fastjson.loads(resp.content)
+
+    def resolve(self, product_ids: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        """product_id -> row for every id that exists; unknown ids are left out."""
+        ids = list(dict.fromkeys(str(p) for p in product_ids))
+        found: Dict[str, Dict[str, Any]] = {}
+        if self.replica is not None:
+            for pid in ids:
+                row = self.replica.get("products", pid)
+                if row is not None:
+                    found[pid] = row
+            if found:
+                PRODUCT_LOOKUPS.inc("replica", amount=len(found))
+        rest = [p for p in ids if p not in found]
+        cached = self.cache.get_many(rest)
+        if cached:
+            PRODUCT_LOOKUPS.inc("cache", amount=len(cached))
+            found.update(cached)  # type: ignore[arg-type]
+        if found:
+            timing.record_cache_hit(len(found))
+        missing = [p for p in rest if p not in found]
+        if not missing:
+            return found
+
+        fetched: List[Dict[str, Any]] = []
+        if PRODUCT_BATCH_LOOKUP:
+            chunks = [missing[i:i + PRODUCT_BATCH_SIZE] for i in range(0, len(missing), PRODUCT_BATCH_SIZE)]
+            PRODUCT_LOOKUPS.inc("batch", amount=len(missing))
+            if len(chunks) == 1:
+                fetched = self._fetch_batch(chunks[0])
+            else:
+                for rows in self.executor.map(self._fetch_batch, chunks):
+                    fetched.extend(rows)
+        else:
+            PRODUCT_LOOKUPS.inc("single", amount=len(missing))
+            if len(missing) == 1:
+                results = [self._fetch_one(missing[0])]
+            else:
+                results = list(self.executor.map(self._fetch_one, missing))
+            fetched = [r for r in results if r is not None]
+
+        wanted = set(missing)
+        for row in fetched:
+            key = str(row.get("product_id"))
+            if key in wanted:
+                self.cache.set(key, row)
+                found[key] = row
+        return found
+
+    def invalidate(self, product_id: Any) -> None:
+        """Drop a cached product after it was changed through this service."""
+        self.cache.delete(str(product_id))
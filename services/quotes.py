@@ -0,0 +1,176 @@
+from __future__ import annotations
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+from framework.executor import ContextThreadPoolExecutor
+from middleware import metrics
+from services import upstream
+from utils import fastjson
+from utils.cache import TTLCache
+
+# -------------------------------------------------------------------
+# Cart quotes: validated price/stock snapshots reusable by checkout
+# -------------------------------------------------------------------
+QUOTE_TTL = float(os.getenv("QUOTE_TTL", 120))
+QUOTE_CACHE_SIZE = int(os.getenv("QUOTE_CACHE_SIZE", 10000))
+QUOTE_FETCH_WORKERS = int(os.getenv("QUOTE_FETCH_WORKERS", 16))
+# must be identical on every replica for quotes to verify across them; the
+# per-process default only matters for snapshots, which are local anyway
+QUOTE_SECRET = (os.getenv("QUOTE_SECRET") or secrets.token_hex(32)).encode()
+
+QUOTE_USES = metrics.counter(
+    "composite_quote_checkouts_total",
+    "Checkouts presenting a quote, by whether its snapshot could be reused.",
+    ["result"],
+)
+
+
+def _check(resp, name: str):
+    if resp.status_code == 404:
+        raise HTTPException(status_code=404, detail=f"{name} not found")
+    if not resp.ok:
+        raise HTTPException(status_code=502, detail=f"Upstream error from {name} ({resp.status_code})")
+    return fastjson.loads(resp.content)
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def cart_key(items: Sequence[Any]) -> List[Tuple[str, int]]:
+    """Order-independent identity of a cart: merged (product_id, quantity) pairs."""
+    merged: Dict[str, int] = {}
+    for item in items:
+        pid = str(item.product_id)
+        merged[pid] = merged.get(pid, 0) + item.quantity
+    return sorted(merged.items())
+
+
+class QuoteService:
+    """Prices carts concurrently and keeps signed, short-lived snapshots.
+
+    A quote id is ``<id>.<expiry>.<signature>``; the HMAC covers the id,
+    user, expiry and cart, so an id cannot be moved to another user or
+    cart. A quote is only an optimization: checkout prices the cart live
+    whenever the quote is expired, unknown here, or for a different cart.
+    """
+
+    def __init__(self, product_base_url: str, user_base_url: str):
+        self.product_base_url = product_base_url.rstrip("/")
+        self.user_base_url = user_base_url.rstrip("/")
+        self.snapshots: TTLCache[Dict[str, Any]] = TTLCache(QUOTE_TTL, QUOTE_CACHE_SIZE)
+        self.executor = ContextThreadPoolExecutor(max_workers=QUOTE_FETCH_WORKERS,
+                                                  thread_name_prefix="quote")
+
+    # ---- pricing ----
+    def _user(self, user_id: Any) -> Dict[str, Any]:
+        return _check(upstream.get(f"{self.user_base_url}/users/{user_id}"), "User")
+
+    def _line(self, product_id: str, quantity: int) -> Dict[str, Any]:
+        p_resp = upstream.get(f"{self.product_base_url}/products/{product_id}")
+        if p_resp.status_code == 404:
+            return {"product_id": product_id, "quantity": quantity, "issue": "not_found"}
+        product = _check(p_resp, "Product")
+        inventory = _check(upstream.get(f"{self.product_base_url}/products/{product_id}/inventory"),
+                           "Inventory")
+        line = {
+            "product_id": product["product_id"],
+            "product": product,
+            "inventory": inventory,
+            "quantity": quantity,
+            "line_total": product["price"] * quantity,
+        }
+        if inventory["stock_quantity"] < quantity:
+            line["issue"] = "insufficient_stock"
+        return line
+
+    def price(self, user_id: Any, items: Sequence[Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """(user, one line per distinct product), fetched concurrently.
+
+        Lines with a problem carry ``issue`` (not_found / insufficient_stock).
+        """
+        cart = cart_key(items)
+        user_f = self.executor.submit(self._user, user_id)
+        line_fs = [self.executor.submit(self._line, pid, qty) for pid, qty in cart]
+        user = user_f.result()
+        return user, [f.result() for f in line_fs]
+
+    def _inventory(self, line: Dict[str, Any]) -> Dict[str, Any]:
+        inventory = _check(upstream.get(f"{self.product_base_url}/products/{line['product_id']}/inventory"),
+                           "Inventory")
+        return {**line, "inventory": inventory}
+
+    def restock(self, lines: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """``lines`` with live inventory, re-read concurrently.
+
+        Checkout writes stock back as an absolute value, so a quoted
+        snapshot's prices can be reused but its stock levels cannot.
+        """
+        return list(self.executor.map(self._inventory, lines))
+
+    # ---- quotes ----
+    def _sign(self, quote_id: str, user_id: Any, expires: int, cart: List[Tuple[str, int]]) -> str:
+        msg = fastjson.dumps([quote_id, str(user_id), expires, cart])
+        return _b64(hmac.new(QUOTE_SECRET, msg, hashlib.sha256).digest())
+
+    def create(self, user_id: Any, items: Sequence[Any]) -> Dict[str, Any]:
+        user, lines = self.price(user_id, items)
+        total = sum(line.get("line_total", 0) for line in lines)
+        out_lines = [
+            {
+                "product_id": line["product_id"],
+                "name": line.get("product", {}).get("name"),
+                "unit_price": line.get("product", {}).get("price"),
+                "quantity": line["quantity"],
+                "available": line.get("inventory", {}).get("stock_quantity"),
+                "line_total": line.get("line_total"),
+                "issue": line.get("issue"),
+            }
+            for line in lines
+        ]
+        valid = not any("issue" in line for line in lines)
+        quote: Dict[str, Any] = {"valid": valid, "items": out_lines, "total_price": total}
+        if not valid:
+            return quote
+        quote_id = uuid.uuid4().hex
+        expires = int(time.time() + QUOTE_TTL)
+        cart = cart_key(items)
+        self.snapshots.set(quote_id, {"user_id": str(user_id), "cart": cart, "user": user, "lines": lines})
+        quote["quote_id"] = f"{quote_id}.{expires}.{self._sign(quote_id, user_id, expires, cart)}"
+        quote["expires_at"] = expires
+        return quote
+
+    def redeem(self, token: str, user_id: Any, items: Sequence[Any]) -> Optional[Dict[str, Any]]:
+        """The quote's snapshot if it is still usable for this cart, else None.
+
+        A snapshot is used at most once. Its stock levels are only what
+        the quote saw; re-read them with ``restock`` before decrementing.
+        """
+        cart = cart_key(items)
+        try:
+            quote_id, expires_s, sig = token.split(".")
+            expires = int(expires_s)
+        except ValueError:
+            QUOTE_USES.inc("invalid")
+            return None
+        if not hmac.compare_digest(sig, self._sign(quote_id, user_id, expires, cart)):
+            QUOTE_USES.inc("invalid")  # forged, another user's, or a different cart
+            return None
+        if expires < time.time():
+            QUOTE_USES.inc("expired")
+            return None
+        snapshot = self.snapshots.get(quote_id)
+        self.snapshots.delete(quote_id)
+        if snapshot is None:
+            QUOTE_USES.inc("unknown")
+            return None
+        QUOTE_USES.inc("reused")
+        return snapshot
@@ -0,0 +1,208 @@
+from __future__ import annotations
+import bisect
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# -------------------------------------------------------------------
+# Product name/description search over an in-memory inverted index
+# -------------------------------------------------------------------
+# without the catalog replica, the index is rebuilt from the Product
+# Service when it is older than this
+SEARCH_REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", 60))
+
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+# a prefix match scores this fraction of an exact token match
+PREFIX_FACTOR = 0.5
+MIN_PREFIX_LEN = 2
+# cap on vocabulary words a single prefix expands to
+MAX_PREFIX_EXPANSIONS = int(os.getenv("SEARCH_MAX_PREFIX_EXPANSIONS", 64))
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+class ProductSearchIndex:
+    """Inverted index with incremental upsert/remove.
+
+    ``postings`` maps token -> {product_id: field weight}; ``vocabulary`` is
+    the sorted token list used for prefix expansion with bisect.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.vocabulary: List[str] = []
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self._doc_tokens: Dict[str, Set[str]] = {}
+        self.updated: Optional[float] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def age(self) -> Optional[float]:
+        return None if self.updated is None else time.monotonic() - self.updated
+
+    # ---- maintenance ----
+    def _weights(self, row: Dict[str, Any]) -> Dict[str, float]:
+        weights: Dict[str, float] = {}
+        for token in tokenize(row.get("description")):
+            weights[token] = max(weights.get(token, 0.0), DESCRIPTION_WEIGHT)
+        for token in tokenize(row.get("name")):
+            weights[token] = NAME_WEIGHT
+        return weights
+
+    def _drop(self, pid: str) -> None:
+        for token in self._doc_tokens.pop(pid, ()):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(pid, None)
+            if not posting:
+                del self.postings[token]
+                i = bisect.bisect_left(self.vocabulary, token)
+                if i < len(self.vocabulary) and self.vocabulary[i] == token:
+                    del self.vocabulary[i]
+        self.docs.pop(pid, None)
+
+    def upsert(self, row: Dict[str, Any]) -> None:
+        pid = str(row["product_id"])
+        with self._lock:
+            old = self.docs.get(pid)
+            if old is not None and old.get("name") == row.get("name") \
+                    and old.get("description") == row.get("description"):
+                self.docs[pid] = row  # price/category changes need no re-tokenizing
+                return
+            self._drop(pid)
+            weights = self._weights(row)
+            for token, weight in weights.items():
+                posting = self.postings.get(token)
+                if posting is None:
+                    posting = self.postings[token] = {}
+                    bisect.insort(self.vocabulary, token)
+                posting[pid] = weight
+            self._doc_tokens[pid] = set(weights)
+            self.docs[pid] = row
+            self.updated = time.monotonic()
+
+    def remove(self, product_id: Any) -> None:
+        with self._lock:
+            self._drop(str(product_id))
+            self.updated = time.monotonic()
+
+    def sync(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """Bring the index in line with a full product list."""
+        rows = list(rows)
+        seen = {str(r["product_id"]) for r in rows}
+        with self._lock:
+            for pid in [pid for pid in self.docs if pid not in seen]:
+                self._drop(pid)
+            for row in rows:
+                self.upsert(row)
+            self.updated = time.monotonic()
+
+    def on_catalog_change(self, table: str, op: str, row: Dict[str, Any]) -> None:
+        """CatalogReplica listener."""
+        if table != "products":
+            return
+        if op == "delete":
+            self.remove(row["product_id"])
+        else:
+            self.upsert(row)
+
+    # ---- query ----
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        matches = []
+        if term in self.postings:
+            matches.append((term, 1.0))
+        if len(term) >= MIN_PREFIX_LEN:
+            i = bisect.bisect_left(self.vocabulary, term)
+            end = min(i + MAX_PREFIX_EXPANSIONS, len(self.vocabulary))
+            while i < end and self.vocabulary[i].startswith(term):
+                if self.vocabulary[i] != term:
+                    matches.append((self.vocabulary[i], PREFIX_FACTOR))
+                i += 1
+        return matches
+
+    def _score_term(self, term: str, expansion: List[Tuple[str, float]], n: int,
+                    candidates: Optional[Dict[str, float]]) -> Dict[str, float]:
+        """Best score per product for one query term.
+
+        When the candidate set is much smaller than the term's postings,
+        each candidate's own tokens are checked instead of walking postings.
+        """
+        postings = [(self.postings[token], factor) for token, factor in expansion]
+        out: Dict[str, float] = {}
+        if candidates is not None and len(candidates) * 4 < sum(len(p) for p, _ in postings):
+            # only tokens in the (capped) expansion count, as on the postings path
+            factors = dict(expansion)
+            for pid in candidates:
+                best = 0.0
+                for token in self._doc_tokens.get(pid, ()):
+                    factor = factors.get(token)
+                    if factor is None:
+                        continue
+                    posting = self.postings[token]
+                    s = posting[pid] * math.log(1 + n / len(posting)) * factor
+                    if s > best:
+                        best = s
+                if best:
+                    out[pid] = best
+            return out
+        for posting, factor in postings:
+            weight_idf = math.log(1 + n / len(posting)) * factor
+            for pid, w in posting.items():
+                if candidates is not None and pid not in candidates:
+                    continue
+                s = w * weight_idf
+                if s > out.get(pid, 0.0):
+                    out[pid] = s
+        return out
+
+    def search(self, q: str, category_id: Optional[Any] = None,
+               min_price: Optional[float] = None, max_price: Optional[float] = None,
+               limit: int = 20, offset: int = 0) -> Tuple[int, List[Dict[str, Any]]]:
+        """Ranked products matching every query term (exact or as a prefix).
+
+        Returns (total matches, page of rows).
+        """
+        terms = list(dict.fromkeys(tokenize(q)))
+        if not terms:
+            return 0, []
+        with self._lock:
+            n = max(len(self.docs), 1)
+            expansions = [(t, self._expand(t)) for t in terms]
+            # most selective term first so later terms only score survivors
+            expansions.sort(key=lambda te: sum(len(self.postings[tok]) for tok, _ in te[1]))
+            scores: Optional[Dict[str, float]] = None
+            for term, expansion in expansions:
+                term_scores = self._score_term(term, expansion, n, scores)
+                if scores is not None:
+                    term_scores = {pid: scores[pid] + s for pid, s in term_scores.items()}
+                scores = term_scores
+                if not scores:
+                    return 0, []
+
+            category = str(category_id) if category_id is not None else None
+            hits = []
+            for pid, score in scores.items():  # type: ignore[union-attr]
+                row = self.docs[pid]
+                if category is not None and str(row.get("category_id")) != category:
+                    continue
+                price = row.get("price")
+                if min_price is not None and (price is None or price < min_price):
+                    continue
+                if max_price is not None and (price is None or price > max_price):
+                    continue
+                hits.append((-score, row.get("name") or "", pid))
+            top = heapq.nsmallest(offset + limit, hits)
+            page = [self.docs[pid] for _, _, pid in top[offset:]]
+        return len(hits), page
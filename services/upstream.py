@@ -0,0 +1,112 @@
+from __future__ import annotations
+import os
+import re
+from time import perf_counter
+from typing import Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from middleware import metrics, timing, tracing
+from services import limiter
+
+# -------------------------------------------------------------------
+# Shared client for calls to the atomic User/Order/Product services
+# -------------------------------------------------------------------
+POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", 32))
+
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=POOL_SIZE)
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+
+# statuses the adaptive limiter treats as overload; other 5xx (e.g. 501)
+# say nothing about upstream capacity
+OVERLOAD_STATUSES = frozenset({502, 503, 504})
+# only reads may be shed by the limiter; a write can be mid-flow (checkout)
+SHEDDABLE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# host -> logical service name ("user", "order", "product")
+SERVICES: Dict[str, str] = {}
+# logical service name -> base URL
+BASE_URLS: Dict[str, str] = {}
+
+_ID_SEGMENT = re.compile(
+    r"/(?:[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)(?=/|$)"
+)
+
+
+def register_service(name: str, base_url: str) -> None:
+    """Map an upstream base URL to a short service name for timing output."""
+    SERVICES[urlsplit(base_url).netloc] = name
+    BASE_URLS[name] = base_url
+
+
+def path_template(path: str) -> str:
+    """Collapse IDs in an upstream path so metric labels stay bounded."""
+    return _ID_SEGMENT.sub("/{id}", path) or "/"
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """Issue one upstream call, recording metrics and a client trace span.
+
+    With the adaptive limiter on, the call first takes a slot from the
+    host's limiter; reads raise limiter.UpstreamOverloaded when shed.
+    """
+    parts = urlsplit(url)
+    host = parts.netloc
+    template = path_template(parts.path)
+    status_label = "error"
+
+    metrics.UPSTREAM_IN_FLIGHT.inc(host)
+    start = perf_counter()
+    try:
+        with tracing.span(
+            f"{method} {template}", kind="client",
+            **{"http.method": method, "http.url": url, "net.peer.name": host},
+        ) as sp:
+            if sp is not None:
+                kwargs["headers"] = tracing.inject(kwargs.get("headers"))
+            if limiter.ADAPTIVE_LIMIT:
+                host_limiter = limiter.for_host(host, SERVICES.get(host))
+                with host_limiter.acquire(shed=method.upper() in SHEDDABLE_METHODS) as outcome:
+                    resp = session.request(method, url, **kwargs)
+                    outcome.dropped = resp.status_code in OVERLOAD_STATUSES
+            else:
+                resp = session.request(method, url, **kwargs)
+            status_label = str(resp.status_code)
+            if sp is not None:
+                sp.set_attribute("http.status_code", resp.status_code)
+                if resp.status_code >= 500:
+                    sp.status = "error"
+        return resp
+    except limiter.UpstreamOverloaded:
+        status_label = "shed"
+        raise
+    finally:
+        elapsed = perf_counter() - start
+        metrics.UPSTREAM_IN_FLIGHT.dec(host)
+        metrics.UPSTREAM_REQUESTS.inc(host, method, template, status_label)
+        metrics.UPSTREAM_LATENCY.observe(elapsed, host, method, template, status_label)
+        timing.record_upstream(SERVICES.get(host, host), elapsed)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    return request("PUT", url, **kwargs)
+
+
+def patch(url: str, **kwargs) -> requests.Response:
+    return request("PATCH", url, **kwargs)
+
+
+def delete(url: str, **kwargs) -> requests.Response:
+    return request("DELETE", url, **kwargs)
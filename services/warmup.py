@@ -0,0 +1,98 @@
+from __future__ import annotations
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from services import dns_cache, upstream
+
+# -------------------------------------------------------------------
+# Startup warm-up: resolve upstream hosts and open pooled connections
+# -------------------------------------------------------------------
+WARM_CONNECTIONS = int(os.getenv("UPSTREAM_WARM_CONNECTIONS", 4))
+WARM_TIMEOUT = float(os.getenv("UPSTREAM_WARM_TIMEOUT", 5.0))
+WARM_PATH = os.getenv("UPSTREAM_WARM_PATH", "/")
+# block lifespan startup until warm-up finishes instead of running it in the background
+WARMUP_BLOCKING = os.getenv("WARMUP_BLOCKING", "0") == "1"
+
+logger = logging.getLogger("composite.warmup")
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {"status": "pending", "services": {}}
+
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        return {**_state, "services": dict(_state["services"])}
+
+
+def _touch(url: str) -> bool:
+    try:
+        # any response means the TCP/TLS connection is up and now pooled
+        upstream.session.head(url, timeout=WARM_TIMEOUT, allow_redirects=False)
+        return True
+    except requests.RequestException:
+        return False
+
+
+def warm_service(base_url: str, connections: int = WARM_CONNECTIONS) -> Dict[str, Any]:
+    host = urlsplit(base_url).hostname or ""
+    result: Dict[str, Any] = {"host": host}
+
+    start = perf_counter()
+    addresses = dns_cache.cache.lookup(host)
+    result["dns_ms"] = round((perf_counter() - start) * 1000, 2)
+    result["addresses"] = addresses
+
+    start = perf_counter()
+    url = base_url.rstrip("/") + WARM_PATH
+    if connections > 0:
+        # concurrent requests force distinct connections into the pool
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            ok = sum(pool.map(lambda _: _touch(url), range(connections)))
+    else:
+        ok = 0
+    result["connections"] = ok
+    result["connect_ms"] = round((perf_counter() - start) * 1000, 2)
+    result["ok"] = ok > 0 or connections == 0
+    return result
+
+
+def run() -> Dict[str, Any]:
+    """Warm every registered upstream; the app is ready once this returns."""
+    with _lock:
+        _state["status"] = "warming"
+    targets = dict(upstream.BASE_URLS)
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=max(len(targets), 1)) as pool:
+        futures = {name: pool.submit(warm_service, url) for name, url in targets.items()}
+        results = {}
+        for name, fut in futures.items():
+            try:
+                results[name] = fut.result()
+            except Exception as e:  # a broken upstream must not block readiness
+                results[name] = {"ok": False, "error": str(e)}
+    for name, r in results.items():
+        if not r.get("ok"):
+            logger.warning("Warm-up for %s failed: %s", name, r)
+    with _lock:
+        _state["services"] = results
+        _state["seconds"] = round(perf_counter() - start, 3)
+        _state["status"] = "ready"
+    return status()
+
+
+def start_background(on_ready: Optional[Callable[[], None]] = None) -> threading.Thread:
+    def target():
+        run()
+        if on_ready is not None:
+            on_ready()
+
+    thread = threading.Thread(target=target, name="upstream-warmup", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,82 @@
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Iterable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+# -------------------------------------------------------------------
+# Thread-safe TTL cache with LRU eviction
+# -------------------------------------------------------------------
+
+
+class TTLCache(Generic[V]):
+    """Bounded mapping whose entries expire ``ttl`` seconds after being set.
+
+    Safe to share between executor threads; ``hits``/``misses`` are kept
+    for metrics.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _get(self, key: Hashable, now: float) -> Optional[V]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            value = self._get(key, time.monotonic())
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, V]:
+        """Cached values for ``keys``; absent or expired keys are left out."""
+        out: Dict[Hashable, V] = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                value = self._get(key, now)
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    out[key] = value
+        return out
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
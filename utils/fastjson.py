@@ -0,0 +1,88 @@
+from __future__ import annotations
+import json
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Tuple
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# -------------------------------------------------------------------
+# Pluggable JSON backend: orjson > msgspec > stdlib
+# -------------------------------------------------------------------
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")  # auto | orjson | msgspec | stdlib
+
+
+def _default(obj: Any) -> Any:
+    """Fallback for types the active backend cannot encode natively."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib() -> Tuple[str, Callable[[Any], Any], Callable[[Any], bytes]]:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(
+            obj, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    return "stdlib", json.loads, dumps
+
+
+def _orjson():
+    import orjson
+
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=option)
+
+    return "orjson", orjson.loads, dumps
+
+
+def _msgspec():
+    import msgspec
+
+    encoder = msgspec.json.Encoder(enc_hook=_default)
+    decoder = msgspec.json.Decoder()
+    return "msgspec", decoder.decode, encoder.encode
+
+
+def _select(name: str):
+    loaders = {"orjson": _orjson, "msgspec": _msgspec, "stdlib": _stdlib}
+    order = ["orjson", "msgspec", "stdlib"] if name == "auto" else [name, "stdlib"]
+    for candidate in order:
+        try:
+            return loaders[candidate]()
+        except ImportError:
+            continue
+    return _stdlib()
+
+
+BACKEND, loads, dumps = _select(JSON_BACKEND)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the fastest available backend.
+
+    UUID, datetime and pydantic models are encoded directly, so endpoints
+    can return upstream dicts without a jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)